@@ -10,14 +10,16 @@ from pyramid.httpexceptions import HTTPForbidden, HTTPNotFound
 from pyramid.security import NO_PERMISSION_REQUIRED
 from pyramid.settings import asbool, aslist
 
+from cornice.compression import Compression
 from cornice.errors import Errors  # NOQA
+from cornice.json_backends import get_json_backend
 from cornice.pyramidhook import (
     handle_exceptions,
     register_resource_views,
     register_service_views,
     wrap_request,
 )
-from cornice.renderer import CorniceRenderer
+from cornice.renderer import CorniceNDJSONRenderer, CorniceRenderer, RawJSON  # NOQA
 from cornice.service import Service  # NOQA
 from cornice.util import ContentTypePredicate, current_service
 
@@ -73,6 +75,8 @@ def includeme(config):
     """Include the Cornice definitions"""
     # attributes required to maintain services
     config.registry.cornice_services = {}
+    # the CORS policies compiled when registering the services
+    config.registry.cornice_cors_policies = {}
 
     settings = config.get_settings()
 
@@ -84,7 +88,13 @@ def includeme(config):
     config.add_directive("add_cornice_service", register_service_views)
     config.add_directive("add_cornice_resource", register_resource_views)
     config.add_subscriber(wrap_request, NewRequest)
-    config.add_renderer("cornicejson", CorniceRenderer())
+    # JSON backend used to decode the request bodies and render responses
+    json_backend = get_json_backend(settings.get("cornice.json_backend"))
+    config.registry.cornice_json_backend = json_backend
+    config.add_renderer("cornicejson", CorniceRenderer(serializer=json_backend.dumps))
+    config.add_renderer("cornicendjson", CorniceNDJSONRenderer(serializer=json_backend.dumps))
+    # compression of the responses, applied with the filters
+    config.registry.cornice_compression = Compression.from_settings(settings)
     config.add_view_predicate("content_type", ContentTypePredicate)
     config.add_request_method(current_service, reify=True)
 
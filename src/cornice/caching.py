@@ -0,0 +1,551 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+HTTP caching of the responses: ETags, conditional requests, ``Cache-Control``
+and ``Vary`` headers, and the in-process cache of the rendered responses.
+"""
+
+import collections
+import hashlib
+import logging
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+from operator import itemgetter
+
+from pyramid.request import Request
+from pyramid.response import Response
+
+from cornice.util import is_string, to_list
+
+
+logger = logging.getLogger("cornice")
+
+# The environ key marking the subrequests refreshing a stale cache entry.
+REFRESH_KEY = "cornice.cache_refresh"
+
+
+def body_etag(body):
+    """Return a strong ETag for ``body``: a hash of it."""
+    # SHA-256 is hardware accelerated on most CPUs, unlike MD5 and BLAKE2.
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
+def not_modified(response):
+    """Turn ``response`` into a bodiless ``304 Not Modified`` one, in place.
+
+    Its other headers, such as ``ETag`` and ``Vary``, are kept.
+    """
+    response.status = 304
+    response.app_iter = []
+    response.content_type = None
+    response.content_length = None
+    return response
+
+
+def apply_auto_etag(request, response):
+    """Set the ``ETag`` of the successful ``GET`` and ``HEAD`` responses to a
+    hash of their body, unless they have one, and answer the requests whose
+    ``If-None-Match`` header matches it with a ``304 Not Modified``.
+
+    Streamed responses are left untouched.
+    """
+    if request.method not in ("GET", "HEAD") or response.status_code != 200:
+        return response
+    if not isinstance(response.app_iter, (list, tuple)):
+        return response
+    etag = response.etag
+    if etag is None:
+        etag = response.etag = body_etag(response.body)
+    if etag in request.if_none_match:
+        not_modified(response)
+    return response
+
+
+def check_preconditions(request, etag=None, last_modified=None):
+    """Evaluate the conditional headers of ``request`` against the current
+    version of the resource, as in RFC 7232, before the view runs.
+
+    The ``etag`` and ``last_modified`` callables take the request, and return
+    the current ETag and modification date (a :class:`datetime.datetime` or a
+    timestamp) of the resource, or ``None`` if it does not exist. Their values
+    are set on ``request.response``.
+
+    Returns ``None`` if the request is to be processed, otherwise the status
+    answering it (304 or 412) and the name of the header which failed.
+    """
+    response = request.response
+    if etag is not None:
+        response.etag = etag(request)
+    if last_modified is not None:
+        response.last_modified = last_modified(request)
+    current_etag = response.etag if etag is not None else None
+    current_date = response.last_modified
+    headers = request.headers
+
+    if "If-Match" in headers:
+        if etag is not None and (current_etag is None or current_etag not in request.if_match):
+            return 412, "If-Match"
+    elif current_date is not None and request.if_unmodified_since is not None:
+        if current_date > request.if_unmodified_since:
+            return 412, "If-Unmodified-Since"
+
+    safe = request.method in ("GET", "HEAD")
+    if "If-None-Match" in headers:
+        if current_etag is not None and current_etag in request.if_none_match:
+            return (304 if safe else 412), "If-None-Match"
+    elif safe and current_date is not None and request.if_modified_since is not None:
+        if current_date <= request.if_modified_since:
+            return 304, "If-Modified-Since"
+    return None
+
+
+def cache_control_header(value):
+    """Serialize the ``cache_control`` option of a view.
+
+    :param value: A string, used as it is, or a dict of directives, such as
+        ``{"max_age": 60, "stale_while_revalidate": 30, "public": True}``.
+        Underscores are replaced by dashes, and ``False`` or ``None`` values
+        are left out.
+    """
+    if is_string(value):
+        return value
+    directives = []
+    for name, arg in value.items():
+        if arg is None or arg is False:
+            continue
+        name = name.replace("_", "-")
+        directives.append(name if arg is True else "%s=%s" % (name, arg))
+    return ", ".join(directives)
+
+
+def add_vary(response, *headers):
+    """Add ``headers`` to the ``Vary`` header of ``response``."""
+    vary = response.vary or ()
+    missing = tuple(header for header in headers if header not in vary)
+    if missing:
+        response.vary = tuple(vary) + missing
+
+
+def apply_cache_headers(service, request, response, args):
+    """Set the ``Cache-Control`` header of the successful ``GET`` and ``HEAD``
+    responses from the ``cache_control`` option of the view, unless they have
+    one, and the ``Vary`` header from what the view negotiates on.
+    """
+    cache_control = args.get("cache_control")
+    if (
+        cache_control is not None
+        and request.method in ("GET", "HEAD")
+        and response.status_code in (200, 203, 304)
+        and "Cache-Control" not in response.headers
+    ):
+        response.headers["Cache-Control"] = cache_control_header(cache_control)
+
+    vary = []
+    accept = args.get("accept")
+    if callable(accept) or len(to_list(accept or [])) > 1:
+        vary.append("Accept")
+    if service.cors_enabled:
+        vary.append("Origin")
+    if vary:
+        add_vary(response, *vary)
+    return response
+
+
+#: The rendered responses stored by :class:`ResponseCache`, with the
+#: :func:`time.monotonic` times until which they are fresh and may be served.
+CacheEntry = collections.namedtuple(
+    "CacheEntry", ("status", "headerlist", "body", "expires", "stale_until")
+)
+
+
+class MemoryBackend(object):
+    """Keeps the entries of a :class:`ResponseCache` in memory, evicting the
+    least recently used ones once they take more than ``max_bytes``.
+
+    Other backends implement the same ``get``, ``set``, ``delete``, ``keys``
+    and ``clear`` methods.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value, _ = self._data[key]
+            except KeyError:
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, size):
+        """Store ``value``, which takes ``size`` bytes, under ``key``."""
+        with self._lock:
+            self._pop(key)
+            if size > self.max_bytes:
+                return
+            self._data[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._pop(next(iter(self._data)))
+
+    def delete(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def keys(self):
+        with self._lock:
+            return list(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def _pop(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+
+class MmapBackend(object):
+    """Keeps the entries of a :class:`ResponseCache` in a memory-mapped file,
+    shared by the processes of the host which open it, eg. the workers of a
+    server.
+
+    The file is split in ``slots`` slots of ``slot_size`` bytes, each holding
+    at most one entry. An entry may be stored in ``ways`` slots, chosen from
+    a hash of its key, and replaces the least recently written one when they
+    are all taken. Entries larger than a slot are not stored.
+
+    Writers lock the slot they write, with :func:`fcntl.lockf` between
+    processes. Readers take no lock: the sequence number of the slot, odd
+    while it is written, tells them to read it again. The bodies are copied
+    once, straight from the mapping.
+
+    :param path: The file, created if needed, eg. in ``/dev/shm``. Every
+        process must open it with the same ``slots`` and ``slot_size``. As
+        entries are unpickled, only the application may write it.
+    :raises ValueError: if the file was created with another geometry.
+    """
+
+    MAGIC = b"CORNICE1"
+    # magic, slots, slot size
+    FILE_HEADER = struct.Struct("<8sII")
+    # sequence, key hash, write time, key, meta and body lengths
+    SLOT_HEADER = struct.Struct("<QQdIII")
+    READ_RETRIES = 64
+    LOCKS = 64
+
+    def __init__(self, path, slots=1024, slot_size=64 * 1024, ways=4):
+        import fcntl
+
+        self._lockf = fcntl.lockf
+        self._LOCK_EX = fcntl.LOCK_EX
+        self._LOCK_UN = fcntl.LOCK_UN
+        self.path = path
+        self.slots = slots
+        self.slot_size = slot_size
+        self.ways = min(ways, slots)
+        self._first = mmap.PAGESIZE
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        length = self._first + slots * slot_size
+        if os.fstat(self._fd).st_size < length:
+            os.ftruncate(self._fd, length)
+        self._map = mmap.mmap(self._fd, length)
+        magic, file_slots, file_slot_size = self.FILE_HEADER.unpack_from(self._map, 0)
+        if magic == self.MAGIC:
+            if (file_slots, file_slot_size) != (slots, slot_size):
+                raise ValueError(
+                    "%s holds %d slots of %d bytes" % (path, file_slots, file_slot_size)
+                )
+        else:
+            self.FILE_HEADER.pack_into(self._map, 0, self.MAGIC, slots, slot_size)
+        # POSIX locks are held by processes, so threads also need theirs.
+        self._locks = [threading.Lock() for _ in range(self.LOCKS)]
+
+    def _hash(self, key):
+        data = pickle.dumps(key, protocol=pickle.HIGHEST_PROTOCOL)
+        return data, int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+    def _candidates(self, key_hash):
+        return [(key_hash + way) % self.slots for way in range(self.ways)]
+
+    def _offset(self, slot):
+        return self._first + slot * self.slot_size
+
+    def _read(self, slot, key_hash=None, key_data=None, body=True):
+        """Return the header and the key, meta and body of ``slot``, or
+        ``None`` if it is empty, holds another key or keeps being written."""
+        offset = self._offset(slot)
+        start = offset + self.SLOT_HEADER.size
+        for _ in range(self.READ_RETRIES):
+            header = self.SLOT_HEADER.unpack_from(self._map, offset)
+            sequence, slot_hash, _, key_length, meta_length, body_length = header
+            if sequence & 1:
+                continue
+            if key_length == 0 or (key_hash is not None and slot_hash != key_hash):
+                result = None
+            else:
+                data = self._map[start : start + key_length + meta_length]
+                if key_data is not None and data[:key_length] != key_data:
+                    result = None
+                else:
+                    end = start + key_length + meta_length
+                    content = self._map[end : end + body_length] if body else None
+                    result = header, data[:key_length], data[key_length:], content
+            if self.SLOT_HEADER.unpack_from(self._map, offset)[0] == sequence:
+                return result
+        return None
+
+    def _write(self, slot, key_hash=0, key_data=b"", meta=b"", body=b""):
+        offset = self._offset(slot)
+        with self._locks[slot % self.LOCKS]:
+            self._lockf(self._fd, self._LOCK_EX, 1, offset)
+            try:
+                sequence = self.SLOT_HEADER.unpack_from(self._map, offset)[0]
+                # odd while being written
+                sequence += 1 if sequence % 2 == 0 else 2
+                struct.pack_into("<Q", self._map, offset, sequence)
+                start = offset + self.SLOT_HEADER.size
+                end = start + len(key_data) + len(meta)
+                self._map[start:end] = key_data + meta
+                self._map[end : end + len(body)] = body
+                self.SLOT_HEADER.pack_into(
+                    self._map,
+                    offset,
+                    sequence + 1,
+                    key_hash,
+                    time.time(),
+                    len(key_data),
+                    len(meta),
+                    len(body),
+                )
+            finally:
+                self._lockf(self._fd, self._LOCK_UN, 1, offset)
+
+    def get(self, key):
+        key_data, key_hash = self._hash(key)
+        for slot in self._candidates(key_hash):
+            result = self._read(slot, key_hash, key_data)
+            if result is not None:
+                status, headerlist, expires, stale_until = pickle.loads(result[2])
+                return CacheEntry(status, headerlist, result[3], expires, stale_until)
+        return None
+
+    def set(self, key, entry, size):
+        """Store ``entry``, a :class:`CacheEntry`, under ``key``."""
+        key_data, key_hash = self._hash(key)
+        meta = pickle.dumps(
+            (entry.status, entry.headerlist, entry.expires, entry.stale_until),
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+        length = self.SLOT_HEADER.size + len(key_data) + len(meta) + len(entry.body)
+        if length > self.slot_size:
+            self.delete(key)
+            return
+        oldest = None
+        for slot in self._candidates(key_hash):
+            result = self._read(slot, body=False)
+            if result is None:
+                # empty
+                oldest = (0, slot)
+                break
+            if result[1] == key_data:
+                oldest = (0, slot)
+                break
+            written = result[0][2]
+            if oldest is None or written < oldest[0]:
+                oldest = (written, slot)
+        self._write(oldest[1], key_hash, key_data, meta, entry.body)
+
+    def delete(self, key):
+        key_data, key_hash = self._hash(key)
+        for slot in self._candidates(key_hash):
+            if self._read(slot, key_hash, key_data, body=False) is not None:
+                self._write(slot)
+
+    def keys(self):
+        keys = []
+        for slot in range(self.slots):
+            result = self._read(slot, body=False)
+            if result is not None:
+                keys.append(pickle.loads(result[1]))
+        return keys
+
+    def clear(self):
+        for slot in range(self.slots):
+            self._write(slot)
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+
+class ResponseCache(object):
+    """Caches the rendered responses of the views given it as their ``cache``
+    option, before their validators run.
+
+    The responses are cached per route, matchdict, querystring, ``Accept``
+    header (the content negotiation being a function of it) and value of
+    the ``key`` function. Only the successful responses to ``GET`` and
+    ``HEAD`` requests which set no cookie and are neither streamed nor marked
+    ``no-store`` are cached. The filters, such as CORS, ETags and the
+    compression, still apply to the cached responses. The origin of the
+    requests is checked before serving them, and their ``Access-Control-*``
+    headers are not cached.
+
+    :param ttl: The number of seconds the entries are fresh for.
+    :param stale_ttl: The number of seconds the entries are still served
+        once stale, while they are refreshed in a background thread.
+    :param max_bytes: The size bound of the default :class:`MemoryBackend`.
+    :param key: A callable taking the request and returning the part of the
+        key specific to the application, eg. the authenticated user.
+    :param backend: Where the entries are stored, a :class:`MemoryBackend`
+        by default.
+    :param executor: The :class:`concurrent.futures.Executor` refreshing the
+        stale entries. By default, a thread is started for each refresh.
+
+    The ``hits``, ``stale_hits``, ``misses`` and ``refreshes`` attributes
+    count the lookups.
+    """
+
+    def __init__(
+        self,
+        ttl=60,
+        stale_ttl=0,
+        max_bytes=64 * 1024 * 1024,
+        key=None,
+        backend=None,
+        executor=None,
+    ):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.key = key
+        self.backend = backend if backend is not None else MemoryBackend(max_bytes)
+        self.executor = executor
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def make_key(self, request):
+        return (
+            request.matched_route.name,
+            tuple(sorted(request.matchdict.items())),
+            # sorted on the names only, as the order of values may matter
+            tuple(sorted(request.GET.items(), key=itemgetter(0))),
+            request.headers.get("Accept", ""),
+            self.key(request) if self.key is not None else None,
+        )
+
+    def lookup(self, request):
+        """Return the cached response to ``request``, or ``None``.
+
+        On a miss, the response to the request is then stored, see
+        :meth:`store`.
+        """
+        if request.method not in ("GET", "HEAD"):
+            return None
+        key = request.environ.get(REFRESH_KEY)
+        if key is not None:
+            # refreshing a stale entry
+            request.cornice_cache_key = key
+            return None
+        key = self.make_key(request)
+        entry = self.backend.get(key)
+        now = time.monotonic()
+        if entry is None or entry.stale_until <= now:
+            with self._lock:
+                self.misses += 1
+            request.cornice_cache_key = key
+            return None
+        if entry.expires <= now:
+            with self._lock:
+                self.stale_hits += 1
+            self.refresh(request, key)
+        else:
+            with self._lock:
+                self.hits += 1
+        return Response(
+            status=entry.status, headerlist=list(entry.headerlist), app_iter=[entry.body]
+        )
+
+    def store(self, request, response):
+        """Cache ``response``, if it answers a request looked up by
+        :meth:`lookup` and can be cached."""
+        key = getattr(request, "cornice_cache_key", None)
+        if (
+            key is None
+            or response.status_code != 200
+            or not isinstance(response.app_iter, (list, tuple))
+            or "Set-Cookie" in response.headers
+            or "no-store" in response.headers.get("Cache-Control", "")
+        ):
+            return
+        # the CORS headers answer the origin of this request only
+        headerlist = tuple(
+            (name, value)
+            for name, value in response.headerlist
+            if not name.lower().startswith("access-control-")
+        )
+        body = response.body
+        size = len(body) + sum(len(name) + len(value) for name, value in headerlist)
+        expires = time.monotonic() + self.ttl
+        entry = CacheEntry(response.status, headerlist, body, expires, expires + self.stale_ttl)
+        self.backend.set(key, entry, size)
+
+    def refresh(self, request, key):
+        """Render the response to ``request`` again in the background, once at
+        a time per ``key``."""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            self.refreshes += 1
+        headers = [
+            (name, value) for name, value in request.headers.items() if not name.startswith("If-")
+        ]
+        subrequest = Request.blank(
+            request.path_qs, base_url=request.application_url, headers=headers
+        )
+        subrequest.environ[REFRESH_KEY] = key
+        if self.executor is not None:
+            self.executor.submit(self._refresh, request, subrequest, key)
+        else:
+            threading.Thread(
+                target=self._refresh, args=(request, subrequest, key), daemon=True
+            ).start()
+
+    def _refresh(self, request, subrequest, key):
+        try:
+            request.invoke_subrequest(subrequest, use_tweens=True)
+        except Exception:
+            logger.exception("Could not refresh %s", request.path_qs)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def invalidate(self, **matchdict):
+        """Drop the cached responses whose matchdict contains ``matchdict``,
+        all of them if it is empty."""
+        if not matchdict:
+            self.backend.clear()
+            return
+        items = set(matchdict.items())
+        for key in self.backend.keys():
+            if items.issubset(key[1]):
+                self.backend.delete(key)
@@ -0,0 +1,217 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+Compression of the responses, negotiated with the ``Accept-Encoding`` header
+of the requests.
+
+It is enabled with the ``cornice.compress`` setting, or per view with the
+``compress`` option. Responses smaller than the ``cornice.compress_min_size``
+setting (1024 bytes by default) are sent as they are, and so are those which
+are already encoded or of a type which does not compress well, such as
+images. Streamed responses are only compressed with the ``compress_streams``
+option.
+
+The ``cornice.compress_encodings`` setting lists the encodings offered, the
+preferred first. By default, ``zstd`` and ``br`` when the ``zstandard`` and
+``brotli`` libraries are installed, then ``gzip`` and ``deflate``.
+"""
+
+import zlib
+
+from pyramid.settings import asbool, aslist
+
+from cornice.caching import add_vary
+from cornice.util import LRUCache
+
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+
+class ZlibCoder(object):
+    """Compresses in the gzip format (``wbits=31``) or the zlib one
+    (``wbits=15``), which is the ``deflate`` encoding of HTTP.
+    """
+
+    def __init__(self, wbits, level=6):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, wbits)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        """Return the data compressed so far, without ending the stream."""
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliCoder(object):
+    def __init__(self, quality=4):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class ZstdCoder(object):
+    def __init__(self, level=3):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+#: The coders of the supported encodings, preferred first.
+CODINGS = {}
+if zstandard is not None:
+    CODINGS["zstd"] = ZstdCoder
+if brotli is not None:
+    CODINGS["br"] = BrotliCoder
+CODINGS["gzip"] = lambda: ZlibCoder(31)
+CODINGS["deflate"] = lambda: ZlibCoder(15)
+
+#: The media types which are compressed, besides ``text/*``, ``*+json``
+#: and ``*+xml``.
+COMPRESSIBLE_TYPES = frozenset(
+    (
+        "application/json",
+        "application/x-ndjson",
+        "application/javascript",
+        "application/xml",
+    )
+)
+
+#: The encodings negotiation cache, keyed on the ``Accept-Encoding`` header.
+ENCODING_CACHE = LRUCache(maxsize=256)
+
+
+def is_compressible(content_type):
+    if content_type is None:
+        return False
+    return (
+        content_type in COMPRESSIBLE_TYPES
+        or content_type.startswith("text/")
+        or content_type.endswith(("+json", "+xml"))
+    )
+
+
+def negotiate_encoding(request, codings):
+    """Return the encoding of ``codings`` preferred by the ``Accept-Encoding``
+    header of the request, or ``None``.
+    """
+    header = request.headers.get("Accept-Encoding")
+    if not header:
+        return None
+    key = (header, codings)
+    offers = ENCODING_CACHE.get(key)
+    if offers is None:
+        offers = tuple(request.accept_encoding.acceptable_offers(codings))
+        ENCODING_CACHE.set(key, offers)
+    return offers[0][0] if offers else None
+
+
+def _compress_iter(coder, app_iter):
+    try:
+        for chunk in app_iter:
+            # Flush every chunk, so that it reaches the client right away.
+            data = coder.compress(chunk) + coder.flush()
+            if data:
+                yield data
+        yield coder.finish()
+    finally:
+        close = getattr(app_iter, "close", None)
+        if close is not None:
+            close()
+
+
+class Compression(object):
+    """Compresses the responses of the views, see :mod:`cornice.compression`.
+
+    :param enabled: Whether the responses of the views without a
+        ``compress`` option are compressed.
+    :param min_size: The size in bytes under which responses are not
+        compressed.
+    :param encodings: The encodings offered, the preferred first. Those
+        which are not supported are ignored.
+    """
+
+    def __init__(self, enabled=False, min_size=1024, encodings=None):
+        self.enabled = enabled
+        self.min_size = min_size
+        self.codings = tuple(name for name in encodings or CODINGS if name in CODINGS)
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            enabled=asbool(settings.get("cornice.compress", False)),
+            min_size=int(settings.get("cornice.compress_min_size", 1024)),
+            encodings=aslist(settings.get("cornice.compress_encodings", "")),
+        )
+
+    def apply(self, request, response, enabled=None, streams=False):
+        """Compress the ``response`` in place, if the request accepts one of
+        the encodings.
+
+        :param enabled: Overrides the ``enabled`` attribute.
+        :param streams: Whether streamed responses are compressed.
+        """
+        if not (self.enabled if enabled is None else enabled):
+            return response
+        if (
+            request.method == "HEAD"
+            or response.status_code in (204, 304)
+            or "Content-Encoding" in response.headers
+            or not is_compressible(response.content_type)
+        ):
+            return response
+
+        # Caches must not serve compressed responses to other clients.
+        add_vary(response, "Accept-Encoding")
+
+        streamed = not isinstance(response.app_iter, (list, tuple))
+        if streamed:
+            if not streams:
+                return response
+        else:
+            body = response.body
+            if not body or len(body) < self.min_size:
+                return response
+
+        coding = negotiate_encoding(request, self.codings)
+        if coding is None:
+            return response
+
+        coder = CODINGS[coding]()
+        if streamed:
+            response.app_iter = _compress_iter(coder, response.app_iter)
+            response.content_length = None
+        else:
+            response.body = coder.compress(body) + coder.finish()
+        response.content_encoding = coding
+        # The compressed representation is not byte for byte the same.
+        etag = response.headers.get("ETag")
+        if etag and not etag.startswith("W/"):
+            response.headers["ETag"] = "W/" + etag
+        return response
@@ -3,6 +3,7 @@
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 import fnmatch
 import functools
+import re
 
 from pyramid.settings import asbool
 
@@ -17,6 +18,88 @@ CORS_PARAMETERS = (
 )
 
 
+class CORSPolicy(object):
+    """The CORS settings of a service for one method, compiled once so that
+    requests do not go through the definitions of the service again.
+
+    :param service: The service.
+    :param method: The HTTP method, or ``None`` for the methods which the
+        service does not define.
+    :param always_cors: The value of the ``cornice.always_cors`` setting.
+    """
+
+    __slots__ = (
+        "origins",
+        "any_origin",
+        "default_origin",
+        "credentials",
+        "expose_headers",
+        "max_age",
+        "supported_headers",
+        "supported_lower_headers",
+        "allow_headers",
+        "supported_methods",
+        "allow_methods",
+        "expose_all_headers",
+        "_match",
+    )
+
+    def __init__(self, service, method, always_cors=False):
+        origins = service.cors_origins_for(method or "")
+        self.origins = frozenset(origins)
+        self.any_origin = "*" in self.origins
+        # With the ``cornice.always_cors`` setting, if the service origins
+        # has "*", then always return CORS headers.
+        self.default_origin = None
+        if always_cors and "*" in getattr(service, "cors_origins", []):
+            self.default_origin = "*"
+        self.credentials = service.cors_support_credentials_for(method)
+        headers = service.cors_supported_headers_for(method or "")
+        self.expose_headers = ", ".join(headers) if headers else None
+        max_age = service.cors_max_age_for(method)
+        self.max_age = str(max_age) if max_age is not None else None
+        # The headers and methods of the whole service, for the preflight
+        # requests.
+        self.supported_headers = frozenset(service.cors_supported_headers_for())
+        self.supported_lower_headers = frozenset(h.lower() for h in self.supported_headers)
+        self.allow_headers = ",".join(self.supported_headers)
+        methods = service.cors_supported_methods
+        self.supported_methods = frozenset(methods)
+        self.allow_methods = ",".join(methods)
+        self.expose_all_headers = service.cors_expose_all_headers
+        # All the patterns in a single regular expression, matched as
+        # :func:`fnmatch.fnmatchcase` does.
+        pattern = "|".join(fnmatch.translate(o) for o in self.origins)
+        self._match = re.compile(pattern).match if pattern else None
+
+    def allows(self, origin):
+        """Return whether ``origin`` matches one of the allowed origins."""
+        return self._match is not None and self._match(origin) is not None
+
+
+def compile_cors_policies(service, always_cors=False):
+    """Return the :class:`CORSPolicy` of each method of the service, keyed
+    by method, and under ``None`` the one of the methods it does not define.
+    """
+    policies = {None: CORSPolicy(service, None, always_cors)}
+    for method in service.defined_methods:
+        policies[method.upper()] = CORSPolicy(service, method, always_cors)
+    return policies
+
+
+def get_cors_policy(service, request, method):
+    """Return the :class:`CORSPolicy` of the service for ``method``.
+
+    The policies are compiled when the service is registered. Otherwise, the
+    policy is computed for the request.
+    """
+    policies = getattr(request.registry, "cornice_cors_policies", {}).get(service)
+    if policies is not None:
+        return policies.get(method.upper()) or policies[None]
+    always_cors = asbool(request.registry.settings.get("cornice.always_cors"))
+    return CORSPolicy(service, method, always_cors)
+
+
 def get_cors_preflight_view(service):
     """Return a view for the OPTION method.
 
@@ -28,7 +111,6 @@ def get_cors_preflight_view(service):
     def _preflight_view(request):
         response = request.response
         origin = request.headers.get("Origin")
-        supported_headers = service.cors_supported_headers_for()
 
         if not origin:
             request.errors.add("header", "Origin", "this header is mandatory")
@@ -42,30 +124,31 @@ def get_cors_preflight_view(service):
         if not (requested_method and origin):
             return
 
-        requested_headers = request.headers.get("Access-Control-Request-Headers", ())
+        policy = get_cors_policy(service, request, requested_method)
+        requested_headers = request.headers.get("Access-Control-Request-Headers")
 
         if requested_headers:
-            requested_headers = map(str.strip, requested_headers.split(","))
+            requested_headers = [h.strip() for h in requested_headers.split(",")]
 
-        if requested_method not in service.cors_supported_methods:
+        if requested_method not in policy.supported_methods:
             request.errors.add("header", "Access-Control-Request-Method", "Method not allowed")
 
-        if not service.cors_expose_all_headers:
+        allow_headers = policy.allow_headers
+        if requested_headers and policy.expose_all_headers:
+            allow_headers = ",".join(policy.supported_headers.union(requested_headers))
+        elif requested_headers:
             for h in requested_headers:
-                if h.lower() not in [s.lower() for s in supported_headers]:
+                if h.lower() not in policy.supported_lower_headers:
                     request.errors.add(
                         "header", "Access-Control-Request-Headers", 'Header "%s" not allowed' % h
                     )
 
-        supported_headers = set(supported_headers) | set(requested_headers)
+        response.headers["Access-Control-Allow-Headers"] = allow_headers
 
-        response.headers["Access-Control-Allow-Headers"] = ",".join(supported_headers)
+        response.headers["Access-Control-Allow-Methods"] = policy.allow_methods
 
-        response.headers["Access-Control-Allow-Methods"] = ",".join(service.cors_supported_methods)
-
-        max_age = service.cors_max_age_for(requested_method)
-        if max_age is not None:
-            response.headers["Access-Control-Max-Age"] = str(max_age)
+        if policy.max_age is not None:
+            response.headers["Access-Control-Max-Age"] = policy.max_age
 
         return None
 
@@ -90,28 +173,19 @@ def ensure_origin(service, request, response=None, **kwargs):
 
     # Don't check this twice.
     if not request.info.get("cors_checked", False):
-        method = _get_method(request)
+        policy = get_cors_policy(service, request, _get_method(request))
 
-        origin = request.headers.get("Origin")
-
-        if not origin:
-            always_cors = asbool(request.registry.settings.get("cornice.always_cors"))
-            # With this setting, if the service origins has "*", then
-            # always return CORS headers.
-            origins = getattr(service, "cors_origins", [])
-            if always_cors and "*" in origins:
-                origin = "*"
+        origin = request.headers.get("Origin") or policy.default_origin
 
         if origin:
-            if not any([fnmatch.fnmatchcase(origin, o) for o in service.cors_origins_for(method)]):
+            if not policy.allows(origin):
                 request.errors.add("header", "Origin", "%s not allowed" % origin)
-            elif service.cors_support_credentials_for(method):
+            elif policy.credentials:
                 response.headers["Access-Control-Allow-Origin"] = origin
+            elif policy.any_origin:
+                response.headers["Access-Control-Allow-Origin"] = "*"
             else:
-                if any([o == "*" for o in service.cors_origins_for(method)]):
-                    response.headers["Access-Control-Allow-Origin"] = "*"
-                else:
-                    response.headers["Access-Control-Allow-Origin"] = origin
+                response.headers["Access-Control-Allow-Origin"] = origin
         request.info["cors_checked"] = True
     return response
 
@@ -127,18 +201,14 @@ def apply_cors_post_request(service, request, response):
     Allow-Credentials ones.
     """
     response = ensure_origin(service, request, response)
-    method = _get_method(request)
+    policy = get_cors_policy(service, request, _get_method(request))
 
-    if (
-        service.cors_support_credentials_for(method)
-        and "Access-Control-Allow-Credentials" not in response.headers
-    ):
+    if policy.credentials and "Access-Control-Allow-Credentials" not in response.headers:
         response.headers["Access-Control-Allow-Credentials"] = "true"
 
     if request.method != "OPTIONS":
         # Which headers are exposed?
-        supported_headers = service.cors_supported_headers_for(request.method)
-        if supported_headers:
-            response.headers["Access-Control-Expose-Headers"] = ", ".join(supported_headers)
+        if policy.expose_headers:
+            response.headers["Access-Control-Expose-Headers"] = policy.expose_headers
 
     return response
@@ -6,20 +6,48 @@ import json
 from pyramid.i18n import TranslationString
 
 
+class TooManyErrors(Exception):
+    """Raised when adding an error to an :class:`Errors` instance that holds
+    ``max_errors`` errors already."""
+
+
 class Errors(list):
-    """Holds Request errors"""
+    """Holds Request errors
+
+    If ``max_errors`` is set, adding more errors marks the errors as
+    ``truncated``, and raises :class:`TooManyErrors` while ``raise_when_full``
+    is true, as it is when the validators run. Otherwise, such as in the
+    views and the filters, the errors are dropped.
+    """
 
-    def __init__(self, status=400, localizer=None):
+    def __init__(self, status=400, localizer=None, max_errors=None):
         self.status = status
         self.localizer = localizer
+        self.max_errors = max_errors
+        self.truncated = False
+        self.raise_when_full = True
         super(Errors, self).__init__()
 
+    @property
+    def remaining(self):
+        """The number of errors that can still be added, ``None`` if there
+        is no limit."""
+        if self.max_errors is None:
+            return None
+        return max(self.max_errors - len(self), 0)
+
     def add(self, location, name=None, description=None, **kw):
         """Registers a new error."""
         allowed = ("body", "querystring", "url", "header", "path", "cookies", "method")
         if location != "" and location not in allowed:
             raise ValueError("%r not in %s" % (location, allowed))
 
+        if self.max_errors is not None and len(self) >= self.max_errors:
+            self.truncated = True
+            if self.raise_when_full:
+                raise TooManyErrors(self.max_errors)
+            return
+
         if isinstance(description, TranslationString) and self.localizer:
             description = self.localizer.translate(description)
 
@@ -0,0 +1,163 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+JSON backends used to decode request bodies and render responses.
+
+The backend is chosen with the ``cornice.json_backend`` setting: ``json``
+(the default, the standard library), ``orjson``, ``ujson``, ``simdjson``,
+``auto`` (the fastest of them which is installed) or the dotted name of a
+:class:`JSONBackend` subclass.
+
+Backends decode invalid documents again with the standard library, so that
+error messages do not depend on the backend.
+"""
+
+import json
+
+from pyramid.path import DottedNameResolver
+
+
+__all__ = ["JSONBackend", "get_json_backend"]
+
+
+class JSONBackend(object):
+    """The interface of the JSON backends, implemented with the standard
+    library.
+
+    Subclasses raise :class:`ImportError` when instantiated if the library
+    they rely on is not installed.
+    """
+
+    name = "json"
+
+    def loads(self, data):
+        """Decode ``data``, a :class:`bytes` or :class:`str`.
+
+        :raises ValueError: if ``data`` is not valid JSON.
+        """
+        return json.loads(data)
+
+    def dumps(self, obj, default=None, **kw):
+        """Encode ``obj`` to a :class:`str`.
+
+        :param default: Called with the objects which cannot be serialized,
+            returning a serializable version of them.
+        :param kw: The arguments of :func:`json.dumps`, such as ``indent``.
+        """
+        return json.dumps(obj, default=default, **kw)
+
+
+class OrjsonBackend(JSONBackend):
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+
+        self._loads = orjson.loads
+        self._dumps = orjson.dumps
+        # Let the ``default`` hook (and thus the renderer adapters) handle the
+        # types which the standard library does not serialize either.
+        self._option = (
+            orjson.OPT_NON_STR_KEYS
+            | orjson.OPT_PASSTHROUGH_DATETIME
+            | orjson.OPT_PASSTHROUGH_DATACLASS
+        )
+        self._options = {
+            ("sort_keys", True): orjson.OPT_SORT_KEYS,
+            ("sort_keys", False): 0,
+            ("indent", 2): orjson.OPT_INDENT_2,
+            ("indent", None): 0,
+        }
+
+    def loads(self, data):
+        try:
+            return self._loads(data)
+        except ValueError:
+            return super(OrjsonBackend, self).loads(data)
+
+    def dumps(self, obj, default=None, **kw):
+        option = self._option
+        for item in kw.items():
+            try:
+                option |= self._options[item]
+            except (KeyError, TypeError):
+                # Not supported by orjson.
+                return super(OrjsonBackend, self).dumps(obj, default=default, **kw)
+        try:
+            return self._dumps(obj, default=default, option=option).decode("utf-8")
+        except TypeError:
+            # Integers of more than 64 bits, or objects which cannot be
+            # serialized, reported as the standard library does.
+            return super(OrjsonBackend, self).dumps(obj, default=default, **kw)
+
+
+class UjsonBackend(JSONBackend):
+    name = "ujson"
+    supported = frozenset(("sort_keys", "indent", "ensure_ascii"))
+
+    def __init__(self):
+        import ujson
+
+        self._loads = ujson.loads
+        self._dumps = ujson.dumps
+
+    def loads(self, data):
+        try:
+            return self._loads(data)
+        except ValueError:
+            return super(UjsonBackend, self).loads(data)
+
+    def dumps(self, obj, default=None, **kw):
+        if not self.supported.issuperset(kw):
+            return super(UjsonBackend, self).dumps(obj, default=default, **kw)
+        try:
+            return self._dumps(obj, default=default, escape_forward_slashes=False, **kw)
+        except (TypeError, OverflowError):
+            return super(UjsonBackend, self).dumps(obj, default=default, **kw)
+
+
+class SimdjsonBackend(JSONBackend):
+    """Decodes with simdjson, which does not encode."""
+
+    name = "simdjson"
+
+    def __init__(self):
+        import simdjson
+
+        self._loads = simdjson.loads
+
+    def loads(self, data):
+        try:
+            return self._loads(data)
+        except (ValueError, RuntimeError):
+            # RuntimeError is raised for integers of more than 64 bits.
+            return super(SimdjsonBackend, self).loads(data)
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (JSONBackend, OrjsonBackend, UjsonBackend, SimdjsonBackend)
+}
+
+# The backends picked by ``auto``, fastest first.
+AUTO_BACKENDS = ("orjson", "ujson", "simdjson", "json")
+
+
+def get_json_backend(name=None):
+    """Return an instance of the JSON backend called ``name``.
+
+    :param name: ``json`` (the default), ``orjson``, ``ujson``, ``simdjson``,
+        ``auto`` or the dotted name of a :class:`JSONBackend` subclass.
+    :raises ImportError: if the library of the backend is not installed.
+    """
+    name = name or "json"
+    if name == "auto":
+        for candidate in AUTO_BACKENDS:
+            try:
+                return BACKENDS[candidate]()
+            except ImportError:
+                continue
+    if name in BACKENDS:
+        return BACKENDS[name]()
+    return DottedNameResolver().resolve(name)()
@@ -5,7 +5,7 @@ import copy
 import functools
 import itertools
 
-from pyramid.exceptions import PredicateMismatch
+from pyramid.exceptions import ConfigurationError, PredicateMismatch
 from pyramid.httpexceptions import (
     HTTPException,
     HTTPMethodNotAllowed,
@@ -13,16 +13,20 @@ from pyramid.httpexceptions import (
     HTTPUnsupportedMediaType,
 )
 from pyramid.security import NO_PERMISSION_REQUIRED
+from pyramid.settings import asbool
 
+from cornice.caching import apply_auto_etag, apply_cache_headers, cache_control_header
 from cornice.cors import (
     CORS_PARAMETERS,
     apply_cors_post_request,
+    compile_cors_policies,
     get_cors_preflight_view,
     get_cors_validator,
 )
 from cornice.errors import Errors
 from cornice.service import decorate_view
 from cornice.util import (
+    acceptable_offers,
     content_type_matches,
     current_service,
     is_string,
@@ -30,6 +34,7 @@ from cornice.util import (
     match_content_type_header,
     to_list,
 )
+from cornice.validators import prepare_validators
 
 
 def get_fallback_view(service):
@@ -62,7 +67,7 @@ def get_fallback_view(service):
                 acceptable = list(set(acceptable))
 
                 # Now check if that was actually the source of the problem.
-                if not request.accept.acceptable_offers(offers=acceptable):
+                if not acceptable_offers(request, acceptable):
                     request.errors.add(
                         "header",
                         "Accept",
@@ -111,6 +116,10 @@ def apply_filters(request, response):
         service = current_service(request)
         if service is not None:
             kwargs, ob = getattr(request, "cornice_args", ({}, None))
+            cache = kwargs.get("cache")
+            if cache is not None:
+                # the rendered response, before it is filtered
+                cache.store(request, response)
             for _filter in kwargs.get("filters", []):
                 if is_string(_filter) and ob is not None:
                     _filter = getattr(ob, _filter)
@@ -120,6 +129,17 @@ def apply_filters(request, response):
                     response = _filter(response)
             if service.cors_enabled:
                 apply_cors_post_request(service, request, response)
+            if kwargs.get("auto_etag"):
+                apply_auto_etag(request, response)
+            apply_cache_headers(service, request, response, kwargs)
+            compression = getattr(request.registry, "cornice_compression", None)
+            if compression is not None:
+                compression.apply(
+                    request,
+                    response,
+                    kwargs.get("compress"),
+                    kwargs.get("compress_streams", False),
+                )
 
     return response
 
@@ -188,6 +208,11 @@ def register_service_views(config, service):
         service.add_view(
             "options", view=get_cors_preflight_view(service), permission=NO_PERMISSION_REQUIRED
         )
+    if service.cors_enabled:
+        always_cors = asbool(config.get_settings().get("cornice.always_cors"))
+        config.registry.cornice_cors_policies[service] = compile_cors_policies(
+            service, always_cors
+        )
 
     # register the fallback view, which takes care of returning good error
     # messages to the user-agent
@@ -197,10 +222,22 @@ def register_service_views(config, service):
     cornice_parameters = (
         "filters",
         "validators",
+        "validators_executor",
         "schema",
         "klass",
         "error_handler",
         "deserializer",
+        "compiled",
+        "max_errors",
+        "bulk_executor",
+        "bulk_chunk_size",
+        "compress",
+        "compress_streams",
+        "auto_etag",
+        "etag",
+        "last_modified",
+        "cache_control",
+        "cache",
     ) + CORS_PARAMETERS
 
     # 1. register route
@@ -237,10 +274,21 @@ def register_service_views(config, service):
                 args[item] = copy.deepcopy(args[item])
 
         args["request_method"] = method
+        if args.get("cache_control") is not None:
+            # serialized once, not on every response
+            args["cache_control"] = cache_control_header(args["cache_control"])
 
         if service.cors_enabled:
             args["validators"].insert(0, cors_validator)
 
+        # compile the schemas now, so that the invalid ones fail at startup
+        try:
+            prepare_validators(args)
+        except ValueError as e:
+            raise ConfigurationError(
+                "Invalid schema for the %s view of %r: %s" % (method, service.name, e)
+            )
+
         decorated_view = decorate_view(view, dict(args), method, route_args)
 
         for item in cornice_parameters:
@@ -1,7 +1,15 @@
+import json
+import re
+import uuid
+from collections.abc import Iterable, Iterator, Mapping
+from itertools import islice
+
 from pyramid import httpexceptions as exc
 from pyramid.renderers import JSON
 from pyramid.response import Response
 
+from cornice.util import ACCEPT_CACHE, acceptable_offers
+
 
 def bytes_adapter(obj, request):
     """Convert bytes objects to strings for json error renderer."""
@@ -10,9 +18,47 @@ def bytes_adapter(obj, request):
     return obj
 
 
+class RawJSON(object):
+    """A JSON document which is already serialized, eg. read from a cache or
+    from a JSON column.
+
+    :class:`CorniceRenderer` splices it verbatim into the response, wherever
+    it is nested in the value returned by the view, instead of decoding and
+    encoding it again. Its validity is not checked.
+
+    Newlines in the fragments, which can only be whitespace in valid JSON,
+    are removed by :class:`CorniceNDJSONRenderer`, so that each document
+    stays on its line.
+
+    :param data: The document, a :class:`str` or UTF-8 encoded :class:`bytes`.
+    :raises UnicodeDecodeError: if ``data`` is :class:`bytes` which are not
+        valid UTF-8.
+    """
+
+    __slots__ = ("text",)
+
+    def __init__(self, data):
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            data = bytes(data).decode("utf-8")
+        self.text = data
+
+    def __json__(self, request):
+        # Used by the renderers which do not splice it.
+        return json.loads(self.text)
+
+
+# The strings standing for the raw JSON fragments until the document is
+# serialized, unique to the process so that they cannot be sent by clients.
+_RAW_PREFIX = "cornice-raw-%s-" % uuid.uuid4().hex
+_RAW_PLACEHOLDER = _RAW_PREFIX + "%d"
+_RAW_PATTERN = re.compile('"%s(\\d+)"' % _RAW_PREFIX)
+
+
 class JSONError(exc.HTTPError):
     def __init__(self, serializer, serializer_kw, errors, status=400):
         body = {"status": "error", "errors": errors}
+        if getattr(errors, "truncated", False):
+            body["truncated"] = True
         Response.__init__(self, serializer(body, **serializer_kw))
         self.status = status
         self.content_type = "application/json"
@@ -33,6 +79,13 @@ class CorniceRenderer(JSON):
 
     acceptable = ("application/json", "text/plain")
 
+    #: The content negotiations cache, shared with the ``accept`` predicates
+    #: and the fallback views. Its ``hits`` and ``misses`` are counted.
+    accept_cache = ACCEPT_CACHE
+
+    #: Number of items serialized together when streaming a JSON array.
+    stream_batch_size = 256
+
     def __init__(self, *args, **kwargs):
         """Adds a `bytes` adapter by default."""
         super(CorniceRenderer, self).__init__(*args, **kwargs)
@@ -60,9 +113,14 @@ class CorniceRenderer(JSON):
             1. Overrides the response with an empty string and
                no Content-Type in case of HTTP 204.
             2. Overrides the default behavior of Content-Type handling,
-               forcing the use of `acceptable_offers`, instead of letting
+               forcing the use of `acceptable_offers` (with its results
+               cached per ``Accept`` header), instead of letting
                the user specify the Content-Type manually.
                TODO: maybe explain this a little better
+            3. Streams iterators (eg. generators) as JSON arrays, see
+               :meth:`stream`.
+            4. Splices :class:`RawJSON` fragments verbatim, see
+               :meth:`serialize`.
         """
         request = system.get("request")
         if request is not None:
@@ -73,12 +131,70 @@ class CorniceRenderer(JSON):
                 response.content_type = None
                 return ""
 
-            ctypes = request.accept.acceptable_offers(offers=self.acceptable)
+            ctypes = acceptable_offers(request, self.acceptable)
             if not ctypes:
                 ctypes = [(self.acceptable[0], 1.0)]
             response.content_type = ctypes[0][0]
         default = self._make_default(request)
-        return self.serializer(value, default=default, **self.kw)
+        if isinstance(value, Iterator):
+            return self.stream(value, default)
+        return self.serialize(value, default)
+
+    def serialize(self, value, default):
+        """Serialize ``value`` to a :class:`str`.
+
+        The :class:`RawJSON` fragments it contains are replaced by
+        placeholders while serializing, which are then substituted with the
+        fragments, so that they are neither decoded nor encoded again.
+        """
+        if isinstance(value, RawJSON):
+            return self._fragment(value)
+        fragments = []
+
+        def splice(obj):
+            if isinstance(obj, RawJSON):
+                fragments.append(self._fragment(obj))
+                return _RAW_PLACEHOLDER % (len(fragments) - 1)
+            return default(obj)
+
+        result = self.serializer(value, default=splice, **self.kw)
+        if fragments:
+            result = _RAW_PATTERN.sub(lambda match: fragments[int(match.group(1))], result)
+        return result
+
+    def _fragment(self, raw):
+        return raw.text
+
+    def stream(self, items, default):
+        """Serialize the ``items`` iterator as a JSON array, lazily.
+
+        Returns an iterator of chunks of bytes, used as the ``app_iter`` of
+        the response: the items are consumed while the response is being
+        sent, ``stream_batch_size`` at a time, so that the whole collection is
+        never held in memory.
+
+        The first batch is serialized right away, so that its errors are
+        handled like those of the view. The status and headers are sent with
+        it: a later exception truncates the response.
+        """
+        first = self._serialize_batch(items, default)
+        return self._stream(first, items, default)
+
+    def _serialize_batch(self, items, default):
+        batch = list(islice(items, self.stream_batch_size))
+        if not batch:
+            return None
+        # Serialize the batch as an array, without its brackets.
+        return self.serialize(batch, default)[1:-1].encode("utf-8")
+
+    def _stream(self, chunk, items, default):
+        yield b"["
+        separator = b""
+        while chunk is not None:
+            yield separator + chunk
+            separator = b", "
+            chunk = self._serialize_batch(items, default)
+        yield b"]"
 
     def __call__(self, info):
         """Overrides the default behavior of `pyramid.renderers.JSON`.
@@ -87,3 +203,50 @@ class CorniceRenderer(JSON):
         `__call__`, to let the user extend it if necessary.
         """
         return self.render
+
+
+class CorniceNDJSONRenderer(CorniceRenderer):
+    """Renders newline-delimited JSON, one document per line.
+
+    Iterables returned by the views are streamed (see
+    :meth:`CorniceRenderer.stream`), one line per item. Other values are
+    rendered on a single line. It is registered as ``cornicendjson``.
+    """
+
+    acceptable = ("application/x-ndjson",)
+
+    def render(self, value, system):
+        request = system.get("request")
+        if request is not None:
+            response = request.response
+
+            # Do not return content with ``204 No Content``
+            if response.status_code == 204:
+                response.content_type = None
+                return ""
+
+            response.content_type = self.acceptable[0]
+        default = self._make_default(request)
+        if isinstance(value, (str, bytes, Mapping)) or not isinstance(value, Iterable):
+            value = [value]
+        return self.stream(iter(value), default)
+
+    def _fragment(self, raw):
+        text = raw.text
+        if "\n" in text or "\r" in text:
+            # pretty-printed, but each document must fit on a line
+            text = text.replace("\r", "").replace("\n", "")
+        return text
+
+    def _serialize_batch(self, items, default):
+        batch = list(islice(items, self.stream_batch_size))
+        if not batch:
+            return None
+        lines = [self.serialize(item, default) for item in batch]
+        lines.append("")
+        return "\n".join(lines).encode("utf-8")
+
+    def _stream(self, chunk, items, default):
+        while chunk is not None:
+            yield chunk
+            chunk = self._serialize_batch(items, default)
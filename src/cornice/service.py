@@ -2,16 +2,33 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 import functools
+import inspect
+import io
+import threading
+from concurrent.futures import wait
+from contextvars import copy_context
 
 import venusian
 from pyramid.exceptions import ConfigurationError
 from pyramid.interfaces import IRendererFactory
 from pyramid.response import Response
 
-from cornice.util import func_name, is_string, to_list
+from cornice.caching import check_preconditions, not_modified
+from cornice.cors import ensure_origin
+from cornice.errors import TooManyErrors
+from cornice.util import (
+    func_name,
+    get_thread_pool,
+    is_string,
+    request_scope,
+    run_concurrently,
+    to_list,
+)
 from cornice.validators import (
     DEFAULT_FILTERS,
     DEFAULT_VALIDATORS,
+    _body_version,
+    _keep_cstructs,
 )
 
 
@@ -64,10 +81,30 @@ class Service(object):
         A list of callables to pass the request into before passing it to the
         associated view.
 
+    :param validators_executor:
+        The :class:`concurrent.futures.Executor` running the validators which
+        do not depend on each other (see
+        :func:`cornice.validators.dependencies`). Defaults to a thread pool
+        shared by all the views.
+
     :param filters:
         A list of callables to pass the response into before returning it to
         the client.
 
+    :param compress:
+        Whether the responses are compressed, overriding the
+        ``cornice.compress`` setting (see :mod:`cornice.compression`).
+
+    :param compress_streams:
+        Whether the streamed responses are compressed too, chunk by chunk.
+        False by default.
+
+    :param auto_etag:
+        If True, the ``ETag`` of the successful ``GET`` and ``HEAD`` responses
+        is set to a hash of their body, and the requests whose
+        ``If-None-Match`` header matches it are answered with a
+        ``304 Not Modified``. False by default.
+
     :param accept:
         A list of ``Accept`` header values accepted for this service
         (or method if overwritten when defining a method).
@@ -100,6 +137,38 @@ class Service(object):
         failures.  By default it will call the registered renderer
         `render_errors` method.
 
+    :param etag:
+        A callable taking the request and returning the current ETag of the
+        resource, or ``None``. It is called once the request is validated,
+        and the ``If-Match`` and ``If-None-Match`` headers are evaluated
+        against it: matching ``GET`` and ``HEAD`` requests are answered with
+        a ``304 Not Modified``, failing preconditions with a
+        ``412 Precondition Failed``, without calling the view.
+
+    :param last_modified:
+        Likewise, a callable returning the modification date of the
+        resource, as a :class:`datetime.datetime` or a timestamp, against
+        which the ``If-Modified-Since`` and ``If-Unmodified-Since`` headers
+        are evaluated.
+
+    :param cache_control:
+        The ``Cache-Control`` header of the successful ``GET`` and ``HEAD``
+        responses, either a string or a dict of directives, such as
+        ``{"max_age": 60, "s_maxage": 300, "stale_while_revalidate": 30,
+        "public": True}``. Responses which have one already are left
+        untouched.
+
+    :param cache:
+        A :class:`cornice.caching.ResponseCache`, caching the rendered
+        responses of the ``GET`` and ``HEAD`` requests. It is checked before
+        the validators run. Once given to the service, it is available as
+        its ``cache`` attribute, eg. to invalidate entries.
+
+    :param max_errors:
+        The maximum number of validation errors to collect. Once it is
+        reached, validation stops, the remaining validators are skipped and
+        the errors response is marked as ``"truncated"``.
+
     :param traverse:
         A traversal pattern that will be passed on route declaration and that
         will be used as the traversal path.
@@ -551,6 +620,89 @@ class Service(object):
         return max_age
 
 
+def _schedule_validators(validators, klass=None):
+    """Group the validators in batches to run one after the other.
+
+    The validators of a batch do not depend on each other, according to the
+    names they declare with :func:`cornice.validators.dependencies`, and can
+    run in parallel. Validators without declarations get a batch of their
+    own.
+    """
+    batches = []
+    barrier = -1  # the last batch of a validator without declarations
+    provided = {}  # the last batch providing each name
+    required = {}  # the last batch requiring each name
+    for validator in validators:
+        target = validator
+        if is_string(validator) and klass is not None:
+            target = getattr(klass, validator, None)
+        requires = getattr(target, "requires", None)
+        provides = getattr(target, "provides", None)
+        if requires is None and provides is None:
+            batches.append([validator])
+            barrier = len(batches) - 1
+            continue
+        requires, provides = requires or (), provides or ()
+        after = max(
+            [barrier]
+            + [provided.get(name, -1) for name in requires]
+            + [max(provided.get(name, -1), required.get(name, -1)) for name in provides]
+        )
+        if after + 1 == len(batches):
+            batches.append([])
+        batches[after + 1].append(validator)
+        for name in provides:
+            provided[name] = after + 1
+        for name in requires:
+            required[name] = max(required.get(name, -1), after + 1)
+    return batches
+
+
+class _ThreadLocalBody(threading.local):
+    """The body of a request, each thread reading it from its own stream."""
+
+    def __init__(self, body):
+        self.stream = io.BytesIO(body)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def _run_in_threads(executor, validators, request, args):
+    """Run the validators in the executor, and return their results once they
+    are all done.
+
+    The first exception raised, in the order of ``validators``, is raised
+    again.
+    """
+    body_file = None
+    if getattr(request, "is_body_readable", False):
+        # The body is read here once: webob copies and rewinds the input
+        # stream on every read, which threads cannot do at the same time.
+        body_file = _ThreadLocalBody(request.body)
+        version = _body_version(request)
+        original, request.body_file_raw = request.body_file_raw, body_file
+        _keep_cstructs(request, version)
+    futures = [
+        executor.submit(copy_context().run, validator, request, **args) for validator in validators
+    ]
+    wait(futures)
+    if body_file is not None and request.body_file_raw is body_file:
+        # unless a validator replaced the body
+        version = _body_version(request)
+        request.body_file_raw = original
+        _keep_cstructs(request, version)
+    for future in futures:
+        if future.exception() is not None:
+            # the awaitables returned by the others will never be awaited
+            for other in futures:
+                result = other.result() if other.exception() is None else None
+                if inspect.iscoroutine(result):
+                    result.close()
+            raise future.exception()
+    return [future.result() for future in futures]
+
+
 def decorate_view(view, args, method, route_args={}):
     """Decorate a given view with cornice niceties.
 
@@ -563,7 +715,39 @@ def decorate_view(view, args, method, route_args={}):
     :param route_args: the args used for the associated route
     """
 
+    # validators are scheduled once, independent ones being run in parallel
+    batches = _schedule_validators(args.get("validators", ()), args.get("klass"))
+    etag = args.get("etag")
+    last_modified = args.get("last_modified")
+
     def wrapper(request):
+        # validators and views can access the request being handled with
+        # ``cornice.validators.current_request()``
+        with request_scope(request):
+            return _call_view(request)
+
+    def _preconditions_failed(request, ob):
+        """Check the conditional headers of the request, if the view has an
+        ``etag`` or a ``last_modified``, and return the status of the failed
+        precondition, if any. 412 ones are added to the errors."""
+        if etag is None and last_modified is None:
+            return None
+        failed = check_preconditions(
+            request,
+            getattr(ob, etag) if is_string(etag) and ob is not None else etag,
+            getattr(ob, last_modified)
+            if is_string(last_modified) and ob is not None
+            else last_modified,
+        )
+        if failed is None:
+            return None
+        status, header = failed
+        if status != 304:
+            request.errors.add("header", header, "Precondition failed")
+            request.errors.status = status
+        return status
+
+    def _call_view(request):
         # if the args contain a klass argument then use it to resolve the view
         # location (if the view argument isn't a callable)
         ob = None
@@ -581,17 +765,79 @@ def decorate_view(view, args, method, route_args={}):
             elif isinstance(view, _UnboundView):
                 view_ = view.make_bound_view(ob)
 
+        # cached responses are served before the validators run, and are
+        # filtered again
+        cache = args.get("cache")
+        if cache is not None:
+            response = cache.lookup(request)
+            if response is not None:
+                # the cached responses are shared between the origins
+                service = request.current_service
+                if service is not None and service.cors_enabled:
+                    ensure_origin(service, request, response)
+                # the preconditions are checked against the current version
+                # of the resource, not the cached one
+                if len(request.errors) == 0 and _preconditions_failed(request, ob) == 304:
+                    if etag is not None:
+                        response.etag = request.response.etag
+                    if last_modified is not None:
+                        response.last_modified = request.response.last_modified
+                    not_modified(response)
+                if len(request.errors) > 0:
+                    request.info["cors_checked"] = False
+                    return args["error_handler"](request)
+                request.cornice_args = (args, ob)
+                return response
+
         # the validators can either be a list of callables or contain some
         # non-callable values. In which case we want to resolve them using the
         # object if any
-        validators = args.get("validators", ())
-        for validator in validators:
-            if is_string(validator) and ob is not None:
-                validator = getattr(ob, validator)
-            validator(request, **args)
+        max_errors = args.get("max_errors")
+        if max_errors is not None:
+            request.errors.max_errors = max_errors
+            # only the validators are stopped once the budget is spent
+            request.errors.raise_when_full = True
+        # async validators are awaited together, once the sync ones ran
+        pending = []
+        try:
+            for batch in batches:
+                if max_errors is not None and request.errors.remaining == 0:
+                    # stop validating once the error budget is spent
+                    request.errors.truncated = True
+                    break
+                batch = [
+                    getattr(ob, validator)
+                    if is_string(validator) and ob is not None
+                    else validator
+                    for validator in batch
+                ]
+                if len(batch) == 1:
+                    results = [batch[0](request, **args)]
+                else:
+                    executor = args.get("validators_executor") or get_thread_pool()
+                    results = _run_in_threads(executor, batch, request, args)
+                pending.extend(result for result in results if inspect.isawaitable(result))
+            else:
+                if pending:
+                    awaitables, pending = pending, []
+                    run_concurrently(awaitables)
+        except TooManyErrors:
+            pass
+        finally:
+            if max_errors is not None:
+                request.errors.raise_when_full = False
+            for coroutine in pending:
+                if inspect.iscoroutine(coroutine):
+                    coroutine.close()
+
+        # answer the conditional requests without calling the view, from the
+        # current version of the resource
+        response = None
+        if len(request.errors) == 0 and _preconditions_failed(request, ob) == 304:
+            response = not_modified(request.response)
 
         # only call the view if we don't have validation errors
-        if len(request.errors) == 0:
+        if len(request.errors) == 0 and response is None:
             try:
                 # If we have an object, it already has the request.
                 if ob:
@@ -1,7 +1,14 @@
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
+import asyncio
+import collections
+import contextlib
+import threading
 import warnings
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
 
 
 __all__ = [
@@ -10,7 +17,10 @@ __all__ = [
     "match_accept_header",
     "ContentTypePredicate",
     "current_service",
+    "current_request",
     "func_name",
+    "LRUCache",
+    "acceptable_offers",
 ]
 
 
@@ -44,7 +54,7 @@ def match_accept_header(func, context, request):
     """
     acceptable = to_list(func(request))
     request.info["acceptable"] = acceptable
-    return len(request.accept.acceptable_offers(acceptable)) > 0
+    return len(acceptable_offers(request, acceptable)) > 0
 
 
 def match_content_type_header(func, context, request):
@@ -136,3 +146,233 @@ def current_service(request):
         # try pattern first, then route name else return None
         service = services.get(pattern, services.get("__cornice" + name))
         return service
+
+
+_current_request = ContextVar("cornice_current_request", default=None)
+
+
+def current_request():
+    """Return the request being validated or handled by a Cornice view.
+
+    The request is scoped to the current thread (or asyncio task), which
+    makes it safe to read from objects shared between threads, like schema
+    instances.
+
+    :returns: the request or None if there is none.
+    :rtype: :class:`~pyramid:pyramid.request.Request`
+    """
+    return _current_request.get()
+
+
+@contextlib.contextmanager
+def request_scope(request):
+    """Make ``request`` the :func:`current_request` within the block."""
+    token = _current_request.set(request)
+    try:
+        yield request
+    finally:
+        _current_request.reset(token)
+
+
+_loops = threading.local()
+
+
+def get_event_loop():
+    """Return the event loop of the current thread, created on first use.
+
+    The loop is kept for the lifetime of the thread, so that async
+    validators can reuse the connections and other resources bound to it.
+    """
+    loop = getattr(_loops, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = _loops.loop = asyncio.new_event_loop()
+    return loop
+
+
+def run_concurrently(awaitables):
+    """Wait for ``awaitables`` concurrently on the loop of the current thread.
+
+    They all run to completion; the first exception raised, in the order of
+    ``awaitables``, is then raised again.
+
+    :returns: the list of their results.
+    """
+
+    async def gather():
+        return await asyncio.gather(*awaitables, return_exceptions=True)
+
+    results = get_event_loop().run_until_complete(gather())
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
+
+# Maximum number of validators run at once by the shared thread pool.
+VALIDATORS_THREADS = 16
+
+_thread_pool = None
+_thread_pool_lock = threading.Lock()
+
+
+def get_thread_pool():
+    """Return the thread pool shared by the views to run their independent
+    validators, created on first use."""
+    global _thread_pool
+    with _thread_pool_lock:
+        if _thread_pool is None:
+            _thread_pool = ThreadPoolExecutor(
+                max_workers=VALIDATORS_THREADS, thread_name_prefix="cornice-validators"
+            )
+    return _thread_pool
+
+
+class LRUCache(object):
+    """A thread-safe mapping holding at most ``maxsize`` entries.
+
+    When full, the least recently used entry is evicted. Lookups made through
+    :meth:`get` are counted in the ``hits`` and ``misses`` attributes.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+class _SchemaCacheEntry(object):
+    """The values a :class:`SchemaCache` keeps with a schema.
+
+    Copies of the schema, such as the clones of colander, get an empty entry.
+    """
+
+    __slots__ = ("owner", "values")
+
+    def __init__(self, owner=None):
+        self.owner = weakref.ref(owner) if owner is not None else None
+        self.values = {}
+
+    def __reduce__(self):
+        return (_SchemaCacheEntry, ())
+
+
+class SchemaCache(object):
+    """A thread-safe cache of values computed from schemas, such as the
+    compiled validators, keyed on the identity of the schema.
+
+    The values are kept in an attribute of the schemas that accept one, so
+    that a schema created on the fly, eg. bound to a request, is freed along
+    with them. Other schemas, such as dicts, are kept in a :class:`LRUCache`
+    of ``maxsize`` entries, with a reference to the schema so that its
+    identity cannot be recycled. Lookups are counted in the ``hits`` and
+    ``misses`` attributes.
+
+    :param name: The name of the attribute of the schemas holding the values.
+    """
+
+    def __init__(self, name, maxsize=1024):
+        self.attribute = "_cornice_" + name
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._lru = LRUCache(maxsize)
+        self._schemas = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        entries = [getattr(schema, self.attribute, None) for schema in self._schemas.values()]
+        return len(self._lru) + sum(len(entry.values) for entry in entries if entry)
+
+    def _entry(self, schema):
+        entry = getattr(schema, "__dict__", {}).get(self.attribute)
+        if entry is not None and entry.owner is not None and entry.owner() is schema:
+            return entry
+        return None
+
+    def get(self, schema, key=None, default=None):
+        entry = self._entry(schema)
+        if entry is not None:
+            value = entry.values.get(key, default)
+        else:
+            value = self._lru.get((id(schema), key), (None, default))[1]
+        with self._lock:
+            if value is default:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, schema, value, key=None):
+        entry = self._entry(schema)
+        if entry is None:
+            try:
+                entry = _SchemaCacheEntry(schema)
+                setattr(schema, self.attribute, entry)
+            except (AttributeError, TypeError):
+                # Neither weakly referenced nor holding attributes.
+                self._lru.set((id(schema), key), (schema, value))
+                return
+            self._schemas[id(schema)] = schema
+        entry.values[key] = value
+
+    def clear(self):
+        for schema in list(self._schemas.values()):
+            if self._entry(schema) is not None:
+                delattr(schema, self.attribute)
+        self._schemas.clear()
+        self._lru.clear()
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+# Results of the content negotiations, keyed on the ``Accept`` header and the
+# offered media types. Clients send a handful of distinct headers.
+ACCEPT_CACHE = LRUCache(maxsize=256)
+
+
+def acceptable_offers(request, offers):
+    """Return the ``(media type, quality)`` of the ``offers`` acceptable for
+    the ``Accept`` header of the request, best first.
+
+    The results are cached in :data:`ACCEPT_CACHE`, which counts its hits and
+    misses.
+    """
+    key = (request.headers.get("Accept"), tuple(offers))
+    result = ACCEPT_CACHE.get(key)
+    if result is None:
+        result = tuple(request.accept.acceptable_offers(offers=key[1]))
+        ACCEPT_CACHE.set(key, result)
+    return result
@@ -1,15 +1,33 @@
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
+import copy
+import json
 import re
+from collections.abc import MutableMapping
 
 from webob.multidict import MultiDict
 
+from cornice.util import current_request
 from cornice.validators._colander import body_validator as colander_body_validator
 from cornice.validators._colander import headers_validator as colander_headers_validator
 from cornice.validators._colander import path_validator as colander_path_validator
 from cornice.validators._colander import querystring_validator as colander_querystring_validator
 from cornice.validators._colander import validator as colander_validator
+from cornice.validators._fast import Field as FastField
+from cornice.validators._fast import body_validator as fast_body_validator
+from cornice.validators._fast import bulk_body_validator as fast_bulk_body_validator
+from cornice.validators._fast import headers_validator as fast_headers_validator
+from cornice.validators._fast import path_validator as fast_path_validator
+from cornice.validators._fast import querystring_validator as fast_querystring_validator
+from cornice.validators._fast import validator as fast_validator
+from cornice.validators._jsonschema import body_validator as jsonschema_body_validator
+from cornice.validators._jsonschema import headers_validator as jsonschema_headers_validator
+from cornice.validators._jsonschema import path_validator as jsonschema_path_validator
+from cornice.validators._jsonschema import (
+    querystring_validator as jsonschema_querystring_validator,
+)
+from cornice.validators._jsonschema import validator as jsonschema_validator
 from cornice.validators._marshmallow import body_validator as marshmallow_body_validator
 from cornice.validators._marshmallow import headers_validator as marshmallow_headers_validator
 from cornice.validators._marshmallow import path_validator as marshmallow_path_validator
@@ -30,7 +48,22 @@ __all__ = [
     "marshmallow_headers_validator",
     "marshmallow_path_validator",
     "marshmallow_querystring_validator",
+    "fast_validator",
+    "fast_body_validator",
+    "fast_bulk_body_validator",
+    "fast_headers_validator",
+    "fast_path_validator",
+    "fast_querystring_validator",
+    "FastField",
+    "jsonschema_validator",
+    "jsonschema_body_validator",
+    "jsonschema_headers_validator",
+    "jsonschema_path_validator",
+    "jsonschema_querystring_validator",
     "extract_cstruct",
+    "NDJSONBody",
+    "current_request",
+    "dependencies",
     "DEFAULT_VALIDATORS",
     "DEFAULT_FILTERS",
 ]
@@ -40,51 +73,294 @@ DEFAULT_VALIDATORS = []
 DEFAULT_FILTERS = []
 
 
-def extract_cstruct(request):
+def dependencies(requires=(), provides=()):
     """
-    Extract attributes from the specified `request` such as body, url, path,
-    method, querystring, headers, cookies, and returns them in a single dict
-    object.
+    Declare what a validator reads and stores, so that validators which do
+    not depend on each other run in parallel.
 
-    :param request: Current request
-    :type request: :class:`~pyramid:pyramid.request.Request`
+    Validators of a view run in the order they are given, but a validator
+    declaring its dependencies only waits for the validators providing what
+    it requires (and those reading or providing what it provides). Validators
+    without declarations wait for all the previous ones.
 
-    :returns: A mapping containing most request attributes.
-    :rtype: dict
+    :param requires: Names the validator reads, such as request locations or
+        keys of ``request.validated`` provided by other validators.
+    :param provides: Keys the validator stores in ``request.validated``.
+    """
+
+    def wrapper(validator):
+        validator.requires = tuple(requires)
+        validator.provides = tuple(provides)
+        return validator
+
+    return wrapper
+
+
+def prepare_validators(args):
+    """
+    Let the validators of a view prepare for its arguments, when the view is
+    registered.
+
+    Validators having a ``prepare`` attribute get it called with the
+    arguments of the view, eg. to compile their schema once and report the
+    invalid ones at startup rather than on the first request.
+
+    :raises ValueError: if a schema is invalid.
+    """
+    for validator in args.get("validators", ()):
+        prepare = getattr(validator, "prepare", None)
+        if prepare is not None:
+            prepare(**args)
+
+
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+
+class NDJSONBody(object):
+    """
+    The documents of a newline-delimited JSON body, decoded lazily.
+
+    Each iteration reads the body again, line by line, so that it is never
+    held in memory as a whole. Invalid lines are skipped, and reported once
+    in ``request.errors`` with their line number (starting at 1) as name.
     """
+
+    def __init__(self, request):
+        self._request = request
+        self._reported = set()
+
+    def __iter__(self):
+        for _, document in self.numbered():
+            yield document
+
+    def numbered(self):
+        """Iterate over the ``(line number, document)`` of the body."""
+        request = self._request
+        registry = getattr(request, "registry", None)
+        json_backend = getattr(registry, "cornice_json_backend", None)
+        loads = json.loads if json_backend is None else json_backend.loads
+        body = request.body_file_seekable
+        body.seek(0)
+        for lineno, line in enumerate(body, 1):
+            if not line.strip():
+                continue
+            try:
+                yield lineno, loads(line)
+            except ValueError as e:
+                if lineno not in self._reported:
+                    self._reported.add(lineno)
+                    request.errors.add("body", str(lineno), "Invalid JSON: %s" % e)
+
+
+def _extract_body(request):
+    if request.content_type == NDJSON_CONTENT_TYPE:
+        return NDJSONBody(request)
+
     is_json = re.match("^application/(.*?)json$", str(request.content_type))
 
     if request.content_type in ("application/x-www-form-urlencoded", "multipart/form-data"):
-        body = request.POST.mixed()
+        return request.POST.mixed()
     elif request.content_type and not is_json:
-        body = request.body
-    else:
-        if request.body:
-            try:
-                body = request.json_body
-            except ValueError as e:
-                request.errors.add("body", "", "Invalid JSON: %s" % e)
-                return {}
-            else:
-                if not hasattr(body, "items") and not isinstance(body, list):
-                    request.errors.add("body", "", "Should be a JSON object or an array")
-                    return {}
+        return request.body
+
+    if not request.body:
+        return {}
+    registry = getattr(request, "registry", None)
+    json_backend = getattr(registry, "cornice_json_backend", None)
+    try:
+        if json_backend is None or json_backend.name == "json":
+            body = request.json_body
         else:
-            body = {}
+            body = json_backend.loads(_body_text(request))
+    except ValueError as e:
+        request.errors.add("body", "", "Invalid JSON: %s" % e)
+        return _MISSING
+    if not hasattr(body, "items") and not isinstance(body, list):
+        request.errors.add("body", "", "Should be a JSON object or an array")
+        return _MISSING
+    return body
+
+
+def _body_text(request):
+    """Return the body of the request, without decoding it if it is UTF-8."""
+    if request.charset.lower() in ("utf-8", "utf8"):
+        return request.body
+    return request.body.decode(request.charset)
 
-    cstruct = {
-        "method": request.method,
-        "url": request.url,
-        "path": request.matchdict,
-        "body": body,
-    }
 
-    for sub, attr in (("querystring", "GET"), ("header", "headers"), ("cookies", "cookies")):
+def _extract_attribute(attr):
+    def _extract(request):
         data = getattr(request, attr)
         if isinstance(data, MultiDict):
-            data = data.mixed()
+            return data.mixed()
+        return dict(data)
+
+    return _extract
+
+
+_MISSING = object()
+_DELETED = object()
+
+# How to extract each location of the cstruct from the request.
+_LOCATIONS = {
+    "method": lambda request: request.method,
+    "url": lambda request: request.url,
+    "path": lambda request: request.matchdict,
+    "body": _extract_body,
+    "querystring": _extract_attribute("GET"),
+    "header": _extract_attribute("headers"),
+    "cookies": _extract_attribute("cookies"),
+}
+
+
+class _LazyCstruct(MutableMapping):
+    """
+    A mapping of the request locations, each extracted from the request the
+    first time it is accessed.
+
+    A schema that only reads the body does not pay for the copy of the
+    headers, cookies or querystring. If the body cannot be decoded, the error
+    is added to ``request.errors`` and the ``body`` key is missing.
+
+    Copies share the extracted locations, but not the values set on them.
+    """
+
+    def __init__(self, request, extracted=None):
+        self._request = request
+        self._extracted = {} if extracted is None else extracted
+        self._local = {}
+
+    def _extract(self, key):
+        try:
+            return self._extracted[key]
+        except KeyError:
+            value = _LOCATIONS[key](self._request)
+            self._extracted[key] = value
+            return value
+
+    def __getitem__(self, key):
+        if key in self._local:
+            value = self._local[key]
+        elif key in _LOCATIONS:
+            value = self._extract(key)
         else:
-            data = dict(data)
-        cstruct[sub] = data
+            raise KeyError(key)
+        if value is _MISSING or value is _DELETED:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        if key in self._local:
+            return self._local[key] is not _DELETED
+        if key == "body":
+            return self._extract(key) is not _MISSING
+        return key in _LOCATIONS
+
+    def __setitem__(self, key, value):
+        self._local[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._local[key] = _DELETED
+
+    def __iter__(self):
+        for key in _LOCATIONS:
+            if key in self:
+                yield key
+        for key in list(self._local):
+            if key not in _LOCATIONS and key in self:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def copy(self):
+        cstruct = _LazyCstruct(self._request, self._extracted)
+        cstruct._local = dict(self._local)
+        return cstruct
+
+    __copy__ = copy
+
+
+def extract_cstruct(request):
+    """
+    Extract attributes from the specified `request` such as body, url, path,
+    method, querystring, headers, cookies, and returns them in a single dict
+    object.
+
+    Each attribute is only extracted from the request the first time it is
+    read from the returned mapping.
+
+    Newline-delimited JSON bodies (``application/x-ndjson``) are extracted as
+    a :class:`NDJSONBody`, which decodes them lazily.
 
-    return cstruct
+    :param request: Current request
+    :type request: :class:`~pyramid:pyramid.request.Request`
+
+    :returns: A mapping containing most request attributes.
+    :rtype: :class:`collections.abc.MutableMapping`
+    """
+    return _LazyCstruct(request)
+
+
+def _get_cstruct(request, deserializer=None):
+    """
+    Return the result of ``deserializer(request)``, computed once per
+    request.
+
+    The result is shared by every validator of the request, and computed
+    again only if the request body was replaced in the meantime. Each call
+    returns a shallow copy, so validators must not modify nested values in
+    place.
+
+    :param request: Current request
+    :type request: :class:`~pyramid:pyramid.request.Request`
+    :param deserializer: Optional deserializer, defaults to
+        :func:`cornice.validators.extract_cstruct`
+
+    :rtype: :class:`collections.abc.Mapping`
+    """
+    if deserializer is None:
+        deserializer = extract_cstruct
+
+    cached = getattr(request, "_cornice_cstructs", None)
+    if cached is None:
+        cached = {}
+        request._cornice_cstructs = cached
+
+    version = _body_version(request)
+    entry = cached.get(deserializer)
+    if entry is None or entry[0] != version:
+        cstruct = deserializer(request)
+        # Reading the body may have made its stream seekable.
+        entry = (_body_version(request), cstruct)
+        cached[deserializer] = entry
+    return copy.copy(entry[1])
+
+
+def _body_version(request):
+    # Replacing the body (e.g. with ``request.body = ...``) replaces the
+    # input stream of the request.
+    environ = request.environ
+    return (
+        environ.get("wsgi.input"),
+        environ.get("CONTENT_LENGTH"),
+        environ.get("CONTENT_TYPE"),
+    )
+
+
+def _keep_cstructs(request, version):
+    """
+    Keep the cstructs computed from the body at ``version`` valid, once its
+    input stream was replaced by one with the same content.
+    """
+    cached = getattr(request, "_cornice_cstructs", None)
+    if cached:
+        current = _body_version(request)
+        for deserializer, (entry_version, cstruct) in list(cached.items()):
+            if entry_version == version:
+                cached[deserializer] = (current, cstruct)
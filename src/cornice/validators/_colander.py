@@ -2,9 +2,90 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import functools
 import inspect
 import warnings
 
+from cornice.util import SchemaCache
+from cornice.validators._colander_compiler import compile_schema
+
+
+# Wrapping schemas built by the location validators, per wrapped schema and
+# location. Schemas created on the fly (eg. bound in a custom validator) are
+# freed along with theirs.
+_REQUEST_SCHEMAS = SchemaCache("request_schemas")
+
+# Deserializers compiled for the views registered with ``compiled=True``.
+_COMPILED_SCHEMAS = SchemaCache("compiled_deserializer")
+
+
+def _get_deserialize(schema, compiled=False):
+    """
+    Return the function deserializing a cstruct with ``schema``.
+
+    :param compiled: If true, return a compiled deserializer, built once per
+        schema instance (see :mod:`cornice.validators._colander_compiler`).
+    """
+    if not compiled:
+        return schema.deserialize
+    deserialize = _COMPILED_SCHEMAS.get(schema)
+    if deserialize is None:
+        deserialize = compile_schema(schema)
+        _COMPILED_SCHEMAS.set(schema, deserialize)
+    return deserialize
+
+
+def _get_request_schema(schema_instance, location):
+    """
+    Return a mapping schema holding ``schema_instance`` at ``location``.
+
+    The wrapping schema is built once per schema instance and location, and
+    then reused for every request.
+
+    :param schema_instance: The schema to validate the location against.
+    :type schema_instance: :class:`~colander:colander.MappingSchema`
+    :param location: The location in the request to find the data to be
+        validated, such as "body" or "querystring".
+    :type location: str
+    :return: An instance of the wrapping schema.
+    :rtype: :class:`~colander:colander.MappingSchema`
+    """
+    import colander
+
+    cached = _REQUEST_SCHEMAS.get(schema_instance, location)
+    if cached is not None:
+        return cached
+
+    class RequestSchemaMeta(colander._SchemaMeta):
+        """
+        A metaclass that will inject a location class attribute into
+        RequestSchema.
+        """
+
+        def __new__(cls, name, bases, class_attrs):
+            """
+            Instantiate the RequestSchema class.
+
+            :param name: The name of the class we are instantiating. Will
+                be "RequestSchema".
+            :type name: str
+            :param bases: The class's superclasses.
+            :type bases: tuple
+            :param dct: The class's class attributes.
+            :type dct: dict
+            """
+            class_attrs[location] = schema_instance
+            return type(name, bases, class_attrs)
+
+    class RequestSchema(colander.MappingSchema, metaclass=RequestSchemaMeta):  # noqa
+        """A schema to validate the request's location attributes."""
+
+        pass
+
+    request_schema = RequestSchema()
+    _REQUEST_SCHEMAS.set(schema_instance, request_schema, location)
+    return request_schema
+
 
 def _generate_colander_validator(location):
     """
@@ -47,41 +128,31 @@ def _generate_colander_validator(location):
         if not isinstance(schema_instance, colander.MappingSchema):
             raise TypeError("Schema should inherit from colander.MappingSchema.")
 
-        class RequestSchemaMeta(colander._SchemaMeta):
-            """
-            A metaclass that will inject a location class attribute into
-            RequestSchema.
-            """
-
-            def __new__(cls, name, bases, class_attrs):
-                """
-                Instantiate the RequestSchema class.
-
-                :param name: The name of the class we are instantiating. Will
-                    be "RequestSchema".
-                :type name: str
-                :param bases: The class's superclasses.
-                :type bases: tuple
-                :param dct: The class's class attributes.
-                :type dct: dict
-                """
-                class_attrs[location] = schema_instance
-                return type(name, bases, class_attrs)
-
-        class RequestSchema(colander.MappingSchema, metaclass=RequestSchemaMeta):  # noqa
-            """A schema to validate the request's location attributes."""
-
-            pass
-
-        validator(request, RequestSchema(), deserializer, **kwargs)
+        request_schema = _get_request_schema(schema_instance, location)
+        validator(request, request_schema, deserializer, **kwargs)
         validated_location = request.validated.get(location, {})
         request.validated.update(validated_location)
         if location not in validated_location:
             request.validated.pop(location, None)
 
+    _validator.prepare = functools.partial(_prepare, location=location)
     return _validator
 
 
+def _prepare(schema=None, compiled=False, location=None, **kwargs):
+    """Compile the schema when the view is registered, with ``compiled``."""
+    import colander
+
+    # Schema classes are instantiated again on every request.
+    if not compiled or not isinstance(schema, colander.SchemaNode):
+        return
+    if location is not None:
+        if not isinstance(schema, colander.MappingSchema):
+            return
+        schema = _get_request_schema(schema, location)
+    _get_deserialize(schema, compiled=True)
+
+
 body_validator = _generate_colander_validator("body")
 headers_validator = _generate_colander_validator("headers")
 path_validator = _generate_colander_validator("path")
@@ -106,21 +177,20 @@ def validator(request, schema=None, deserializer=None, **kwargs):
     :param schema: The Colander schema
     :param deserializer: Optional deserializer, defaults to
         :func:`cornice.validators.extract_cstruct`
+    :param compiled: If true, deserialize with closures compiled from the
+        schema. The result and the errors are the same.
     """
     import colander
 
-    from cornice.validators import extract_cstruct
-
-    if deserializer is None:
-        deserializer = extract_cstruct
+    from cornice.validators import _get_cstruct
 
     if schema is None:
         return
 
     schema = _ensure_instantiated(schema)
-    cstruct = deserializer(request)
+    cstruct = _narrow_cstruct(schema, _get_cstruct(request, deserializer))
     try:
-        deserialized = schema.deserialize(cstruct)
+        deserialized = _get_deserialize(schema, kwargs.get("compiled", False))(cstruct)
     except colander.Invalid as e:
         translate = request.localizer.translate
         error_dict = e.asdict(translate=translate)
@@ -131,6 +201,30 @@ def validator(request, schema=None, deserializer=None, **kwargs):
         request.validated.update(deserialized)
 
 
+validator.prepare = _prepare
+
+
+def _narrow_cstruct(schema, cstruct):
+    """
+    Only keep the locations of the ``cstruct`` that are read by ``schema``.
+
+    Colander copies the whole mapping before deserializing it, which would
+    extract every location of the request. Schemas that ignore unknown keys
+    and do not customize their deserialization only read their children.
+    """
+    import colander
+
+    if (
+        isinstance(schema.typ, colander.Mapping)
+        and schema.typ.unknown == "ignore"
+        and type(schema).deserialize is colander.SchemaNode.deserialize
+    ):
+        return {
+            child.name: cstruct[child.name] for child in schema.children if child.name in cstruct
+        }
+    return cstruct
+
+
 def _ensure_instantiated(schema):
     if inspect.isclass(schema):
         warnings.warn(
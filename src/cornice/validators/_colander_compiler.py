@@ -0,0 +1,273 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+Compile colander schemas into plain Python closures.
+
+The compiled deserializer only implements the successful path of
+:meth:`colander.SchemaNode.deserialize`. As soon as a value would be invalid,
+it gives up and the whole ``cstruct`` is deserialized again by colander, so
+the errors are exactly the ones colander reports.
+
+Nodes that the compiler does not know about (custom ``deserialize``,
+preparers, deferred values, ...) are deserialized by colander, and types
+that are not specialized are deserialized by their own
+``typ.deserialize``.
+"""
+
+import copy
+
+
+class _Fallback(Exception):
+    """Raised by compiled nodes when colander has to take over."""
+
+
+def compile_schema(schema):
+    """
+    Return a function equivalent to ``schema.deserialize``.
+
+    The schema must not be modified once compiled.
+
+    :param schema: The colander schema to compile.
+    :type schema: :class:`~colander:colander.SchemaNode`
+    :rtype: callable
+    """
+    import colander
+
+    compiled = _compile_node(schema)
+
+    def deserialize(cstruct=colander.null):
+        try:
+            return compiled(cstruct)
+        except _Fallback:
+            return schema.deserialize(cstruct)
+
+    return deserialize
+
+
+def _is_supported(node):
+    import colander
+
+    names = [child.name for child in node.children]
+    return (
+        type(node).deserialize is colander.SchemaNode.deserialize
+        and node.preparer is None
+        and not isinstance(node.missing, colander.deferred)
+        and not isinstance(node.validator, colander.deferred)
+        and len(names) == len(set(names))
+    )
+
+
+def _compile_node(node):
+    import colander
+
+    if not _is_supported(node):
+        return _delegate(node)
+
+    convert = _compile_type(node)
+    check = _compile_validator(node)
+    missing = node.missing
+    null = colander.null
+    required = colander.required
+
+    def deserialize(cstruct):
+        appstruct = convert(cstruct)
+        if appstruct is null:
+            if missing is required:
+                raise _Fallback()
+            return missing
+        if check is not None:
+            check(appstruct)
+        return appstruct
+
+    return deserialize
+
+
+def _delegate(node):
+    import colander
+
+    def deserialize(cstruct):
+        try:
+            return node.deserialize(cstruct)
+        except colander.Invalid:
+            raise _Fallback()
+
+    return deserialize
+
+
+def _compile_type(node):
+    import colander
+
+    typ = node.typ
+    kind = type(typ)
+    if kind is colander.String:
+        return _compile_string(typ)
+    if kind in (colander.Integer, colander.Float):
+        return _compile_number(typ)
+    if kind is colander.Mapping:
+        return _compile_mapping(node)
+    if kind is colander.Sequence and len(node.children) == 1:
+        return _compile_sequence(node)
+
+    def convert(cstruct):
+        try:
+            return typ.deserialize(node, cstruct)
+        except colander.Invalid:
+            raise _Fallback()
+
+    return convert
+
+
+def _compile_string(typ):
+    import colander
+
+    allow_empty = typ.allow_empty
+    null = colander.null
+
+    def convert(cstruct):
+        if allow_empty and cstruct == "":
+            return ""
+        if not cstruct:
+            return null
+        if isinstance(cstruct, str):
+            return cstruct
+        # Bytes to decode, or invalid values.
+        raise _Fallback()
+
+    return convert
+
+
+def _compile_number(typ):
+    import colander
+
+    num = typ.num
+    null = colander.null
+
+    def convert(cstruct):
+        if cstruct != 0 and not cstruct:
+            return null
+        try:
+            return num(cstruct)
+        except Exception:
+            raise _Fallback()
+
+    return convert
+
+
+def _compile_mapping(node):
+    import colander
+
+    null = colander.null
+    drop = colander.drop
+    unknown = node.typ.unknown
+    children = [
+        (child.name, _compile_node(child), getattr(child, "missing", None) is drop)
+        for child in node.children
+    ]
+    names = frozenset(name for name, _, _ in children)
+
+    def convert(cstruct):
+        if cstruct is null:
+            return null
+        if type(cstruct) is not dict:
+            if not hasattr(cstruct, "items"):
+                raise _Fallback()
+            try:
+                cstruct = dict(cstruct)
+            except Exception:
+                raise _Fallback()
+
+        result = {}
+        for name, deserialize, drop_missing in children:
+            subval = cstruct.get(name, null)
+            if subval is drop or (subval is null and drop_missing):
+                continue
+            sub_result = deserialize(subval)
+            if sub_result is not drop:
+                result[name] = sub_result
+
+        if unknown == "raise":
+            if any(key not in names for key in cstruct):
+                raise _Fallback()
+        elif unknown == "preserve":
+            extra = {key: value for key, value in cstruct.items() if key not in names}
+            result.update(copy.deepcopy(extra))
+        return result
+
+    return convert
+
+
+def _compile_sequence(node):
+    import colander
+
+    null = colander.null
+    drop = colander.drop
+    accept_scalar = node.typ.accept_scalar
+    child = node.children[0]
+    deserialize = _compile_node(child)
+    drop_missing = getattr(child, "missing", None) is drop
+
+    def convert(cstruct):
+        if cstruct is null:
+            return null
+        if type(cstruct) in (list, tuple):
+            values = cstruct
+        elif accept_scalar and (
+            not hasattr(cstruct, "__iter__") or hasattr(cstruct, "get") or isinstance(cstruct, str)
+        ):
+            values = [cstruct]
+        else:
+            # Other iterables may not be iterated twice, leave them to colander.
+            raise _Fallback()
+
+        result = []
+        for subval in values:
+            if subval is drop or (subval is null and drop_missing):
+                continue
+            sub_result = deserialize(subval)
+            if sub_result is not drop:
+                result.append(sub_result)
+        return result
+
+    return convert
+
+
+def _compile_validator(node):
+    import colander
+
+    validator = node.validator
+    if validator is None:
+        return None
+
+    kind = type(validator)
+    if kind is colander.Range:
+        low, high = validator.min, validator.max
+
+        def check(value):
+            if (low is not None and value < low) or (high is not None and value > high):
+                raise _Fallback()
+
+    elif kind is colander.Length:
+        low, high = validator.min, validator.max
+
+        def check(value):
+            length = len(value)
+            if (low is not None and length < low) or (high is not None and length > high):
+                raise _Fallback()
+
+    elif kind is colander.OneOf:
+        choices = validator.choices
+
+        def check(value):
+            if value not in choices:
+                raise _Fallback()
+
+    else:
+
+        def check(value):
+            try:
+                validator(node, value)
+            except colander.Invalid:
+                raise _Fallback()
+
+    return check
@@ -0,0 +1,764 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+A validation backend without dependencies, for simple typed payloads.
+
+A spec is a dict mapping field names to a type (``str``, ``int``,
+``float``, ``bool``, ``list``, ``dict``), a :class:`Field`, or a nested spec.
+Dataclasses can be used as specs too, their annotations and defaults
+describing the fields.
+
+Each spec is compiled once into a flat list of field checkers.
+
+Arrays of records can be validated in bulk: the records are transposed into
+columns, and the type and range of each column is checked at once, with NumPy
+if it is installed. Only the columns holding invalid values are then checked
+value by value, to report errors.
+"""
+
+import dataclasses
+import typing
+from collections.abc import Mapping
+from contextvars import ContextVar
+from itertools import islice
+from operator import itemgetter
+
+from cornice.util import SchemaCache
+
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+
+class _Missing(object):
+    """Marker of missing values, which keeps its identity when pickled."""
+
+    def __reduce__(self):
+        return "_MISSING"
+
+
+_MISSING = _Missing()
+
+# Checkers compiled from the specs.
+_CHECKERS = SchemaCache("checker")
+_BULK_CHECKERS = SchemaCache("bulk_checker")
+
+# Columns shorter than this are checked with the builtins, faster than
+# building a NumPy array for them.
+_NUMPY_MIN_ROWS = 1024
+
+# Number of records validated by each task, when bulk bodies are split
+# between the processes of an executor.
+DEFAULT_CHUNK_SIZE = 10000
+
+# The number of invalid items of a list worth reporting, if the request has
+# an error budget.
+_items_limit = ContextVar("cornice_fast_items_limit", default=None)
+
+
+class Field(object):
+    """
+    A field of a spec.
+
+    :param type: The expected type: ``str``, ``int``, ``float``, ``bool``,
+        ``list``, ``dict``, a nested spec or a dataclass. Integers, numbers
+        and booleans are also parsed from strings.
+    :param required: Whether the field must be present. Defaults to true
+        unless a default is provided.
+    :param default: Value of the field when it is missing.
+    :param default_factory: Callable returning the value of the field when it
+        is missing.
+    :param nullable: Whether ``None`` is accepted.
+    :param min: Minimum value of a number.
+    :param max: Maximum value of a number.
+    :param min_length: Minimum length of a string or list.
+    :param max_length: Maximum length of a string or list.
+    :param choices: Accepted values.
+    :param items: Type, :class:`Field` or spec of the items of a list.
+    :param validator: Callable receiving the value, and raising a
+        :class:`ValueError` holding the error message if it is invalid.
+    """
+
+    def __init__(
+        self,
+        type=str,
+        required=None,
+        default=_MISSING,
+        default_factory=None,
+        nullable=False,
+        min=None,
+        max=None,
+        min_length=None,
+        max_length=None,
+        choices=None,
+        items=None,
+        validator=None,
+    ):
+        if required is None:
+            required = default is _MISSING and default_factory is None
+        self.type = type
+        self.required = required
+        self.default = default
+        self.default_factory = default_factory
+        self.nullable = nullable
+        self.min = min
+        self.max = max
+        self.min_length = min_length
+        self.max_length = max_length
+        self.choices = choices
+        self.items = items
+        self.validator = validator
+
+    def __repr__(self):
+        return "<Field %r>" % (self.type,)
+
+
+def _to_str(value):
+    if isinstance(value, str):
+        return value
+    raise ValueError("Must be a string")
+
+
+def _to_int(value):
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    raise ValueError("Must be an integer")
+
+
+def _to_float(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    raise ValueError("Must be a number")
+
+
+_TRUE = frozenset(("true", "1", "yes", "on"))
+_FALSE = frozenset(("false", "0", "no", "off"))
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        lowered = value.lower()
+        if lowered in _TRUE:
+            return True
+        if lowered in _FALSE:
+            return False
+    raise ValueError("Must be a boolean")
+
+
+def _to_dict(value):
+    if isinstance(value, Mapping):
+        return dict(value)
+    raise ValueError("Must be an object")
+
+
+_SCALARS = {str: _to_str, int: _to_int, float: _to_float, bool: _to_bool, dict: _to_dict}
+
+
+def _as_field(spec):
+    if isinstance(spec, Field):
+        return spec
+    return Field(spec)
+
+
+def _fields_of(spec):
+    """Return the :class:`Field` of each name of the spec."""
+    if isinstance(spec, Mapping):
+        return [(name, _as_field(value)) for name, value in spec.items()]
+    if isinstance(spec, type) and dataclasses.is_dataclass(spec):
+        hints = typing.get_type_hints(spec)
+        fields = []
+        for field in dataclasses.fields(spec):
+            kwargs = {}
+            if field.default is not dataclasses.MISSING:
+                kwargs["default"] = field.default
+            if field.default_factory is not dataclasses.MISSING:
+                kwargs["default_factory"] = field.default_factory
+            fields.append((field.name, _field_from_annotation(hints[field.name], **kwargs)))
+        return fields
+    raise TypeError("Unsupported spec: %r" % (spec,))
+
+
+def _field_from_annotation(annotation, **kwargs):
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+    if origin is typing.Union and len(args) == 2 and type(None) in args:
+        inner = args[0] if args[1] is type(None) else args[1]
+        field = _field_from_annotation(inner, **kwargs)
+        field.nullable = True
+        return field
+    if origin is list:
+        return Field(list, items=_field_from_annotation(args[0]) if args else None, **kwargs)
+    if origin is dict:
+        return Field(dict, **kwargs)
+    return Field(annotation, **kwargs)
+
+
+class _Invalid(ValueError):
+    """
+    Raised by the checkers of containers, holding the ``(path, message)``
+    of each invalid item.
+    """
+
+    def __init__(self, errors):
+        super(_Invalid, self).__init__(errors)
+        self.errors = errors
+
+
+def _flatten(error):
+    """Return the ``(path, message)`` of each error held by ``error``."""
+    if isinstance(error, _Invalid):
+        return error.errors
+    return [("", str(error))]
+
+
+def _add_errors(errors, name, error):
+    for path, msg in _flatten(error):
+        errors.append(("%s.%s" % (name, path) if path else str(name), msg))
+
+
+def _compile_spec(spec):
+    """
+    Return a function validating a mapping against ``spec``.
+
+    It returns the validated values, or raises :class:`_Invalid`.
+    """
+    checkers = []
+    for name, field in _fields_of(spec):
+        default = field.default
+        if field.default_factory is not None:
+            default = field.default_factory
+        elif default is not _MISSING:
+            default = _constant(default)
+        checkers.append((name, _compile_field(field), field.required, default))
+
+    def check(data):
+        if not isinstance(data, Mapping):
+            raise ValueError("Must be an object")
+        result = {}
+        errors = []
+        for name, convert, required, default in checkers:
+            value = data.get(name, _MISSING)
+            if value is _MISSING:
+                if required:
+                    errors.append((name, "Required"))
+                elif default is not _MISSING:
+                    result[name] = default()
+                continue
+            try:
+                result[name] = convert(value)
+            except ValueError as e:
+                _add_errors(errors, name, e)
+        if errors:
+            raise _Invalid(errors)
+        return result
+
+    return check
+
+
+def _constant(value):
+    return lambda: value
+
+
+def _compile_field(field):
+    """
+    Return a function converting a value of the field, or raising
+    :class:`ValueError`.
+    """
+    kind = field.type
+    if isinstance(kind, type) and kind in _SCALARS:
+        convert = _SCALARS[kind]
+    elif kind is list:
+        convert = _compile_list(field.items)
+    else:
+        convert = _compile_spec(kind)
+
+    checks = []
+    low, high = field.min, field.max
+    if low is not None:
+        checks.append((lambda value: value >= low, "Must be at least %s" % low))
+    if high is not None:
+        checks.append((lambda value: value <= high, "Must be at most %s" % high))
+    min_length, max_length = field.min_length, field.max_length
+    if min_length is not None:
+        message = "Length must be at least %s" % min_length
+        checks.append((lambda value: len(value) >= min_length, message))
+    if max_length is not None:
+        message = "Length must be at most %s" % max_length
+        checks.append((lambda value: len(value) <= max_length, message))
+    if field.choices is not None:
+        choices = frozenset(field.choices)
+        message = "Must be one of: %s" % ", ".join("%s" % choice for choice in field.choices)
+        checks.append((lambda value: value in choices, message))
+    validator = field.validator
+    nullable = field.nullable
+
+    if not checks and validator is None and not nullable:
+        return convert
+
+    def convert_and_check(value):
+        if value is None and nullable:
+            return None
+        value = convert(value)
+        for predicate, message in checks:
+            if not predicate(value):
+                raise ValueError(message)
+        if validator is not None:
+            validator(value)
+        return value
+
+    return convert_and_check
+
+
+def _compile_list(items):
+    convert_item = None if items is None else _compile_field(_as_field(items))
+
+    def convert(value):
+        if not isinstance(value, (list, tuple)):
+            raise ValueError("Must be a list")
+        if convert_item is None:
+            return list(value)
+        try:
+            return [convert_item(item) for item in value]
+        except ValueError:
+            pass
+        # Report every invalid item, within the error budget if any.
+        limit = _items_limit.get()
+        errors = []
+        for index, item in enumerate(value):
+            try:
+                convert_item(item)
+            except ValueError as e:
+                _add_errors(errors, index, e)
+                if limit is not None and len(errors) >= limit:
+                    break
+        raise _Invalid(errors)
+
+    return convert
+
+
+_DICT = frozenset((dict,))
+
+# Types of the values of a column which need no conversion, or only a cheap
+# one, for each type of field.
+_COLUMN_TYPES = {
+    str: frozenset((str,)),
+    int: frozenset((int,)),
+    float: frozenset((int, float)),
+    bool: frozenset((bool,)),
+}
+
+
+def _in_range(values, low, high):
+    """Return whether all the integers or floats of ``values`` are in range."""
+    if numpy is not None and len(values) >= _NUMPY_MIN_ROWS:
+        dtype = numpy.float64 if type(values[0]) is float else numpy.int64
+        try:
+            array = numpy.fromiter(values, dtype=dtype, count=len(values))
+        except OverflowError:
+            pass
+        else:
+            return (low is None or array.min() >= low) and (high is None or array.max() <= high)
+    return (low is None or min(values) >= low) and (high is None or max(values) <= high)
+
+
+def _compile_column(field, default):
+    """
+    Return a function converting a column of values of the field.
+
+    It returns the converted values, with ``_MISSING`` for the missing
+    optional values without default, and whether there are such values. It
+    raises :class:`_Invalid` holding the index of each invalid value.
+    """
+    convert = _compile_field(field)
+    required = field.required
+    kind = field.type
+    accepted = _COLUMN_TYPES.get(kind) if isinstance(kind, type) else None
+    low, high = field.min, field.max
+    min_length, max_length = field.min_length, field.max_length
+    choices = None if field.choices is None else frozenset(field.choices)
+    validator = field.validator
+
+    def check_values(column):
+        """Check the whole column at once, or return ``None``."""
+        if not column or not accepted.issuperset(map(type, column)):
+            return None
+        values = list(map(float, column)) if kind is float else column
+        if (low is not None or high is not None) and not _in_range(values, low, high):
+            return None
+        if min_length is not None or max_length is not None:
+            if not _in_range(list(map(len, values)), min_length, max_length):
+                return None
+        if choices is not None and not choices.issuperset(values):
+            return None
+        if validator is not None:
+            try:
+                for value in values:
+                    validator(value)
+            except ValueError:
+                return None
+        return values
+
+    def check_column(column):
+        if accepted is not None:
+            values = check_values(column)
+            if values is not None:
+                return values, False
+        # Convert value by value, reporting the invalid ones within the error
+        # budget if any.
+        limit = _items_limit.get()
+        values = []
+        errors = []
+        missing = False
+        for index, value in enumerate(column):
+            if value is _MISSING:
+                if required:
+                    errors.append((index, "", "Required"))
+                elif default is _MISSING:
+                    values.append(_MISSING)
+                    missing = True
+                else:
+                    values.append(default())
+                continue
+            try:
+                values.append(convert(value))
+            except ValueError as e:
+                errors.extend((index, path, msg) for path, msg in _flatten(e))
+                if limit is not None and len(errors) >= limit:
+                    break
+        if errors:
+            raise _Invalid(errors)
+        return values, missing
+
+    return check_column
+
+
+def _compile_bulk(spec):
+    """
+    Return a function validating a list of mappings against ``spec``,
+    column by column.
+
+    It returns the list of validated records, or raises :class:`_Invalid`.
+    """
+    columns = []
+    for name, field in _fields_of(spec):
+        default = field.default
+        if field.default_factory is not None:
+            default = field.default_factory
+        elif default is not _MISSING:
+            default = _constant(default)
+        columns.append((name, _compile_column(field, default)))
+
+    names = [name for name, _ in columns]
+
+    def check(records):
+        if not isinstance(records, list):
+            raise ValueError("Must be a list")
+        if not _DICT.issuperset(map(type, records)):
+            invalid = [
+                (str(index), "Must be an object")
+                for index, record in enumerate(records)
+                if not isinstance(record, Mapping)
+            ]
+            if invalid:
+                raise _Invalid(invalid)
+
+        converted = []
+        missing = False
+        errors = []
+        for name, check_column in columns:
+            try:
+                column = list(map(itemgetter(name), records))
+            except KeyError:
+                column = [record.get(name, _MISSING) for record in records]
+            try:
+                values, has_missing = check_column(column)
+            except _Invalid as e:
+                errors.extend(
+                    (index, "%s.%s" % (name, path) if path else name, msg)
+                    for index, path, msg in e.errors
+                )
+                continue
+            converted.append(values)
+            missing = missing or has_missing
+        if errors:
+            errors.sort(key=lambda error: error[0])
+            raise _Invalid([("%s.%s" % (index, path), msg) for index, path, msg in errors])
+        # Transpose the columns back into records.
+        if not names:
+            return [{} for _ in records]
+        result = [dict(zip(names, row)) for row in zip(*converted)]
+        if missing:
+            for record in result:
+                for name, value in list(record.items()):
+                    if value is _MISSING:
+                        del record[name]
+        return result
+
+    return check
+
+
+def _get_checker(spec, bulk=False):
+    """
+    Return the function validating data against ``spec``, compiled once per
+    spec.
+
+    :param bulk: Whether to validate a list of records instead of a single
+        one.
+    """
+    cache = _BULK_CHECKERS if bulk else _CHECKERS
+    check = cache.get(spec)
+    if check is None:
+        check = _compile_bulk(spec) if bulk else _compile_spec(spec)
+        cache.set(spec, check)
+    return check
+
+
+def _check(request, check, data):
+    """
+    Validate ``data`` with ``check``, reporting at most one more invalid
+    list item than the error budget of the request.
+    """
+    remaining = getattr(request.errors, "remaining", None)
+    token = _items_limit.set(None if remaining is None else remaining + 1)
+    try:
+        return check(data)
+    finally:
+        _items_limit.reset(token)
+
+
+def _generate_fast_validator(location):
+    """
+    Generate a fast validator for data from the given location.
+
+    :param location: The location in the request to find the data to be
+        validated, such as "body" or "querystring".
+    :type location: str
+    :return: Returns a callable that will validate the request at the given
+        location.
+    :rtype: callable
+    """
+
+    def _validator(request, schema=None, deserializer=None, **kwargs):
+        """
+        Validate the location against the spec defined on the service.
+
+        The content of the location is validated and stored in the
+        ``request.validated`` attribute.
+
+        .. note::
+
+            If no schema is defined, this validator does nothing.
+
+        :param request: Current request
+        :type request: :class:`~pyramid:pyramid.request.Request`
+
+        :param schema: The spec, see :class:`cornice.validators.FastField`
+        :param deserializer: Optional deserializer, defaults to
+            :func:`cornice.validators.extract_cstruct`
+        """
+        from cornice.validators import _get_cstruct
+
+        if schema is None:
+            return
+
+        check = _get_checker(schema)
+        cstruct = _get_cstruct(request, deserializer)
+        try:
+            validated = _check(request, check, cstruct.get(location, {}))
+        except ValueError as e:
+            for name, msg in _flatten(e):
+                request.errors.add(location, name, msg)
+        else:
+            request.validated.update(validated)
+
+    return _validator
+
+
+body_validator = _generate_fast_validator("body")
+headers_validator = _generate_fast_validator("header")
+path_validator = _generate_fast_validator("path")
+querystring_validator = _generate_fast_validator("querystring")
+
+
+def _check_chunk(spec, records, offset, limit):
+    """
+    Validate a chunk of the records of a bulk body, in a worker process.
+
+    Return the validated records and the ``(path, message)`` of the errors,
+    the paths starting with the index of the record in the whole body.
+    """
+    token = _items_limit.set(limit)
+    try:
+        return _compile_bulk(spec)(records), []
+    except ValueError as e:
+        errors = []
+        for path, msg in _flatten(e):
+            index, _, name = path.partition(".")
+            index = int(index) + offset
+            errors.append(("%s.%s" % (index, name) if name else str(index), msg))
+        return None, errors
+    finally:
+        _items_limit.reset(token)
+
+
+def _check_in_executor(request, executor, spec, records, chunk_size):
+    """
+    Validate the records by chunks in the executor, merging back the results
+    in order.
+    """
+    if not isinstance(records, list) or len(records) <= chunk_size:
+        return _check(request, _get_checker(spec, bulk=True), records)
+    remaining = getattr(request.errors, "remaining", None)
+    limit = None if remaining is None else remaining + 1
+    futures = [
+        executor.submit(_check_chunk, spec, records[start : start + chunk_size], start, limit)
+        for start in range(0, len(records), chunk_size)
+    ]
+    validated = []
+    errors = []
+    for future in futures:
+        chunk, chunk_errors = future.result()
+        if chunk_errors:
+            errors.extend(chunk_errors)
+        elif not errors:
+            validated.extend(chunk)
+    if errors:
+        raise _Invalid(errors)
+    return validated
+
+
+def _check_lines(request, check, lines, chunk_size):
+    """
+    Validate the ``(line number, record)`` of ``lines`` by chunks, naming the
+    errors after the line numbers.
+    """
+    remaining = getattr(request.errors, "remaining", None)
+    validated = []
+    errors = []
+    while remaining is None or len(errors) <= remaining:
+        chunk = list(islice(lines, chunk_size))
+        if not chunk:
+            break
+        try:
+            validated.extend(_check(request, check, [record for _, record in chunk]))
+        except _Invalid as e:
+            for path, msg in e.errors:
+                index, _, name = path.partition(".")
+                lineno = chunk[int(index)][0]
+                errors.append(("%s.%s" % (lineno, name) if name else str(lineno), msg))
+    if errors:
+        raise _Invalid(errors)
+    return validated
+
+
+def bulk_body_validator(request, schema=None, deserializer=None, **kwargs):
+    """
+    Validate a body made of an array of records against the spec defined on
+    the service.
+
+    Each field is validated for all the records at once, which is much
+    faster than validating the records one by one. Errors are reported for
+    the body, named after the index of the record and the field
+    (eg. ``3.name``).
+
+    The validated records are stored in ``request.validated['body']``.
+
+    Newline-delimited JSON bodies (see :class:`cornice.validators.NDJSONBody`)
+    are read and validated ``bulk_chunk_size`` lines at a time, and their
+    errors are named after the line number (eg. ``4.name``).
+
+    Large bodies can be validated in other processes, to avoid holding the
+    GIL of the worker serving the request: with the ``bulk_executor`` option
+    of the service or view, bodies of more than ``bulk_chunk_size`` records
+    (defaults to 10000) are split in chunks validated by the executor. The
+    spec must then be picklable.
+
+    .. note::
+
+        If no schema is defined, this validator does nothing.
+
+    :param request: Current request
+    :type request: :class:`~pyramid:pyramid.request.Request`
+
+    :param schema: The spec of a record, see
+        :class:`cornice.validators.FastField`
+    :param deserializer: Optional deserializer, defaults to
+        :func:`cornice.validators.extract_cstruct`
+    :param bulk_executor: Optional
+        :class:`concurrent.futures.ProcessPoolExecutor` validating the
+        chunks of large bodies.
+    :param bulk_chunk_size: Number of records of each chunk.
+    """
+    from cornice.validators import NDJSONBody, _get_cstruct
+
+    if schema is None:
+        return
+
+    cstruct = _get_cstruct(request, deserializer)
+    records = cstruct.get("body", [])
+    executor = kwargs.get("bulk_executor")
+    chunk_size = kwargs.get("bulk_chunk_size") or DEFAULT_CHUNK_SIZE
+    try:
+        if isinstance(records, NDJSONBody):
+            check = _get_checker(schema, bulk=True)
+            validated = _check_lines(request, check, records.numbered(), chunk_size)
+        elif executor is None:
+            validated = _check(request, _get_checker(schema, bulk=True), records)
+        else:
+            validated = _check_in_executor(request, executor, schema, records, chunk_size)
+    except ValueError as e:
+        for name, msg in _flatten(e):
+            request.errors.add("body", name, msg)
+    else:
+        request.validated["body"] = validated
+
+
+def validator(request, schema=None, deserializer=None, **kwargs):
+    """
+    Validate the full request against the spec defined on the service.
+
+    The spec maps locations (``body``, ``querystring``, ``path``,
+    ``header``, ...) to their own spec. Each of them is validated and stored
+    in the ``request.validated`` attribute
+    (eg. body in ``request.validated['body']``).
+
+    .. note::
+
+        If no schema is defined, this validator does nothing.
+
+    :param request: Current request
+    :type request: :class:`~pyramid:pyramid.request.Request`
+
+    :param schema: The spec, see :class:`cornice.validators.FastField`
+    :param deserializer: Optional deserializer, defaults to
+        :func:`cornice.validators.extract_cstruct`
+    """
+    from cornice.validators import _get_cstruct
+
+    if schema is None:
+        return
+
+    check = _get_checker(schema)
+    try:
+        validated = _check(request, check, _get_cstruct(request, deserializer))
+    except ValueError as e:
+        for name, msg in _flatten(e):
+            location, _, field = name.partition(".")
+            request.errors.add(location, field, msg)
+    else:
+        request.validated.update(validated)
@@ -0,0 +1,501 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+A validation backend for JSON Schema documents (a subset of draft 2020-12).
+
+Each schema is compiled once into the source code of Python functions, so
+that the schema is not interpreted again for every request.
+
+Supported keywords: ``type``, ``enum``, ``const``, ``minLength``,
+``maxLength``, ``pattern``, ``minimum``, ``maximum``, ``exclusiveMinimum``,
+``exclusiveMaximum``, ``multipleOf``, ``properties``, ``required``,
+``additionalProperties``, ``minProperties``, ``maxProperties``, ``items``,
+``minItems``, ``maxItems``, ``uniqueItems``, ``allOf``, ``anyOf``,
+``oneOf``, ``not`` and local ``$ref`` (eg. ``#/$defs/address``).
+Annotations such as ``title`` or ``format`` are ignored.
+"""
+
+import itertools
+import json
+import re
+
+from cornice.util import SchemaCache
+
+
+_MISSING = object()
+
+# Validation functions compiled from the schemas.
+_VALIDATORS = SchemaCache("validator")
+
+_UNSUPPORTED = frozenset(
+    (
+        "$dynamicRef",
+        "contains",
+        "dependentRequired",
+        "dependentSchemas",
+        "else",
+        "if",
+        "maxContains",
+        "minContains",
+        "patternProperties",
+        "prefixItems",
+        "propertyNames",
+        "then",
+        "unevaluatedItems",
+        "unevaluatedProperties",
+    )
+)
+
+_TYPE_CHECKS = {
+    "string": "isinstance({v}, str)",
+    "integer": (
+        "isinstance({v}, int) and not isinstance({v}, bool)"
+        " or isinstance({v}, float) and {v}.is_integer()"
+    ),
+    "number": "isinstance({v}, (int, float)) and not isinstance({v}, bool)",
+    "boolean": "isinstance({v}, bool)",
+    "object": "isinstance({v}, dict)",
+    "array": "isinstance({v}, list)",
+    "null": "{v} is None",
+}
+
+
+def _equal(a, b):
+    """Compare two JSON values, ``true`` being different from ``1``."""
+    if isinstance(a, bool) or isinstance(b, bool):
+        return a is b
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return a == b
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(_equal(x, y) for x, y in zip(a, b))
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_equal(a[key], b[key]) for key in a)
+    return type(a) is type(b) and a == b
+
+
+def _unique(items):
+    for index, item in enumerate(items):
+        for other in items[index + 1 :]:
+            if _equal(item, other):
+                return False
+    return True
+
+
+def _multiple_of(value, divisor):
+    if isinstance(value, int) and isinstance(divisor, int):
+        return value % divisor == 0
+    try:
+        return (value / divisor).is_integer()
+    except OverflowError:
+        return False
+
+
+class _Stop(Exception):
+    """Raised when enough errors were collected."""
+
+
+class _BoundedErrors(list):
+    """A list of errors, raising :class:`_Stop` once it is full."""
+
+    def __init__(self, limit):
+        super(_BoundedErrors, self).__init__()
+        self.limit = limit
+
+    def append(self, error):
+        super(_BoundedErrors, self).append(error)
+        if len(self) >= self.limit:
+            raise _Stop()
+
+
+def _new_errors(request):
+    """
+    Return the list collecting the errors of a validation.
+
+    If the request has an error budget, one more error than the budget is
+    collected, so that ``request.errors`` knows it is truncated.
+    """
+    remaining = getattr(request.errors, "remaining", None)
+    if remaining is None:
+        return []
+    return _BoundedErrors(remaining + 1)
+
+
+def _collect(validate, value, errors):
+    try:
+        validate(value, (), errors)
+    except _Stop:
+        pass
+
+
+def _matches(function, value):
+    errors = []
+    function(value, (), errors)
+    return not errors
+
+
+def _line(out, level, text):
+    out.append("    " * level + text)
+
+
+def _error(out, level, path, message):
+    _line(out, level, "errors.append((%s, %r))" % (path, message))
+
+
+# The JSON types of the values checked by each group of keywords.
+_KINDS = {
+    "string": {"string"},
+    "number": {"number", "integer"},
+    "object": {"object"},
+    "array": {"array"},
+}
+
+
+class _Compiler(object):
+    """Generate the source code of the functions validating a schema."""
+
+    def __init__(self, root):
+        self.root = root
+        self.namespace = {
+            "_MISSING": _MISSING,
+            "_equal": _equal,
+            "_matches": _matches,
+            "_multiple_of": _multiple_of,
+            "_unique": _unique,
+        }
+        self.sources = []
+        self.functions = {}
+        self.counter = itertools.count()
+
+    def compile(self):
+        name = self.function(self.root)
+        exec("\n\n".join(self.sources), self.namespace)
+        return self.namespace[name]
+
+    def unique_name(self, prefix):
+        return "%s%d" % (prefix, next(self.counter))
+
+    def constant(self, value):
+        name = self.unique_name("_c")
+        self.namespace[name] = value
+        return name
+
+    def function(self, schema):
+        """
+        Return the name of the function ``(value, path, errors)`` validating
+        ``schema``.
+        """
+        key = id(schema)
+        if key not in self.functions:
+            name = self.functions[key] = self.unique_name("_f")
+            lines = []
+            self.emit(schema, "value", "path", lines, 1)
+            source = ["def %s(value, path, errors):" % name] + (lines or ["    pass"])
+            self.sources.append("\n".join(source))
+        return self.functions[key]
+
+    def resolve(self, ref):
+        if not ref.startswith("#"):
+            raise ValueError("Only local $ref are supported: %r" % (ref,))
+        schema = self.root
+        for part in ref[1:].split("/")[1:]:
+            part = part.replace("~1", "/").replace("~0", "~")
+            try:
+                schema = schema[int(part) if isinstance(schema, list) else part]
+            except (KeyError, IndexError, ValueError, TypeError):
+                raise ValueError("Cannot resolve $ref %r" % (ref,))
+        return schema
+
+    def matches(self, schemas, var):
+        return ["_matches(%s, %s)" % (self.function(subschema), var) for subschema in schemas]
+
+    def emit(self, schema, var, path, out, level):
+        """
+        Append to ``out`` the lines validating the value held in the ``var``
+        variable, whose path is given by the ``path`` expression.
+        """
+        if schema is True:
+            return
+        if schema is False:
+            _error(out, level, path, "Not allowed")
+            return
+        if not isinstance(schema, dict):
+            raise ValueError("Invalid JSON Schema: %r" % (schema,))
+        unsupported = _UNSUPPORTED.intersection(schema)
+        if unsupported:
+            keywords = ", ".join(sorted(unsupported))
+            raise ValueError("Unsupported JSON Schema keywords: %s" % keywords)
+
+        if "$ref" in schema:
+            function = self.function(self.resolve(schema["$ref"]))
+            _line(out, level, "%s(%s, %s, errors)" % (function, var, path))
+
+        types = schema.get("type")
+        if isinstance(types, str):
+            types = [types]
+        if types is not None:
+            for name in types:
+                if name not in _TYPE_CHECKS:
+                    raise ValueError("Unknown JSON Schema type: %r" % (name,))
+            checks = [_TYPE_CHECKS[name].format(v=var) for name in types]
+            check = checks[0] if len(checks) == 1 else " or ".join("(%s)" % c for c in checks)
+            _line(out, level, "if not (%s):" % check)
+            _error(out, level + 1, path, "Must be of type %s" % " or ".join(types))
+            _line(out, level, "else:")
+            level += 1
+            start = len(out)
+
+        if "enum" in schema:
+            choices = self.constant(schema["enum"])
+            _line(out, level, "if not any(_equal(%s, choice) for choice in %s):" % (var, choices))
+            message = ", ".join(json.dumps(choice) for choice in schema["enum"])
+            _error(out, level + 1, path, "Must be one of: %s" % message)
+        if "const" in schema:
+            _line(out, level, "if not _equal(%s, %s):" % (var, self.constant(schema["const"])))
+            _error(out, level + 1, path, "Must be equal to %s" % json.dumps(schema["const"]))
+
+        for kind, emit in (
+            ("string", self.emit_string),
+            ("number", self.emit_number),
+            ("object", self.emit_object),
+            ("array", self.emit_array),
+        ):
+            # Keywords only apply to values of their type.
+            known = types is not None and set(types) <= _KINDS[kind]
+            lines = []
+            emit(schema, var, path, lines, level if known else level + 1)
+            if lines and not known:
+                _line(out, level, "if %s:" % _TYPE_CHECKS[kind].format(v=var))
+            out.extend(lines)
+
+        for subschema in schema.get("allOf", ()):
+            self.emit(subschema, var, path, out, level)
+        if "anyOf" in schema:
+            _line(out, level, "if not (%s):" % " or ".join(self.matches(schema["anyOf"], var)))
+            _error(out, level + 1, path, "Must be valid against at least one schema")
+        if "oneOf" in schema:
+            _line(out, level, "if (%s) != 1:" % " + ".join(self.matches(schema["oneOf"], var)))
+            _error(out, level + 1, path, "Must be valid against exactly one schema")
+        if "not" in schema:
+            _line(out, level, "if %s:" % self.matches([schema["not"]], var)[0])
+            _error(out, level + 1, path, "Must not be valid against the schema")
+
+        if types is not None and len(out) == start:
+            # Nothing else to check.
+            out.pop()
+
+    def emit_string(self, schema, var, path, out, level):
+        if "minLength" in schema:
+            _line(out, level, "if len(%s) < %r:" % (var, schema["minLength"]))
+            _error(out, level + 1, path, "Length must be at least %s" % schema["minLength"])
+        if "maxLength" in schema:
+            _line(out, level, "if len(%s) > %r:" % (var, schema["maxLength"]))
+            _error(out, level + 1, path, "Length must be at most %s" % schema["maxLength"])
+        if "pattern" in schema:
+            pattern = self.constant(re.compile(schema["pattern"]))
+            _line(out, level, "if %s.search(%s) is None:" % (pattern, var))
+            _error(out, level + 1, path, "Must match pattern %s" % schema["pattern"])
+
+    def emit_number(self, schema, var, path, out, level):
+        for keyword, operator, message in (
+            ("minimum", "<", "Must be at least %s"),
+            ("maximum", ">", "Must be at most %s"),
+            ("exclusiveMinimum", "<=", "Must be greater than %s"),
+            ("exclusiveMaximum", ">=", "Must be less than %s"),
+        ):
+            if keyword in schema:
+                _line(out, level, "if %s %s %r:" % (var, operator, schema[keyword]))
+                _error(out, level + 1, path, message % schema[keyword])
+        if "multipleOf" in schema:
+            _line(out, level, "if not _multiple_of(%s, %r):" % (var, schema["multipleOf"]))
+            _error(out, level + 1, path, "Must be a multiple of %s" % schema["multipleOf"])
+
+    def emit_object(self, schema, var, path, out, level):
+        properties = schema.get("properties", {})
+        for name in schema.get("required", ()):
+            _line(out, level, "if %r not in %s:" % (name, var))
+            _error(out, level + 1, "%s + (%r,)" % (path, name), "Required")
+        for name, subschema in properties.items():
+            child = self.unique_name("v")
+            lines = []
+            self.emit(subschema, child, "%s + (%r,)" % (path, name), lines, level + 1)
+            if lines:
+                _line(out, level, "%s = %s.get(%r, _MISSING)" % (child, var, name))
+                _line(out, level, "if %s is not _MISSING:" % child)
+                out.extend(lines)
+
+        additional = schema.get("additionalProperties", True)
+        if additional is not True:
+            key, child = self.unique_name("k"), self.unique_name("v")
+            known = self.constant(frozenset(properties))
+            lines = []
+            self.emit(additional, child, "%s + (%s,)" % (path, key), lines, level + 2)
+            if additional is False:
+                lines = []
+                _error(lines, level + 2, "%s + (%s,)" % (path, key), "Unknown property")
+            if lines:
+                _line(out, level, "for %s, %s in %s.items():" % (key, child, var))
+                _line(out, level + 1, "if %s not in %s:" % (key, known))
+                out.extend(lines)
+
+        if "minProperties" in schema:
+            _line(out, level, "if len(%s) < %r:" % (var, schema["minProperties"]))
+            message = "Must have at least %s properties" % schema["minProperties"]
+            _error(out, level + 1, path, message)
+        if "maxProperties" in schema:
+            _line(out, level, "if len(%s) > %r:" % (var, schema["maxProperties"]))
+            message = "Must have at most %s properties" % schema["maxProperties"]
+            _error(out, level + 1, path, message)
+
+    def emit_array(self, schema, var, path, out, level):
+        if "items" in schema:
+            index, child = self.unique_name("i"), self.unique_name("v")
+            lines = []
+            self.emit(schema["items"], child, "%s + (%s,)" % (path, index), lines, level + 1)
+            if lines:
+                _line(out, level, "for %s, %s in enumerate(%s):" % (index, child, var))
+                out.extend(lines)
+        if "minItems" in schema:
+            _line(out, level, "if len(%s) < %r:" % (var, schema["minItems"]))
+            _error(out, level + 1, path, "Must have at least %s items" % schema["minItems"])
+        if "maxItems" in schema:
+            _line(out, level, "if len(%s) > %r:" % (var, schema["maxItems"]))
+            _error(out, level + 1, path, "Must have at most %s items" % schema["maxItems"])
+        if schema.get("uniqueItems"):
+            _line(out, level, "if not _unique(%s):" % var)
+            _error(out, level + 1, path, "Items must be unique")
+
+
+def compile_json_schema(schema):
+    """
+    Return a function ``(value, path, errors)`` validating ``value`` against
+    the JSON Schema ``schema``.
+
+    The ``(path, message)`` of each error is appended to the ``errors`` list,
+    ``path`` being the tuple of the keys and indexes leading to the invalid
+    value, prefixed by ``path``.
+
+    :raises ValueError: if the schema is invalid or uses unsupported
+        keywords.
+    """
+    return _Compiler(schema).compile()
+
+
+def _get_validator(schema):
+    """
+    Return the function validating data against ``schema``, compiled once
+    per schema.
+    """
+    validate = _VALIDATORS.get(schema)
+    if validate is None:
+        validate = compile_json_schema(schema)
+        _VALIDATORS.set(schema, validate)
+    return validate
+
+
+def _generate_jsonschema_validator(location):
+    """
+    Generate a JSON Schema validator for data from the given location.
+
+    :param location: The location in the request to find the data to be
+        validated, such as "body" or "querystring".
+    :type location: str
+    :return: Returns a callable that will validate the request at the given
+        location.
+    :rtype: callable
+    """
+
+    def _validator(request, schema=None, deserializer=None, **kwargs):
+        """
+        Validate the location against the JSON Schema defined on the
+        service.
+
+        The content of the location is validated and stored in the
+        ``request.validated`` attribute. Values that are not objects (eg. an
+        array body) are stored in ``request.validated[location]``.
+
+        .. note::
+
+            If no schema is defined, this validator does nothing.
+
+        :param request: Current request
+        :type request: :class:`~pyramid:pyramid.request.Request`
+
+        :param schema: The JSON Schema, as a dict
+        :param deserializer: Optional deserializer, defaults to
+            :func:`cornice.validators.extract_cstruct`
+        """
+        from cornice.validators import _get_cstruct
+
+        if schema is None:
+            return
+
+        validate = _get_validator(schema)
+        value = _get_cstruct(request, deserializer).get(location, {})
+        errors = _new_errors(request)
+        _collect(validate, value, errors)
+        for path, msg in errors:
+            request.errors.add(location, ".".join("%s" % part for part in path), msg)
+        if not errors:
+            if isinstance(value, dict):
+                request.validated.update(value)
+            else:
+                request.validated[location] = value
+
+    _validator.prepare = _prepare
+    return _validator
+
+
+def _prepare(schema=None, **kwargs):
+    """Compile the schema when the view is registered."""
+    if isinstance(schema, (dict, bool)):
+        _get_validator(schema)
+
+
+body_validator = _generate_jsonschema_validator("body")
+headers_validator = _generate_jsonschema_validator("header")
+path_validator = _generate_jsonschema_validator("path")
+querystring_validator = _generate_jsonschema_validator("querystring")
+
+
+def validator(request, schema=None, deserializer=None, **kwargs):
+    """
+    Validate the full request against the JSON Schema defined on the
+    service.
+
+    The schema describes an object whose properties are the locations
+    (``body``, ``querystring``, ``path``, ``header``, ...). Each of them is
+    validated and stored in the ``request.validated`` attribute
+    (eg. body in ``request.validated['body']``).
+
+    .. note::
+
+        If no schema is defined, this validator does nothing.
+
+    :param request: Current request
+    :type request: :class:`~pyramid:pyramid.request.Request`
+
+    :param schema: The JSON Schema, as a dict
+    :param deserializer: Optional deserializer, defaults to
+        :func:`cornice.validators.extract_cstruct`
+    """
+    from cornice.validators import _get_cstruct
+
+    if schema is None:
+        return
+
+    validate = _get_validator(schema)
+    cstruct = _get_cstruct(request, deserializer)
+    # Only read the locations described by the schema, if any.
+    locations = schema.get("properties") or cstruct
+    value = {key: cstruct[key] for key in locations if key in cstruct}
+    errors = _new_errors(request)
+    _collect(validate, value, errors)
+    for path, msg in errors:
+        location = "%s" % path[0] if path else ""
+        request.errors.add(location, ".".join("%s" % part for part in path[1:]), msg)
+    if not errors:
+        request.validated.update(value)
+
+
+validator.prepare = _prepare
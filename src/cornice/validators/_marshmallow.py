@@ -2,7 +2,226 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import functools
 import inspect
+from collections.abc import MutableMapping
+from contextvars import ContextVar
+
+from cornice.util import LRUCache, current_request, request_scope
+
+
+# Schema instances built by the validators, keyed on the schema class, its
+# keyword arguments and the validated location. They are shared between
+# requests, so their context is scoped to the request being validated.
+_SCHEMAS = LRUCache(maxsize=1024)
+
+# Values set in the context of a shared schema during a validation.
+_request_context = ContextVar("cornice_marshmallow_context")
+
+
+class _RequestContext(MutableMapping):
+    """
+    The context of a schema instance shared between requests.
+
+    ``context["request"]`` is the :func:`~cornice.validators.current_request`.
+    Values set while a request is being validated only live as long as that
+    validation, and are only visible to it. Values passed when instantiating
+    the schema are visible to every request.
+    """
+
+    def __init__(self, initial=None):
+        self._initial = dict(initial or {})
+
+    def _scoped(self):
+        return _request_context.get(self._initial)
+
+    def _merged(self):
+        merged = dict(self._initial)
+        request = current_request()
+        if request is not None:
+            merged["request"] = request
+        merged.update(self._scoped())
+        return merged
+
+    def __getitem__(self, key):
+        scoped = self._scoped()
+        if key in scoped:
+            return scoped[key]
+        if key == "request" and current_request() is not None:
+            return current_request()
+        return self._initial[key]
+
+    def __setitem__(self, key, value):
+        self._scoped()[key] = value
+
+    def __delitem__(self, key):
+        del self._scoped()[key]
+
+    def __iter__(self):
+        return iter(self._merged())
+
+    def __len__(self):
+        return len(self._merged())
+
+    def __repr__(self):
+        return repr(self._merged())
+
+
+def _freeze(value):
+    """
+    Return a hashable equivalent of ``value``, to be used in cache keys.
+
+    :raises TypeError: if ``value`` contains unhashable values.
+    """
+    if isinstance(value, dict):
+        return (dict, tuple(sorted((k, _freeze(v)) for k, v in value.items())))
+    if isinstance(value, (list, tuple)):
+        return (list, tuple(_freeze(v) for v in value))
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(v) for v in value)
+    hash(value)
+    return value
+
+
+def _nested_fields(schema):
+    """Yield the :class:`~marshmallow.fields.Nested` fields of ``schema``,
+    including those in lists, tuples and mappings."""
+    import marshmallow
+
+    fields = list(schema.fields.values())
+    while fields:
+        field = fields.pop()
+        if isinstance(field, marshmallow.fields.Nested):
+            yield field
+        elif isinstance(field, marshmallow.fields.List):
+            fields.append(field.inner)
+        elif isinstance(field, marshmallow.fields.Tuple):
+            fields.extend(field.tuple_fields)
+        elif isinstance(field, marshmallow.fields.Mapping):
+            fields.extend(f for f in (field.key_field, field.value_field) if f is not None)
+
+
+def _scope_nested_contexts(schema, seen=()):
+    """
+    Give the schemas nested in ``schema`` a :class:`_RequestContext` too.
+
+    Marshmallow copies the context of the parent schema into a nested one
+    the first time it is used, and then keeps that nested schema. So the
+    nested schemas are resolved here, outside of any request. A schema that
+    nests itself is resolved lazily, one level at a time, the same way.
+    """
+    seen += (type(schema),)
+    for field in _nested_fields(schema):
+        _scope_nested(field, seen)
+
+
+def _scope_nested(field, seen):
+    token = _request_context.set({})
+    try:
+        with request_scope(None):
+            nested = field.schema
+    finally:
+        _request_context.reset(token)
+    if not isinstance(nested.context, _RequestContext):
+        nested.context = _RequestContext(nested.context)
+    if type(nested) not in seen:
+        _scope_nested_contexts(nested, seen)
+        return nested
+
+    for subfield in _nested_fields(nested):
+        subfield.nested = functools.partial(_resolve_nested, subfield, subfield.nested, seen)
+    return nested
+
+
+def _resolve_nested(field, nested, seen):
+    # Called by marshmallow when loading, in place of the nested schema.
+    field.nested = nested
+    return _scope_nested(field, seen)
+
+
+def _get_schema(schema, schema_kwargs=None, location=None):
+    """
+    Return an instance of the given marshmallow schema, shared between
+    requests.
+
+    :param schema: The marshmallow schema class with which the request should
+        be validated
+    :param schema_kwargs: The keyword arguments that will be provided to the
+        marshmallow schema's constructor
+    :param location: If specified, return a schema that validates the
+        given location of the request against ``schema``.
+    :return: The object of the marshmallow schema
+    """
+    schema_kwargs = schema_kwargs or {}
+    try:
+        key = (schema, _freeze(schema_kwargs), location)
+    except TypeError:
+        # Keyword arguments cannot be used as a cache key.
+        return _build_schema(schema, schema_kwargs, location)
+
+    schema_instance = _SCHEMAS.get(key)
+    if schema_instance is None:
+        schema_instance = _build_schema(schema, schema_kwargs, location)
+        _SCHEMAS.set(key, schema_instance)
+    return schema_instance
+
+
+def _build_schema(schema, schema_kwargs, location=None):
+    """
+    Instantiate the given marshmallow schema, wrapped in a schema for the
+    given location if any.
+    """
+    import marshmallow
+    import marshmallow.schema
+    from marshmallow.utils import EXCLUDE
+
+    schema = _instantiate_schema(schema, **schema_kwargs)
+    schema.context = _RequestContext(schema.context)
+    _scope_nested_contexts(schema)
+    if location is None:
+        return schema
+
+    class ValidatedField(marshmallow.fields.Field):
+        def _deserialize(self, value, attr, data, **kwargs):
+            deserialized = schema.load(value)
+            return deserialized
+
+    class Meta(object):
+        strict = True
+        ordered = True
+        unknown = EXCLUDE
+
+    class RequestSchemaMeta(marshmallow.schema.SchemaMeta):
+        """
+        A metaclass that will inject a location class attribute into
+        RequestSchema.
+        """
+
+        def __new__(cls, name, bases, class_attrs):
+            """
+            Instantiate the RequestSchema class.
+
+            :param name: The name of the class we are instantiating. Will
+                be "RequestSchema".
+            :type name: str
+            :param bases: The class's superclasses.
+            :type bases: tuple
+            :param dct: The class's class attributes.
+            :type dct: dict
+            """
+
+            class_attrs[location] = ValidatedField(required=True, metadata={"load_from": location})
+            class_attrs["Meta"] = Meta
+            return type(name, bases, class_attrs)
+
+    class RequestSchema(marshmallow.Schema, metaclass=RequestSchemaMeta):  # noqa
+        """A schema to validate the request's location attributes."""
+
+        pass
+
+    request_schema = RequestSchema()
+    request_schema.context = _RequestContext()
+    return request_schema
 
 
 def _generate_marshmallow_validator(location):
@@ -38,59 +257,13 @@ def _generate_marshmallow_validator(location):
         :param deserializer: Optional deserializer, defaults to
             :func:`cornice.validators.extract_cstruct`
         """
-        import marshmallow
-        import marshmallow.schema
-        from marshmallow.utils import EXCLUDE
-
         if schema is None:
             return
 
         # see if the user wants to set any keyword arguments for their schema
         schema_kwargs = kwargs.get("schema_kwargs", {})
-        schema = _instantiate_schema(schema, **schema_kwargs)
-
-        class ValidatedField(marshmallow.fields.Field):
-            def _deserialize(self, value, attr, data, **kwargs):
-                schema.context.setdefault("request", request)
-                deserialized = schema.load(value)
-                return deserialized
-
-        class Meta(object):
-            strict = True
-            ordered = True
-            unknown = EXCLUDE
-
-        class RequestSchemaMeta(marshmallow.schema.SchemaMeta):
-            """
-            A metaclass that will inject a location class attribute into
-            RequestSchema.
-            """
-
-            def __new__(cls, name, bases, class_attrs):
-                """
-                Instantiate the RequestSchema class.
-
-                :param name: The name of the class we are instantiating. Will
-                    be "RequestSchema".
-                :type name: str
-                :param bases: The class's superclasses.
-                :type bases: tuple
-                :param dct: The class's class attributes.
-                :type dct: dict
-                """
-
-                class_attrs[location] = ValidatedField(
-                    required=True, metadata={"load_from": location}
-                )
-                class_attrs["Meta"] = Meta
-                return type(name, bases, class_attrs)
-
-        class RequestSchema(marshmallow.Schema, metaclass=RequestSchemaMeta):  # noqa
-            """A schema to validate the request's location attributes."""
-
-            pass
-
-        validator(request, RequestSchema, deserializer, **kwargs)
+        request_schema = _get_schema(schema, schema_kwargs, location)
+        _validate(request, request_schema, deserializer)
         request.validated = request.validated.get(location, {})
 
     return _validator
@@ -137,22 +310,29 @@ def validator(request, schema=None, deserializer=None, **kwargs):
     :param deserializer: Optional deserializer, defaults to
         :func:`cornice.validators.extract_cstruct`
     """
-    import marshmallow
+    if schema is None:
+        return
 
-    from cornice.validators import extract_cstruct
+    _validate(request, _get_schema(schema), deserializer)
 
-    if deserializer is None:
-        deserializer = extract_cstruct
 
-    if schema is None:
-        return
+def _validate(request, schema, deserializer=None):
+    """
+    Load the data extracted from the request with the given schema instance,
+    and fill ``request.validated`` or ``request.errors`` accordingly.
+
+    The schema context is scoped to this validation, and holds the
+    current request in ``schema.context["request"]``.
+    """
+    import marshmallow
 
-    schema = _instantiate_schema(schema)
-    schema.context.setdefault("request", request)
+    from cornice.validators import _get_cstruct
 
-    cstruct = deserializer(request)
+    cstruct = _get_cstruct(request, deserializer)
+    token = _request_context.set({})
     try:
-        deserialized = schema.load(cstruct)
+        with request_scope(request):
+            deserialized = schema.load(cstruct)
     except marshmallow.ValidationError as err:
         # translate = request.localizer.translate
         normalized_errors = _message_normalizer(err)
@@ -165,6 +345,8 @@ def validator(request, schema=None, deserializer=None, **kwargs):
                 request.errors.add(location, location, details)
     else:
         request.validated.update(deserialized)
+    finally:
+        _request_context.reset(token)
 
 
 def _instantiate_schema(schema, **kwargs):
@@ -0,0 +1,51 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+Per-request cost of the colander location validators, with the wrapping
+``RequestSchema`` built once per schema and location, and built again on
+every request as it used to be (by emptying the cache before each request).
+
+Run with ``python tests/benchmarks/bench_colander_request_schema.py``.
+"""
+
+import json
+import timeit
+
+import colander
+from pyramid.request import Request
+
+from cornice.errors import Errors
+from cornice.validators import colander_body_validator
+from cornice.validators._colander import _REQUEST_SCHEMAS
+
+
+class Body(colander.MappingSchema):
+    name = colander.SchemaNode(colander.String())
+    count = colander.SchemaNode(colander.Int())
+
+
+SCHEMA = Body()
+BODY = json.dumps({"name": "foo", "count": 42}).encode()
+
+
+def validate():
+    request = Request.blank("/", method="POST", body=BODY, content_type="application/json")
+    request.validated = {}
+    request.errors = Errors()
+    colander_body_validator(request, schema=SCHEMA)
+    assert not request.errors
+
+
+def validate_uncached():
+    _REQUEST_SCHEMAS.clear()
+    validate()
+
+
+def bench(func, number=5000, repeat=5):
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e6
+
+
+if __name__ == "__main__":
+    print("RequestSchema built per request: %.1f us/request" % bench(validate_uncached))
+    print("RequestSchema cached:            %.1f us/request" % bench(validate))
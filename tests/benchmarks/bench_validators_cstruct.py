@@ -0,0 +1,75 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+Per-request cost of a service with three colander validators (body,
+querystring and the full request), with the cstruct of the request computed
+once and shared by the validators, and computed again by each validator as
+it used to be (by dropping it before each validator): the body is then
+decoded twice.
+
+Run with ``python tests/benchmarks/bench_validators_cstruct.py``.
+"""
+
+import json
+import timeit
+
+import colander
+from pyramid.request import Request
+
+from cornice.errors import Errors
+from cornice.validators import (
+    colander_body_validator,
+    colander_querystring_validator,
+    colander_validator,
+)
+
+
+class Body(colander.MappingSchema):
+    # not checked item per item, so that decoding the body dominates
+    items = colander.SchemaNode(colander.List())
+
+
+class Querystring(colander.MappingSchema):
+    page = colander.SchemaNode(colander.Int(), missing=1)
+
+
+class Path(colander.MappingSchema):
+    id = colander.SchemaNode(colander.Int())
+
+
+class RequestSchema(colander.MappingSchema):
+    body = Body()
+    querystring = Querystring()
+    path = Path()
+
+
+VALIDATORS = (
+    (colander_body_validator, Body()),
+    (colander_querystring_validator, Querystring()),
+    (colander_validator, RequestSchema()),
+)
+BODY = json.dumps({"items": [{"id": i, "name": "item %d" % i} for i in range(200)]}).encode()
+
+
+def validate(shared=True):
+    request = Request.blank(
+        "/items/1?page=2", method="POST", body=BODY, content_type="application/json"
+    )
+    request.matchdict = {"id": "1"}
+    request.errors = Errors()
+    for validator, schema in VALIDATORS:
+        if not shared and hasattr(request, "_cornice_cstructs"):
+            del request._cornice_cstructs
+        request.validated = {}
+        validator(request, schema=schema)
+    assert not request.errors
+
+
+def bench(func, number=1000, repeat=10):
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e6
+
+
+if __name__ == "__main__":
+    print("cstruct per validator: %.1f us/request" % bench(lambda: validate(shared=False)))
+    print("cstruct shared:        %.1f us/request" % bench(validate))
@@ -0,0 +1,676 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+import datetime
+import multiprocessing
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pyramid import testing
+from pyramid.response import Response
+from webtest import TestApp
+
+from cornice import Service
+from cornice.caching import (
+    CacheEntry,
+    MemoryBackend,
+    MmapBackend,
+    ResponseCache,
+    body_etag,
+    cache_control_header,
+)
+
+from .support import TestCase
+
+
+class TestAutoETag(TestCase):
+    def setUp(self):
+        self.config = testing.setUp()
+        self.config.include("cornice")
+        self.addCleanup(testing.tearDown)
+        self.items = [{"id": 1}]
+
+        service = Service(name="items", path="/items", auto_etag=True)
+
+        def validate(request, **kwargs):
+            if "invalid" in request.params:
+                request.errors.add("querystring", "invalid", "Invalid")
+
+        @service.get(validators=(validate,))
+        def get(request):
+            return self.items
+
+        @service.post()
+        def post(request):
+            return self.items
+
+        @service.put()
+        def put(request):
+            return Response(b"{}", etag="custom")
+
+        streamed = Service(name="streamed", path="/streamed")
+
+        @streamed.get(auto_etag=True)
+        def get_streamed(request):
+            return iter(self.items)
+
+        plain = Service(name="plain", path="/plain")
+
+        @plain.get()
+        def get_plain(request):
+            return self.items
+
+        for service in (service, streamed, plain):
+            self.config.add_cornice_service(service)
+        self.app = TestApp(self.config.make_wsgi_app())
+
+    def test_etag_is_a_hash_of_the_body(self):
+        response = self.app.get("/items")
+        self.assertEqual(response.etag, body_etag(response.body))
+        self.assertEqual(response.headers["ETag"], '"%s"' % response.etag)
+        self.items.append({"id": 2})
+        self.assertNotEqual(self.app.get("/items").etag, response.etag)
+
+    def test_matching_requests_are_not_modified(self):
+        etag = self.app.get("/items").headers["ETag"]
+        for method in ("get", "head"):
+            response = getattr(self.app, method)(
+                "/items", headers={"If-None-Match": etag}, status=304
+            )
+            self.assertEqual(response.body, b"")
+            self.assertEqual(response.headers["ETag"], etag)
+            self.assertNotIn("Content-Type", response.headers)
+        # weak comparison, as the ETag may have been weakened by compression
+        self.app.get("/items", headers={"If-None-Match": "W/" + etag}, status=304)
+        self.app.get("/items", headers={"If-None-Match": '"other", ' + etag}, status=304)
+        self.app.get("/items", headers={"If-None-Match": "*"}, status=304)
+
+        self.items.append({"id": 2})
+        response = self.app.get("/items", headers={"If-None-Match": etag}, status=200)
+        self.assertEqual(response.json, self.items)
+
+    def test_head_responses_have_the_etag_of_get(self):
+        self.assertEqual(self.app.head("/items").etag, self.app.get("/items").etag)
+
+    def test_existing_etags_are_kept(self):
+        response = self.app.put("/items")
+        self.assertEqual(response.etag, "custom")
+
+    def test_other_responses_are_left_untouched(self):
+        self.assertIsNone(self.app.post("/items").etag)
+        self.assertIsNone(self.app.get("/streamed").etag)
+        self.assertIsNone(self.app.get("/plain").etag)
+        self.assertIsNone(self.app.get("/items?invalid", status=400).etag)
+
+
+class Document(object):
+    def __init__(self, request, context=None):
+        self.request = request
+
+    def version(self, request):
+        return self.request.registry.document["version"]
+
+    def get(self):
+        self.request.registry.calls.append("get")
+        return self.request.registry.document
+
+
+class TestConditionalRequests(TestCase):
+    def setUp(self):
+        self.config = testing.setUp()
+        self.config.include("cornice")
+        self.addCleanup(testing.tearDown)
+        self.modified = datetime.datetime(2020, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc)
+        self.document = self.config.registry.document = {"version": "v1", "text": "a"}
+        self.calls = self.config.registry.calls = []
+
+        def get_etag(request):
+            self.calls.append("etag")
+            return self.document["version"]
+
+        def get_last_modified(request):
+            return self.modified
+
+        def validate(request, **kwargs):
+            if "invalid" in request.params:
+                request.errors.add("querystring", "invalid", "Invalid")
+
+        service = Service(
+            name="document",
+            path="/document",
+            etag=get_etag,
+            last_modified=get_last_modified,
+            validators=(validate,),
+        )
+
+        @service.get()
+        def get(request):
+            self.calls.append("get")
+            return self.document
+
+        @service.put()
+        def put(request):
+            self.calls.append("put")
+            self.document["version"] = "v2"
+            return self.document
+
+        resource = Service(name="resource", path="/resource", klass=Document, etag="version")
+        resource.add_view("GET", "get")
+
+        self.config.add_cornice_service(service)
+        self.config.add_cornice_service(resource)
+        self.app = TestApp(self.config.make_wsgi_app())
+
+    def test_versions_are_set_on_the_response(self):
+        response = self.app.get("/document")
+        self.assertEqual(response.headers["ETag"], '"v1"')
+        self.assertEqual(response.headers["Last-Modified"], "Thu, 02 Jan 2020 03:04:05 GMT")
+        self.assertEqual(self.calls, ["etag", "get"])
+
+    def test_if_none_match_skips_the_view(self):
+        for method in ("get", "head"):
+            response = getattr(self.app, method)(
+                "/document", headers={"If-None-Match": '"v1"'}, status=304
+            )
+            self.assertEqual(response.body, b"")
+            self.assertEqual(response.headers["ETag"], '"v1"')
+        self.assertEqual(self.calls, ["etag", "etag"])
+
+        self.app.get("/document", headers={"If-None-Match": 'W/"v0", "v2"'}, status=200)
+        self.assertEqual(self.calls[-1], "get")
+        response = self.app.put("/document", headers={"If-None-Match": "*"}, status=412)
+        self.assertEqual(response.json["errors"][0]["name"], "If-None-Match")
+        self.assertNotIn("put", self.calls)
+
+    def test_if_modified_since_skips_the_view(self):
+        self.app.get(
+            "/document", headers={"If-Modified-Since": "Thu, 02 Jan 2020 03:04:05 GMT"}, status=304
+        )
+        self.app.get(
+            "/document", headers={"If-Modified-Since": "Wed, 01 Jan 2020 00:00:00 GMT"}, status=200
+        )
+        # If-None-Match takes precedence
+        self.app.get(
+            "/document",
+            headers={
+                "If-None-Match": '"v0"',
+                "If-Modified-Since": "Thu, 02 Jan 2020 03:04:05 GMT",
+            },
+            status=200,
+        )
+        self.app.put(
+            "/document", headers={"If-Modified-Since": "Thu, 02 Jan 2020 03:04:05 GMT"}, status=200
+        )
+
+    def test_if_match_fails_with_a_412(self):
+        response = self.app.put("/document", headers={"If-Match": '"v0"'}, status=412)
+        self.assertEqual(
+            response.json["errors"],
+            [{"location": "header", "name": "If-Match", "description": "Precondition failed"}],
+        )
+        self.assertNotIn("put", self.calls)
+        self.app.put("/document", headers={"If-Match": 'W/"v1"'}, status=412)
+        self.app.put("/document", headers={"If-Match": '"v1"'}, status=200)
+        self.assertEqual(self.calls[-1], "put")
+
+        self.document["version"] = None
+        self.app.put("/document", headers={"If-Match": "*"}, status=412)
+
+    def test_if_unmodified_since_fails_with_a_412(self):
+        self.app.put(
+            "/document",
+            headers={"If-Unmodified-Since": "Wed, 01 Jan 2020 00:00:00 GMT"},
+            status=412,
+        )
+        self.app.put(
+            "/document",
+            headers={"If-Unmodified-Since": "Thu, 02 Jan 2020 03:04:05 GMT"},
+            status=200,
+        )
+
+    def test_versions_are_looked_up_after_validation(self):
+        self.app.get("/document?invalid", headers={"If-None-Match": '"v1"'}, status=400)
+        self.assertEqual(self.calls, [])
+
+    def test_callables_are_resolved_on_the_class(self):
+        self.app.get("/resource", headers={"If-None-Match": '"v1"'}, status=304)
+        self.assertEqual(self.calls, [])
+        self.assertEqual(self.app.get("/resource").json, self.document)
+        self.assertEqual(self.calls, ["get"])
+
+
+class TestCacheHeaders(TestCase):
+    def setUp(self):
+        self.config = testing.setUp(settings={"cornice.compress": "true"})
+        self.config.include("cornice")
+        self.addCleanup(testing.tearDown)
+
+        def validate(request, **kwargs):
+            if "invalid" in request.params:
+                request.errors.add("querystring", "invalid", "Invalid")
+
+        service = Service(
+            name="items",
+            path="/items",
+            cache_control={"max_age": 60, "s_maxage": 300, "public": True, "private": False},
+            validators=(validate,),
+            auto_etag=True,
+        )
+
+        @service.get(accept=("application/json", "text/plain"))
+        def get(request):
+            return [1, 2]
+
+        @service.post()
+        def post(request):
+            return [1, 2]
+
+        @service.patch()
+        def patch(request):
+            return Response(b"{}", cache_control="no-store")
+
+        other = Service(name="other", path="/other", accept=lambda request: ["application/json"])
+
+        @other.get(cache_control="private, max-age=10", accept="application/json")
+        def get_other(request):
+            return [1, 2]
+
+        @other.put()
+        def put_other(request):
+            return [1, 2]
+
+        shared = Service(name="shared", path="/shared", cors_origins=("*",))
+
+        @shared.get()
+        def get_shared(request):
+            return [{"id": i} for i in range(1000)]
+
+        for service in (service, other, shared):
+            self.config.add_cornice_service(service)
+        self.app = TestApp(self.config.make_wsgi_app())
+
+    def test_cache_control_header(self):
+        self.assertEqual(cache_control_header("no-cache"), "no-cache")
+        self.assertEqual(
+            cache_control_header(
+                {"max_age": 60, "stale_while_revalidate": 30, "public": True, "no_store": None}
+            ),
+            "max-age=60, stale-while-revalidate=30, public",
+        )
+
+    def test_cache_control_is_set_on_successful_reads(self):
+        expected = "max-age=60, s-maxage=300, public"
+        response = self.app.get("/items")
+        self.assertEqual(response.headers["Cache-Control"], expected)
+        self.assertEqual(self.app.head("/items").headers["Cache-Control"], expected)
+        response = self.app.get(
+            "/items", headers={"If-None-Match": response.headers["ETag"]}, status=304
+        )
+        self.assertEqual(response.headers["Cache-Control"], expected)
+        self.assertEqual(self.app.get("/other").headers["Cache-Control"], "private, max-age=10")
+
+    def test_other_responses_are_left_untouched(self):
+        self.assertNotIn("Cache-Control", self.app.post("/items").headers)
+        self.assertNotIn("Cache-Control", self.app.get("/items?invalid", status=400).headers)
+        self.assertEqual(self.app.patch("/items").headers["Cache-Control"], "no-store")
+        self.assertNotIn("Cache-Control", self.app.get("/shared").headers)
+
+    def test_vary_follows_the_negotiation(self):
+        # responses which may be compressed also vary on Accept-Encoding
+        self.assertEqual(self.app.get("/items").headers["Vary"], "Accept, Accept-Encoding")
+        self.assertEqual(self.app.get("/other").headers["Vary"], "Accept-Encoding")
+        self.assertEqual(self.app.put("/other").headers["Vary"], "Accept, Accept-Encoding")
+        response = self.app.get(
+            "/shared", headers={"Origin": "https://example.com", "Accept-Encoding": "gzip"}
+        )
+        self.assertEqual(response.headers["Vary"], "Origin, Accept-Encoding")
+
+
+class TestMemoryBackend(TestCase):
+    def test_least_recently_used_entries_are_evicted(self):
+        backend = MemoryBackend(max_bytes=10)
+        backend.set("a", 1, 4)
+        backend.set("b", 2, 4)
+        self.assertEqual(backend.get("a"), 1)
+        backend.set("c", 3, 4)
+        self.assertEqual((backend.get("a"), backend.get("b"), backend.get("c")), (1, None, 3))
+        self.assertEqual((len(backend), backend.size), (2, 8))
+        backend.set("a", 4, 6)
+        self.assertEqual((backend.get("a"), backend.size), (4, 10))
+
+    def test_entries_larger_than_the_bound_are_not_stored(self):
+        backend = MemoryBackend(max_bytes=10)
+        backend.set("a", 1, 4)
+        backend.set("a", 2, 11)
+        self.assertEqual((backend.get("a"), backend.size), (None, 0))
+
+    def test_delete_and_clear(self):
+        backend = MemoryBackend()
+        backend.set("a", 1, 4)
+        backend.set("b", 2, 4)
+        backend.delete("a")
+        backend.delete("unknown")
+        self.assertEqual(backend.keys(), ["b"])
+        backend.clear()
+        self.assertEqual((backend.keys(), backend.size), ([], 0))
+
+
+class TestResponseCache(TestCase):
+    def setUp(self):
+        self.calls = []
+        self.version = 1
+        self._use_cache(ResponseCache(ttl=60, key=lambda request: request.headers.get("X-User")))
+
+    def _use_cache(self, cache):
+        self.config = testing.setUp()
+        self.config.include("cornice")
+        self.addCleanup(testing.tearDown)
+
+        def validate(request, **kwargs):
+            self.calls.append("validate")
+
+        self.service = Service(
+            name="item",
+            path="/items/{id}",
+            cache=cache,
+            validators=(validate,),
+            cors_origins=("https://example.com",),
+            auto_etag=True,
+        )
+
+        @self.service.get(accept=("application/json", "text/plain"))
+        def get(request):
+            self.calls.append("get")
+            if self.version is None:
+                raise ValueError("Failed")
+            if request.params.get("cookie"):
+                request.response.set_cookie("a", "b")
+            if request.params.get("no-store"):
+                request.response.cache_control = "no-store"
+            if request.params.get("error"):
+                request.errors.add("querystring", "error", "Error")
+            return {"id": request.matchdict["id"], "version": self.version}
+
+        @self.service.post()
+        def post(request):
+            self.calls.append("post")
+            return {}
+
+        streamed = Service(name="streamed", path="/streamed", cache=ResponseCache())
+
+        @streamed.get()
+        def get_streamed(request):
+            self.calls.append("streamed")
+            return iter([1])
+
+        self.config.add_cornice_service(self.service)
+        self.config.add_cornice_service(streamed)
+        self.app = TestApp(self.config.make_wsgi_app())
+        return cache
+
+    def test_responses_are_cached(self):
+        cache = self.service.cache
+        first = self.app.get("/items/1")
+        second = self.app.get("/items/1")
+        self.assertEqual(self.calls, ["validate", "get"])
+        self.assertEqual(second.json, {"id": "1", "version": 1})
+        self.assertEqual(second.headerlist, first.headerlist)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(self.app.head("/items/1").headers["ETag"], first.headers["ETag"])
+        self.assertEqual(self.calls, ["validate", "get"])
+
+    def test_responses_are_cached_per_request(self):
+        self.app.get("/items/1?a=1&b=2")
+        self.app.get("/items/1?b=2&a=1")
+        self.assertEqual(self.calls.count("get"), 1)
+        for path, headers in (
+            ("/items/2", {}),
+            ("/items/1?a=2&b=2", {}),
+            ("/items/1?a=1&b=2", {"Accept": "text/plain"}),
+            ("/items/1?a=1&b=2", {"X-User": "alice"}),
+        ):
+            self.app.get(path, headers=headers)
+        self.assertEqual(self.calls.count("get"), 5)
+        self.assertEqual(len(self.service.cache.backend), 5)
+
+    def test_cached_responses_are_filtered(self):
+        etag = self.app.get("/items/1").headers["ETag"]
+        response = self.app.get("/items/1", headers={"If-None-Match": etag}, status=304)
+        self.assertEqual(response.body, b"")
+        response = self.app.get("/items/1", headers={"Origin": "https://example.com"})
+        self.assertEqual(response.headers["Access-Control-Allow-Origin"], "https://example.com")
+        self.assertEqual(response.headers["X-Content-Type-Options"], "nosniff")
+        self.assertEqual(self.calls.count("get"), 1)
+
+    def test_preconditions_are_checked_on_cached_responses(self):
+        versioned = Service(
+            name="versioned",
+            path="/versioned",
+            cache=ResponseCache(ttl=60),
+            etag=lambda request: "v%s" % self.version,
+            last_modified=lambda request: datetime.datetime(2020, 1, self.version),
+        )
+
+        @versioned.get()
+        def get(request):
+            self.calls.append("versioned")
+            return {}
+
+        self.config.add_cornice_service(versioned)
+        app = TestApp(self.config.make_wsgi_app())
+        self.assertEqual(app.get("/versioned").headers["ETag"], '"v1"')
+        self.assertEqual(app.get("/versioned").headers["ETag"], '"v1"')
+        response = app.get("/versioned", headers={"If-None-Match": '"v1"'}, status=304)
+        self.assertEqual(response.body, b"")
+        self.assertEqual(versioned.cache.hits, 2)
+        self.version = 2
+        # the cached response is not the current version of the resource
+        response = app.get("/versioned", headers={"If-Match": '"v1"'}, status=412)
+        self.assertEqual(response.json["errors"][0]["name"], "If-Match")
+        response = app.get("/versioned", headers={"If-None-Match": '"v2"'}, status=304)
+        self.assertEqual(response.headers["ETag"], '"v2"')
+        self.assertEqual(response.headers["Last-Modified"], "Thu, 02 Jan 2020 00:00:00 GMT")
+        self.assertEqual(self.calls, ["versioned"])
+
+    def test_origin_is_checked_on_cached_responses(self):
+        response = self.app.get("/items/1", headers={"Origin": "https://example.com"})
+        self.assertEqual(response.headers["Access-Control-Allow-Origin"], "https://example.com")
+        entry = self.service.cache.backend.get(next(iter(self.service.cache.backend.keys())))
+        self.assertFalse([name for name, _ in entry.headerlist if name.startswith("Access-")])
+
+        response = self.app.get("/items/1", headers={"Origin": "https://evil.com"}, status=400)
+        self.assertNotIn("version", response.text)
+        self.assertNotIn("Access-Control-Allow-Origin", response.headers)
+        response = self.app.get("/items/1")
+        self.assertNotIn("Access-Control-Allow-Origin", response.headers)
+        self.assertEqual(self.calls.count("get"), 1)
+
+    def test_some_responses_are_not_cached(self):
+        for _ in range(2):
+            self.app.post("/items/1")
+            self.app.get("/items/1?cookie=1")
+            self.app.get("/items/1?no-store=1")
+            self.app.get("/items/1?error=1", status=400)
+            self.app.get("/streamed")
+        self.assertEqual(self.calls.count("post"), 2)
+        self.assertEqual(self.calls.count("get"), 6)
+        self.assertEqual(self.calls.count("streamed"), 2)
+        self.assertEqual(len(self.service.cache.backend), 0)
+
+    def test_expired_responses_are_rendered_again(self):
+        cache = self._use_cache(ResponseCache(ttl=0))
+        self.app.get("/items/1")
+        self.version = 2
+        self.assertEqual(self.app.get("/items/1").json["version"], 2)
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+
+    def test_stale_responses_are_refreshed_in_the_background(self):
+        executor = ThreadPoolExecutor(1)
+        cache = self._use_cache(ResponseCache(ttl=0, stale_ttl=60, executor=executor))
+        self.app.get("/items/1")
+        self.version = 2
+        # refreshes wait for this one
+        release = threading.Event()
+        executor.submit(release.wait)
+        self.assertEqual(self.app.get("/items/1").json["version"], 1)
+        self.assertEqual(
+            self.app.get("/items/1", headers={"If-None-Match": "x"}).json["version"], 1
+        )
+        self.assertEqual((cache.stale_hits, cache.refreshes), (2, 1))
+        cache.ttl = 60
+        release.set()
+        executor.shutdown(wait=True)
+        self.assertEqual(self.app.get("/items/1").json["version"], 2)
+        self.assertEqual(self.calls.count("get"), 2)
+
+    def test_refreshes_run_in_threads_by_default(self):
+        cache = self._use_cache(ResponseCache(ttl=0, stale_ttl=60))
+        self.app.get("/items/1")
+        self.version = 2
+        self.assertEqual(self.app.get("/items/1").json["version"], 1)
+        cache.ttl = 60
+        deadline = time.monotonic() + 5
+        while cache._refreshing and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.calls.count("get"), 2)
+        self.assertEqual(self.app.get("/items/1").json["version"], 2)
+
+    def test_refresh_errors_are_logged(self):
+        executor = ThreadPoolExecutor(1)
+        cache = self._use_cache(ResponseCache(ttl=0, stale_ttl=60, executor=executor))
+        self.app.get("/items/1")
+        self.version = None
+        with self.assertLogs("cornice", "ERROR") as logs:
+            self.assertEqual(self.app.get("/items/1").json["version"], 1)
+            executor.shutdown(wait=True)
+        self.assertIn("Could not refresh /items/1", logs.output[0])
+        self.assertEqual(cache._refreshing, set())
+
+    def test_invalidate(self):
+        cache = self.service.cache
+        self.app.get("/items/1")
+        self.app.get("/items/1?a=1")
+        self.app.get("/items/2")
+        cache.invalidate(id="1")
+        self.assertEqual([key[1] for key in cache.backend.keys()], [(("id", "2"),)])
+        cache.invalidate()
+        self.assertEqual(cache.backend.keys(), [])
+
+
+def _entry(body, expires=1.0):
+    return CacheEntry("200 OK", (("Content-Type", "text/plain"),), body, expires, expires + 1)
+
+
+def _set_in_child(path, key, body):
+    MmapBackend(path, slots=8, slot_size=1024).set(key, _entry(body), len(body))
+
+
+class TestMmapBackend(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, "cache")
+
+    def _backend(self, **kwargs):
+        kwargs.setdefault("slots", 8)
+        kwargs.setdefault("slot_size", 1024)
+        backend = MmapBackend(self.path, **kwargs)
+        self.addCleanup(backend.close)
+        return backend
+
+    def test_entries_are_stored(self):
+        backend = self._backend()
+        key = ("route", (("id", "1"),), (), "", None)
+        self.assertIsNone(backend.get(key))
+        backend.set(key, _entry(b"body"), 4)
+        self.assertEqual(backend.get(key), _entry(b"body"))
+        backend.set(key, _entry(b"other", 2.0), 5)
+        self.assertEqual(backend.get(key), _entry(b"other", 2.0))
+        self.assertEqual(backend.keys(), [key])
+
+    def test_entries_are_shared_between_processes(self):
+        backend = self._backend()
+        process = multiprocessing.get_context("fork").Process(
+            target=_set_in_child, args=(self.path, "key", b"from the child")
+        )
+        process.start()
+        process.join()
+        self.assertEqual(process.exitcode, 0)
+        self.assertEqual(backend.get("key").body, b"from the child")
+
+    def test_least_recently_written_entries_are_replaced(self):
+        backend = self._backend(slots=2, ways=2)
+        for key in ("a", "b", "c"):
+            backend.set(key, _entry(key.encode()), 1)
+        self.assertEqual(sorted(backend.keys()), ["b", "c"])
+        self.assertIsNone(backend.get("a"))
+
+    def test_hash_collisions(self):
+        class CollidingBackend(MmapBackend):
+            def _hash(self, key):
+                return super(CollidingBackend, self)._hash(key)[0], 0
+
+        backend = CollidingBackend(self.path, slots=2, slot_size=1024, ways=2)
+        self.addCleanup(backend.close)
+        backend.set("a", _entry(b"a"), 1)
+        backend.set("b", _entry(b"b"), 1)
+        self.assertEqual((backend.get("a").body, backend.get("b").body), (b"a", b"b"))
+
+    def test_entries_larger_than_a_slot_are_not_stored(self):
+        backend = self._backend()
+        backend.set("key", _entry(b"small"), 5)
+        backend.set("key", _entry(b"x" * 1024), 1024)
+        self.assertIsNone(backend.get("key"))
+
+    def test_delete_and_clear(self):
+        backend = self._backend()
+        backend.set("a", _entry(b"a"), 1)
+        backend.set("b", _entry(b"b"), 1)
+        backend.delete("a")
+        backend.delete("unknown")
+        self.assertEqual(backend.keys(), ["b"])
+        backend.clear()
+        self.assertEqual(backend.keys(), [])
+
+    def test_slots_being_written_are_not_read(self):
+        backend = self._backend(slots=1)
+        backend.set("key", _entry(b"body"), 4)
+        offset = backend._offset(0)
+        sequence = struct.unpack_from("<Q", backend._map, offset)[0]
+        # as if a writer had died while writing
+        struct.pack_into("<Q", backend._map, offset, sequence + 1)
+        self.assertIsNone(backend.get("key"))
+        backend.set("key", _entry(b"again"), 5)
+        self.assertEqual(backend.get("key").body, b"again")
+        self.assertEqual(struct.unpack_from("<Q", backend._map, offset)[0] % 2, 0)
+
+    def test_geometry_is_checked(self):
+        self._backend()
+        self.assertEqual(self._backend().slots, 8)
+        with self.assertRaises(ValueError):
+            self._backend(slots=16)
+
+    def test_response_cache_is_shared(self):
+        config = testing.setUp()
+        self.addCleanup(testing.tearDown)
+        config.include("cornice")
+        calls = []
+        caches = []
+        for name in ("worker1", "worker2"):
+            cache = ResponseCache(backend=self._backend())
+            service = Service(name=name, path="/" + name, cache=cache)
+            service.add_view("GET", lambda request: calls.append(1) or {"a": 1})
+            config.add_cornice_service(service)
+            caches.append(cache)
+        app = TestApp(config.make_wsgi_app())
+        # same route name and key for both "workers"
+        caches[1].make_key = caches[0].make_key = lambda request: "key"
+        self.assertEqual(app.get("/worker1").json, {"a": 1})
+        self.assertEqual(app.get("/worker2").json, {"a": 1})
+        self.assertEqual(len(calls), 1)
+        self.assertEqual((caches[1].hits, caches[1].misses), (1, 0))
@@ -0,0 +1,312 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+import unittest
+from unittest import mock
+
+from pyramid.request import Request
+from pyramid.threadlocal import get_current_registry
+
+
+try:
+    import colander
+
+    COLANDER = True
+except ImportError:
+    COLANDER = False
+
+from cornice.errors import Errors
+
+from .support import TestCase
+
+
+skip_if_no_colander = unittest.skipIf(COLANDER is False, "colander is not installed.")
+
+
+if COLANDER:
+
+    class Tags(colander.SequenceSchema):
+        tag = colander.SchemaNode(colander.String(), validator=colander.Length(min=2))
+
+    class Point(colander.MappingSchema):
+        x = colander.SchemaNode(colander.Float())
+        y = colander.SchemaNode(colander.Float(), missing=0.0)
+
+    class Points(colander.SequenceSchema):
+        point = Point()
+
+    class Item(colander.MappingSchema):
+        name = colander.SchemaNode(colander.String(), validator=colander.Length(1, 10))
+        count = colander.SchemaNode(colander.Integer(), validator=colander.Range(0, 100))
+        strict = colander.SchemaNode(colander.Integer(strict=True), missing=colander.drop)
+        ratio = colander.SchemaNode(colander.Float(), missing=0.5)
+        active = colander.SchemaNode(colander.Boolean(), missing=False)
+        kind = colander.SchemaNode(colander.String(), validator=colander.OneOf(["a", "b"]))
+        when = colander.SchemaNode(colander.DateTime(), missing=None)
+        empty = colander.SchemaNode(colander.String(allow_empty=True), missing=colander.drop)
+        email = colander.SchemaNode(colander.String(), validator=colander.Email(), missing="")
+        tags = Tags(missing=colander.drop)
+        points = Points(missing=())
+        decimal = colander.SchemaNode(colander.Decimal(), missing=colander.drop)
+        scalars = colander.SchemaNode(
+            colander.Sequence(accept_scalar=True),
+            colander.SchemaNode(colander.Integer()),
+            missing=colander.drop,
+        )
+
+    class Strict(colander.MappingSchema):
+        a = colander.SchemaNode(colander.Integer())
+
+        @staticmethod
+        def schema_type():
+            return colander.Mapping(unknown="raise")
+
+    class Preserve(colander.MappingSchema):
+        a = colander.SchemaNode(colander.Integer(), missing=colander.drop)
+
+        @staticmethod
+        def schema_type():
+            return colander.Mapping(unknown="preserve")
+
+    class Upper(colander.SchemaNode):
+        schema_type = colander.String
+
+        def deserialize(self, cstruct=colander.null):
+            return super(Upper, self).deserialize(cstruct).upper()
+
+    class Unsupported(colander.MappingSchema):
+        upper = Upper()
+        stripped = colander.SchemaNode(colander.String(), preparer=lambda v: v.strip() if v else v)
+        bound = colander.SchemaNode(
+            colander.Integer(), validator=colander.deferred(lambda node, kw: kw["validator"])
+        )
+        strict = Strict(missing=colander.drop)
+        preserve = Preserve(missing=colander.drop)
+
+    class Payload(colander.MappingSchema):
+        body = Item()
+        querystring = Unsupported(missing=colander.drop)
+
+    VALID_ITEM = {
+        "name": "foo",
+        "count": "12",
+        "strict": 3,
+        "ratio": "0.25",
+        "active": "true",
+        "kind": "a",
+        "when": "2020-01-02T03:04:05",
+        "empty": "",
+        "email": "a@b.com",
+        "tags": ["ab", "cd"],
+        "points": [{"x": "1"}, {"x": 2, "y": "3.5"}],
+        "decimal": "1.5",
+        "scalars": "4",
+        "unknown": "ignored",
+    }
+
+    def _items():
+        return [
+            VALID_ITEM,
+            {"name": "foo", "count": 0, "kind": "b"},
+            {"name": "foo", "count": "12", "kind": "a", "tags": ("ab",), "scalars": [1, "2"]},
+            {"name": "foo", "count": "12", "kind": "a", "tags": {"ab"}},
+            {"name": "foo", "count": "12", "kind": "a", "tags": ["ab", colander.null]},
+            {"name": "foo", "count": "12", "kind": "a", "tags": "ab"},
+            {"name": "foo", "count": "12", "kind": "a", "points": [colander.drop]},
+            {"name": b"foo", "count": "12", "kind": "a"},
+            {"name": "", "count": "12", "kind": "a"},
+            {"name": "far too long name", "count": "12", "kind": "a"},
+            {"name": 42, "count": "12", "kind": "a"},
+            {"name": "foo", "count": "-1", "kind": "a"},
+            {"name": "foo", "count": "101", "kind": "a"},
+            {"name": "foo", "count": "twelve", "kind": "a"},
+            {"name": "foo", "count": "12", "strict": "3.5", "kind": "a"},
+            {"name": "foo", "count": "12", "kind": "c"},
+            {"name": "foo", "count": "12", "kind": "a", "active": "maybe"},
+            {"name": "foo", "count": "12", "kind": "a", "when": "yesterday"},
+            {"name": "foo", "count": "12", "kind": "a", "email": "nope"},
+            {"name": "foo", "count": "12", "kind": "a", "tags": ["a"]},
+            {"name": "foo", "count": "12", "kind": "a", "points": [{"y": 1}, "nope"]},
+            {"name": "foo", "count": "12", "kind": "a", "decimal": "x"},
+            {"name": "foo", "count": "12", "kind": "a", "scalars": {"a": 1}},
+            {"count": "12"},
+            {},
+            [],
+            "nope",
+        ]
+
+    QUERYSTRINGS = [
+        colander.drop,
+        {"upper": "foo", "stripped": " bar ", "bound": "1"},
+        {"upper": "foo", "stripped": " bar ", "bound": "7"},
+        {"upper": "", "stripped": " bar ", "bound": "1"},
+        {"upper": "foo", "stripped": " bar ", "bound": "1", "strict": {"a": 1}},
+        {"upper": "foo", "stripped": " bar ", "bound": "1", "strict": {"a": 1, "b": 2}},
+        {"upper": "foo", "stripped": " bar ", "bound": "1", "preserve": {"b": {"c": [1]}}},
+        {"upper": "foo", "stripped": " bar ", "bound": "1", "preserve": "nope"},
+    ]
+
+
+def _outcome(deserialize, cstruct):
+    try:
+        return "ok", deserialize(cstruct)
+    except colander.Invalid as e:
+        return "invalid", e.asdict()
+
+
+@skip_if_no_colander
+class TestCompiledColanderSchemas(TestCase):
+    def setUp(self):
+        from cornice.validators._colander_compiler import compile_schema
+
+        self.schema = Payload().bind(validator=colander.Range(max=5))
+        self.compiled = compile_schema(self.schema)
+
+    def assertSameOutcome(self, cstruct):
+        expected = _outcome(self.schema.deserialize, cstruct)
+        self.assertEqual(_outcome(self.compiled, cstruct), expected, cstruct)
+
+    def test_compiled_schema_matches_colander(self):
+        for querystring in QUERYSTRINGS:
+            for item in _items():
+                cstruct = {"body": item}
+                if querystring is not colander.drop:
+                    cstruct["querystring"] = querystring
+                self.assertSameOutcome(cstruct)
+
+    def test_compiled_schema_matches_colander_on_root_values(self):
+        for cstruct in (colander.null, {}, [], "nope", 42, None):
+            self.assertSameOutcome(cstruct)
+
+    def test_compiled_schema_consumes_iterators_once(self):
+        cstruct = {"body": dict(VALID_ITEM, tags=iter(["ab", "cd"]))}
+        self.assertEqual(self.compiled(cstruct)["body"]["tags"], ["ab", "cd"])
+
+    def test_compiled_schema_does_not_walk_supported_nodes(self):
+        cstruct = {"body": {"name": "foo", "count": "12", "kind": "a"}}
+        with mock.patch.object(
+            colander.SchemaNode, "deserialize", side_effect=AssertionError
+        ) as deserialize:
+            self.compiled(cstruct)
+        deserialize.assert_not_called()
+
+    def test_compiled_schema_falls_back_to_colander_on_errors(self):
+        cstruct = {"body": {"name": "foo", "count": "-1", "kind": "a"}}
+        with mock.patch.object(
+            self.schema, "deserialize", wraps=self.schema.deserialize
+        ) as deserialize:
+            with self.assertRaises(colander.Invalid):
+                self.compiled(cstruct)
+        deserialize.assert_called_once_with(cstruct)
+
+    def test_compiled_schema_decodes_bytes(self):
+        from cornice.validators._colander_compiler import compile_schema
+
+        schema = colander.SchemaNode(colander.String(encoding="utf-8"))
+        self.assertEqual(compile_schema(schema)("é".encode("utf-8")), "é")
+
+    def test_compiled_schema_reads_mappings(self):
+        from cornice.validators._colander_compiler import compile_schema
+
+        class Broken(object):
+            def items(self):
+                raise ValueError("broken")
+
+            keys = items
+
+        schema = Point()
+        compiled = compile_schema(schema)
+        self.assertEqual(
+            _outcome(compiled, colander.null), _outcome(schema.deserialize, colander.null)
+        )
+        self.assertEqual(compiled(Request.blank("/?x=1").GET), {"x": 1.0, "y": 0.0})
+        broken = Broken()
+        self.assertEqual(_outcome(compiled, broken), _outcome(schema.deserialize, broken))
+
+
+@skip_if_no_colander
+class TestCompiledColanderValidators(TestCase):
+    def setUp(self):
+        from cornice.validators import _colander
+
+        self.cache = _colander._COMPILED_SCHEMAS
+        self.cache.clear()
+
+    def _validate(self, validator, schema, body, **kwargs):
+        request = Request.blank("/", method="POST", body=body)
+        request.registry = get_current_registry()
+        request.validated = {}
+        request.errors = Errors()
+        validator(request, schema=schema, **kwargs)
+        return request
+
+    def test_errors_are_the_same_as_colander(self):
+        from cornice.validators import colander_body_validator
+
+        schema = Item()
+        bodies = [b'{"name": "foo", "count": "12", "kind": "a"}', b'{"count": "x"}', b"[1]"]
+        for body in bodies:
+            plain = self._validate(colander_body_validator, schema, body)
+            compiled = self._validate(colander_body_validator, schema, body, compiled=True)
+            self.assertEqual(compiled.validated, plain.validated)
+            self.assertEqual(compiled.errors, plain.errors)
+        # Once for the wrapping schema of the body.
+        self.assertEqual(len(self.cache), 1)
+        self.assertEqual(self.cache.hits, 2)
+
+    def test_schemas_are_only_compiled_if_asked(self):
+        from cornice.validators import colander_validator
+
+        self._validate(colander_validator, Payload(), b"{}")
+        self.assertEqual(len(self.cache), 0)
+
+    def test_schemas_are_compiled_when_registered(self):
+        from pyramid import testing
+
+        from cornice import Service
+        from cornice.validators import (
+            colander_body_validator,
+            colander_querystring_validator,
+            colander_validator,
+        )
+
+        service = Service(name="compiled", path="/compiled")
+        view = lambda request: None  # noqa: E731
+        service.add_view("POST", view, schema=Item(), validators=(colander_body_validator,))
+        for validator in (colander_body_validator, colander_querystring_validator):
+            service.add_view("PUT", view, schema=Item(), validators=(validator,), compiled=True)
+        service.add_view(
+            "PATCH", view, schema=Payload(), validators=(colander_validator,), compiled=True
+        )
+        service.add_view("GET", view, schema=Item, validators=(colander_validator,), compiled=True)
+        service.add_view(
+            "DELETE", view, schema=Tags(), validators=(colander_body_validator,), compiled=True
+        )
+
+        with testing.testConfig() as config:
+            config.include("cornice")
+            config.add_cornice_service(service)
+            # Neither the plain view, the schema class nor the sequence are compiled.
+            self.assertEqual(len(self.cache), 3)
+
+    def test_compiled_option_is_not_passed_to_pyramid(self):
+        from pyramid import testing
+        from webtest import TestApp
+
+        from cornice import Service
+        from cornice.validators import colander_body_validator
+
+        service = Service(name="compiled", path="/compiled")
+
+        @service.post(schema=Item(), validators=(colander_body_validator,), compiled=True)
+        def post(request):
+            return request.validated
+
+        with testing.testConfig() as config:
+            config.include("cornice")
+            config.add_cornice_service(service)
+            app = TestApp(config.make_wsgi_app())
+            response = app.post_json("/compiled", {"name": "foo", "count": "3", "kind": "b"})
+            self.assertEqual(response.json["count"], 3)
+            response = app.post_json("/compiled", {"name": "foo", "kind": "b"}, status=400)
+            self.assertEqual(response.json["errors"][0]["name"], "count")
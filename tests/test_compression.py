@@ -0,0 +1,209 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+import gzip
+import json
+import zlib
+
+import brotli
+import zstandard
+from pyramid import testing
+from pyramid.request import Request
+from pyramid.response import Response
+
+from cornice import Service
+from cornice.compression import (
+    CODINGS,
+    ENCODING_CACHE,
+    Compression,
+    is_compressible,
+    negotiate_encoding,
+)
+
+from .support import TestCase
+
+
+ITEMS = [{"id": i, "name": "item %d" % i} for i in range(200)]
+
+DECODERS = {
+    "gzip": gzip.decompress,
+    "deflate": zlib.decompress,
+    "br": brotli.decompress,
+    "zstd": lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data),
+}
+
+
+class TestCompressionNegotiation(TestCase):
+    def test_preferred_encoding(self):
+        codings = tuple(CODINGS)
+        self.assertEqual(codings, ("zstd", "br", "gzip", "deflate"))
+
+        def negotiate(header, codings=codings):
+            headers = {"Accept-Encoding": header} if header is not None else {}
+            return negotiate_encoding(Request.blank("/", headers=headers), codings)
+
+        self.assertEqual(negotiate("gzip, deflate, br, zstd"), "zstd")
+        self.assertEqual(negotiate("gzip;q=0.5, br"), "br")
+        self.assertEqual(negotiate("*, zstd;q=0"), "br")
+        self.assertEqual(negotiate("gzip, br", ("gzip", "deflate")), "gzip")
+        self.assertIsNone(negotiate("identity"))
+        self.assertIsNone(negotiate(None))
+
+    def test_negotiation_is_cached(self):
+        ENCODING_CACHE.clear()
+        request = Request.blank("/", headers={"Accept-Encoding": "gzip"})
+        for _ in range(3):
+            self.assertEqual(negotiate_encoding(request, ("gzip",)), "gzip")
+        self.assertEqual((ENCODING_CACHE.hits, ENCODING_CACHE.misses), (2, 1))
+
+    def test_compressible_types(self):
+        for content_type in ("application/json", "text/csv", "application/hal+json"):
+            self.assertTrue(is_compressible(content_type), content_type)
+        for content_type in ("image/png", "application/zip", None):
+            self.assertFalse(is_compressible(content_type), content_type)
+
+    def test_settings(self):
+        compression = Compression.from_settings({})
+        self.assertEqual(
+            (compression.enabled, compression.min_size, compression.codings),
+            (False, 1024, tuple(CODINGS)),
+        )
+        compression = Compression.from_settings(
+            {
+                "cornice.compress": "true",
+                "cornice.compress_min_size": "10",
+                "cornice.compress_encodings": "gzip unknown br",
+            }
+        )
+        self.assertEqual(
+            (compression.enabled, compression.min_size, compression.codings),
+            (True, 10, ("gzip", "br")),
+        )
+
+
+class TestCompression(TestCase):
+    def setUp(self):
+        self.config = testing.setUp(
+            settings={"cornice.compress": "true", "cornice.compress_min_size": "100"}
+        )
+        self.config.include("cornice")
+        self.addCleanup(testing.tearDown)
+
+    def _app(self, **kwargs):
+        service = Service(name="items", path="/items", **kwargs)
+
+        @service.get()
+        def get(request):
+            return ITEMS[: int(request.params.get("count", len(ITEMS)))]
+
+        @service.patch()
+        def patch(request):
+            response = Response(",".join(str(item["id"]) for item in ITEMS))
+            response.etag = "abc"
+            response.content_type = "text/csv"
+            return response
+
+        @service.post()
+        def post(request):
+            return Response(b"\x89PNG" * 100, content_type="image/png")
+
+        @service.put()
+        def put(request):
+            return Response(gzip.compress(b"{}" * 100), content_encoding="gzip")
+
+        streamed = Service(name="streamed", path="/streamed", **kwargs)
+
+        @streamed.get()
+        def get_streamed(request):
+            return iter(ITEMS)
+
+        self.config.add_cornice_service(service)
+        self.config.add_cornice_service(streamed)
+        return self.config.make_wsgi_app()
+
+    def _get(self, app, path, method="GET", encoding=None):
+        # Not using WebTest, which decodes the responses.
+        headers = {"Accept-Encoding": encoding} if encoding else {}
+        return Request.blank(path, method=method, headers=headers).get_response(app)
+
+    def test_responses_are_compressed(self):
+        app = self._app()
+        for coding, decode in DECODERS.items():
+            response = self._get(app, "/items", encoding=coding)
+            self.assertEqual(response.headers["Content-Encoding"], coding)
+            self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+            self.assertEqual(int(response.headers["Content-Length"]), len(response.body))
+            self.assertEqual(json.loads(decode(response.body)), ITEMS)
+
+    def test_small_responses_are_not_compressed(self):
+        response = self._get(self._app(), "/items?count=1", encoding="gzip")
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+        self.assertEqual(json.loads(response.body), ITEMS[:1])
+
+    def test_responses_are_not_compressed_without_accept_encoding(self):
+        response = self._get(self._app(), "/items")
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(json.loads(response.body), ITEMS)
+        response = self._get(self._app(), "/items", "HEAD", "gzip")
+        self.assertNotIn("Content-Encoding", response.headers)
+
+    def test_compression_can_be_disabled_per_view(self):
+        response = self._get(self._app(compress=False), "/items", encoding="gzip")
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertNotIn("Vary", response.headers)
+
+    def test_compression_can_be_enabled_per_view(self):
+        self.config.registry.cornice_compression.enabled = False
+        response = self._get(self._app(), "/items", encoding="gzip")
+        self.assertNotIn("Content-Encoding", response.headers)
+        response = self._get(self._app(compress=True), "/items", encoding="gzip")
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+
+    def test_incompressible_responses_are_skipped(self):
+        app = self._app()
+        response = self._get(app, "/items", "POST", "gzip")
+        self.assertNotIn("Content-Encoding", response.headers)
+        response = self._get(app, "/items", "PUT", "br")
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.body), b"{}" * 100)
+
+    def test_etags_are_made_weak(self):
+        response = self._get(self._app(), "/items", "PATCH", "gzip")
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(response.headers["ETag"], 'W/"abc"')
+
+    def test_streamed_responses_are_only_compressed_on_demand(self):
+        response = self._get(self._app(), "/streamed", encoding="gzip")
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(json.loads(response.body), ITEMS)
+
+        app = self._app(compress_streams=True)
+        for coding, decode in DECODERS.items():
+            response = self._get(app, "/streamed", encoding=coding)
+            self.assertEqual(response.headers["Content-Encoding"], coding)
+            self.assertNotIn("Content-Length", response.headers)
+            self.assertEqual(json.loads(decode(response.body)), ITEMS)
+
+    def test_streamed_responses_are_closed(self):
+        closed = []
+
+        class AppIter(object):
+            def __iter__(self):
+                return iter([b"a" * 10, b"b" * 10])
+
+            def close(self):
+                closed.append(True)
+
+        request = Request.blank("/", headers={"Accept-Encoding": "deflate"})
+        response = Response(app_iter=AppIter(), content_type="text/plain")
+        Compression(enabled=True).apply(request, response, streams=True)
+        self.assertEqual(zlib.decompress(b"".join(response.app_iter)), b"a" * 10 + b"b" * 10)
+        self.assertEqual(closed, [True])
+
+    def test_empty_responses_are_skipped(self):
+        request = Request.blank("/", headers={"Accept-Encoding": "gzip"})
+        compression = Compression(enabled=True, min_size=0)
+        for response in (Response(status=204), Response(content_type="text/plain")):
+            compression.apply(request, response)
+            self.assertIsNone(response.content_encoding)
@@ -1,6 +1,8 @@
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
+from unittest import mock
+
 from pyramid import testing
 from pyramid.authentication import BasicAuthAuthenticationPolicy
 from pyramid.exceptions import HTTPBadRequest, NotFound
@@ -10,6 +12,8 @@ from pyramid.view import view_config
 from webtest import TestApp
 from zope.interface import implementer
 
+from cornice.cors import CORSPolicy, ensure_origin
+from cornice.errors import Errors
 from cornice.service import Service
 
 from .support import CatchErrors, TestCase
@@ -388,3 +392,85 @@ class TestAlwaysCORS(TestCase):
 
     def test_checks_origin_when_not_star(self):
         self.app.put("/squirel", headers={"Origin": "not foobar"}, status=400)
+
+
+class TestCORSPolicy(TestCase):
+    def setUp(self):
+        self.config = testing.setUp()
+        self.config.include("cornice")
+        self.config.add_route("noservice", "/noservice")
+        self.config.scan("tests.test_cors")
+        self.app = TestApp(CatchErrors(self.config.make_wsgi_app()))
+
+    def tearDown(self):
+        testing.tearDown()
+
+    def test_policies_are_compiled_at_registration(self):
+        policies = self.config.registry.cornice_cors_policies[spam]
+        self.assertEqual(set(policies), {None, "GET", "HEAD", "POST", "OPTIONS"})
+        policy = policies["GET"]
+        self.assertEqual(policy.origins, frozenset(["*"]))
+        self.assertTrue(policy.any_origin)
+        self.assertTrue(policy.credentials)
+        self.assertEqual(policy.max_age, "42")
+        self.assertFalse(policies["POST"].credentials)
+        self.assertIsNone(policies["POST"].max_age)
+        self.assertEqual(
+            self.config.registry.cornice_cors_policies[squirel]["GET"].expose_headers,
+            "X-My-Header",
+        )
+
+    def test_requests_do_not_go_through_the_definitions(self):
+        with mock.patch.object(Service, "cors_origins_for", side_effect=AssertionError):
+            resp = self.app.get("/squirel", headers={"Origin": "notmyidea.org"})
+        self.assertEqual(resp.headers["Access-Control-Allow-Origin"], "notmyidea.org")
+        self.assertEqual(resp.headers["Access-Control-Expose-Headers"], "X-My-Header")
+
+    def test_preflight_requests_do_not_go_through_the_definitions(self):
+        methods = mock.PropertyMock(side_effect=AssertionError)
+        with (
+            mock.patch.object(Service, "cors_supported_headers_for", side_effect=AssertionError),
+            mock.patch.object(Service, "cors_supported_methods", methods),
+        ):
+            resp = self.app.options(
+                "/spam",
+                headers={
+                    "Origin": "notmyidea.org",
+                    "Access-Control-Request-Method": "GET",
+                    "Access-Control-Request-Headers": "x-my-header",
+                },
+            )
+        policy = self.config.registry.cornice_cors_policies[spam]["GET"]
+        self.assertEqual(resp.headers["Access-Control-Allow-Methods"], policy.allow_methods)
+        self.assertEqual(
+            set(resp.headers["Access-Control-Allow-Headers"].split(",")),
+            {"X-My-Header", "x-my-header"},
+        )
+        self.assertEqual(policy.supported_lower_headers, frozenset(["x-my-header"]))
+
+    def test_origins_are_matched_as_patterns(self):
+        service = Service(
+            name="patterns", path="/patterns", cors_origins=("*.example.com", "[ab].org", "b.net")
+        )
+        policy = CORSPolicy(service, "GET")
+        for origin in ("api.example.com", "a.org", "b.net"):
+            self.assertTrue(policy.allows(origin), origin)
+        for origin in ("example.com", "[ab].org", "c.org", "b.netx", "B.NET"):
+            self.assertFalse(policy.allows(origin), origin)
+        self.assertFalse(CORSPolicy(Service(name="none", path="/none"), "GET").allows("b.net"))
+
+    def test_undefined_methods_use_the_service_policy(self):
+        resp = self.app.options(
+            "/spam",
+            headers={"Origin": "notmyidea.org", "Access-Control-Request-Method": "PATCH"},
+            status=400,
+        )
+        self.assertEqual(resp.headers["Access-Control-Allow-Origin"], "*")
+
+    def test_policy_is_computed_for_services_not_registered(self):
+        self.config.add_settings({"cornice.always_cors": "true"})
+        service = Service(name="unregistered", path="/unregistered", cors_origins=("*",))
+        request = testing.DummyRequest(method="GET")
+        request.info, request.errors = {}, Errors()
+        response = ensure_origin(service, request)
+        self.assertEqual(response.headers["Access-Control-Allow-Origin"], "*")
@@ -4,10 +4,10 @@ from pyramid import testing
 from pyramid.i18n import TranslationString
 from webtest import TestApp
 
-from cornice.errors import Errors
-from cornice.service import Service
+from cornice.errors import Errors, TooManyErrors
+from cornice.service import Service, decorate_view
 
-from .support import CatchErrors, TestCase
+from .support import CatchErrors, DummyRequest, TestCase
 
 
 class TestErrorsHelper(TestCase):
@@ -29,6 +29,23 @@ class TestErrorsHelper(TestCase):
         with self.assertRaises(ValueError):
             self.errors.add("something")
 
+    def test_max_errors(self):
+        self.assertIsNone(self.errors.remaining)
+        errors = Errors(max_errors=2)
+        errors.add("body", "a")
+        self.assertEqual(errors.remaining, 1)
+        errors.add("body", "b")
+        self.assertEqual(errors.remaining, 0)
+        self.assertFalse(errors.truncated)
+        with self.assertRaises(TooManyErrors):
+            errors.add("body", "c")
+        self.assertTrue(errors.truncated)
+        self.assertEqual([error["name"] for error in errors], ["a", "b"])
+        # outside of the validators, the errors are dropped
+        errors.raise_when_full = False
+        errors.add("body", "d")
+        self.assertEqual([error["name"] for error in errors], ["a", "b"])
+
 
 service1 = Service(name="service1", path="/error-service1")
 
@@ -46,6 +63,82 @@ def get2(request):
     return request.errors.add("body", "field", TranslationString("Description"))
 
 
+service3 = Service(name="service3", path="/error-service3", max_errors=3)
+service4 = Service(
+    name="service4", path="/error-service4", cors_origins=("https://ok.example",), max_errors=1
+)
+
+
+@service4.get()
+def get4(request):
+    return "ok"
+
+
+def add_errors(request, **kwargs):
+    for index in range(10):
+        request.errors.add("body", "field%s" % index, "Invalid")
+
+
+def never_called(request, **kwargs):
+    raise AssertionError("The error budget is already spent")
+
+
+@service3.post(validators=(add_errors, never_called))
+def post3(request):
+    return {}
+
+
+@service3.put(validators=(add_errors,), max_errors=20)
+def put3(request):
+    return {}
+
+
+class TestErrorsBudget(TestCase):
+    def setUp(self):
+        self.config = testing.setUp()
+        self.config.include("cornice")
+        self.config.scan("tests.test_errors")
+        self.app = TestApp(CatchErrors(self.config.make_wsgi_app()))
+
+    def tearDown(self):
+        testing.tearDown()
+
+    def test_validation_stops_once_max_errors_are_collected(self):
+        response = self.app.post("/error-service3", status=400)
+        self.assertEqual(len(response.json["errors"]), 3)
+        self.assertTrue(response.json["truncated"])
+
+    def test_max_errors_can_be_set_per_view(self):
+        response = self.app.put("/error-service3", status=400)
+        self.assertEqual(len(response.json["errors"]), 10)
+        self.assertNotIn("truncated", response.json)
+
+    def test_errors_added_once_the_validators_ran_are_dropped(self):
+        headers = {"Origin": "https://evil.example"}
+        response = self.app.get("/error-service4", headers=headers, status=400)
+        self.assertEqual(len(response.json["errors"]), 1)
+        self.app.get("/error-service4", headers={"Origin": "https://ok.example"}, status=200)
+
+    def test_remaining_validators_are_skipped_when_the_budget_is_spent(self):
+        def exact(request, **kwargs):
+            request.errors.add("body", "field", "Invalid")
+
+        view = decorate_view(
+            lambda request: {},
+            {
+                "validators": (exact, never_called),
+                "max_errors": 1,
+                "error_handler": lambda request: request.errors,
+            },
+            "POST",
+        )
+        request = DummyRequest()
+        request.info = {}
+        errors = view(request)
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(errors.truncated)
+
+
 class TestErrorsTranslation(TestCase):
     def setUp(self):
         self.config = testing.setUp()
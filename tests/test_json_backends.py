@@ -0,0 +1,160 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+import datetime
+import json
+import math
+import unittest
+from unittest import mock
+
+from pyramid import testing
+from pyramid.interfaces import IRendererFactory
+from webtest import TestApp
+
+from cornice import CorniceRenderer, Service
+from cornice.json_backends import AUTO_BACKENDS, BACKENDS, JSONBackend, get_json_backend
+from cornice.validators import extract_cstruct
+
+from .support import TestCase
+
+
+def _installed():
+    backends = []
+    for name in BACKENDS:
+        try:
+            backends.append(get_json_backend(name))
+        except ImportError:
+            pass
+    return backends
+
+
+DOCUMENTS = [
+    {"a": 1, "b": [1.5, True, None, "é"], "c": {"d": "/"}},
+    [1, -2, 3.25, "x", [], {}],
+    "string",
+    2**70,
+]
+
+
+class Unknown(object):
+    pass
+
+
+class MyBackend(JSONBackend):
+    name = "mine"
+
+
+class TestJSONBackends(TestCase):
+    def test_documents_are_decoded_as_with_the_standard_library(self):
+        for backend in _installed():
+            for document in DOCUMENTS:
+                encoded = json.dumps(document)
+                self.assertEqual(backend.loads(encoded), document, backend.name)
+                self.assertEqual(backend.loads(encoded.encode()), document, backend.name)
+
+    def test_decoding_errors_are_those_of_the_standard_library(self):
+        for backend in _installed():
+            with self.assertRaises(ValueError) as context:
+                backend.loads(b'{"a": ')
+            self.assertIn("Expecting value", str(context.exception))
+            self.assertTrue(math.isnan(backend.loads("NaN")))
+
+    def test_documents_are_encoded(self):
+        for backend in _installed():
+            for document in DOCUMENTS:
+                self.assertEqual(json.loads(backend.dumps(document)), document, backend.name)
+            self.assertEqual(json.loads(backend.dumps({1: "a"})), {"1": "a"}, backend.name)
+            self.assertEqual(
+                backend.dumps({"b": 1, "a": 2}, sort_keys=True).replace(" ", ""),
+                '{"a":2,"b":1}',
+                backend.name,
+            )
+            self.assertEqual(
+                json.loads(backend.dumps([{"a": 1}], indent=2)), [{"a": 1}], backend.name
+            )
+            self.assertEqual(
+                backend.dumps({"a": 1}, separators=(",", ":"), indent=3),
+                json.dumps({"a": 1}, separators=(",", ":"), indent=3),
+                backend.name,
+            )
+
+    def test_unknown_objects_use_the_default_hook(self):
+        def default(obj):
+            if isinstance(obj, datetime.date):
+                return "a date"
+            raise TypeError("Not serializable")
+
+        for backend in _installed():
+            document = {"date": datetime.datetime(2020, 1, 1)}
+            self.assertEqual(
+                json.loads(backend.dumps(document, default=default)),
+                {"date": "a date"},
+                backend.name,
+            )
+            with self.assertRaises(TypeError):
+                backend.dumps({"a": Unknown()}, default=default)
+
+    def test_get_json_backend(self):
+        self.assertEqual(get_json_backend().name, "json")
+        self.assertEqual(get_json_backend("json").name, "json")
+        installed = [backend.name for backend in _installed()]
+        self.assertEqual(
+            get_json_backend("auto").name,
+            [name for name in AUTO_BACKENDS if name in installed][0],
+        )
+        self.assertIsInstance(get_json_backend("tests.test_json_backends.MyBackend"), MyBackend)
+
+        class Missing(JSONBackend):
+            def __init__(self):
+                raise ImportError()
+
+        missing = dict((name, Missing) for name in BACKENDS if name != "json")
+        with mock.patch.dict(BACKENDS, missing):
+            self.assertEqual(get_json_backend("auto").name, "json")
+            with self.assertRaises(ImportError):
+                get_json_backend("orjson")
+
+
+@unittest.skipIf(get_json_backend("auto").name == "json", "No JSON library is installed.")
+class TestJSONBackendSetting(TestCase):
+    def setUp(self):
+        self.config = testing.setUp(settings={"cornice.json_backend": "auto"})
+        self.config.include("cornice")
+        service = Service(name="json-backend", path="/json-backend")
+
+        def extract_body(request, **kwargs):
+            request.validated["body"] = extract_cstruct(request).get("body")
+
+        @service.post(validators=(extract_body,))
+        def post(request):
+            return {"body": request.validated["body"], "at": datetime.date(2020, 1, 2)}
+
+        self.config.add_cornice_service(service)
+        renderer = self.config.registry.queryUtility(IRendererFactory, name="cornicejson")
+        self.assertIsInstance(renderer, CorniceRenderer)
+        renderer.add_adapter(datetime.date, lambda obj, request: obj.isoformat())
+        self.app = TestApp(self.config.make_wsgi_app())
+
+    def tearDown(self):
+        testing.tearDown()
+
+    def test_body_is_decoded_and_rendered_with_the_backend(self):
+        backend = self.config.registry.cornice_json_backend
+        self.assertEqual(backend.name, get_json_backend("auto").name)
+        with mock.patch.object(backend, "loads", wraps=backend.loads) as loads:
+            response = self.app.post_json("/json-backend", {"a": ["é"]})
+        loads.assert_called_once()
+        self.assertEqual(response.json, {"body": {"a": ["é"]}, "at": "2020-01-02"})
+
+        response = self.app.post(
+            "/json-backend",
+            '{"a": "é"}'.encode("latin-1"),
+            headers={"Content-Type": "application/json; charset=latin-1"},
+        )
+        self.assertEqual(response.json["body"], {"a": "é"})
+
+    def test_invalid_json(self):
+        response = self.app.post(
+            "/json-backend", "{", headers={"Content-Type": "application/json"}, status=400
+        )
+        self.assertIn("Invalid JSON: Expecting", response.json["errors"][0]["description"])
@@ -1,11 +1,12 @@
+import json
 from unittest import mock
 
 from pyramid.interfaces import IJSONAdapter
 from pyramid.renderers import JSON
 from zope.interface import providedBy
 
-from cornice import CorniceRenderer
-from cornice.renderer import JSONError, bytes_adapter
+from cornice import CorniceRenderer, RawJSON
+from cornice.renderer import CorniceNDJSONRenderer, JSONError, bytes_adapter
 
 from .support import TestCase
 
@@ -53,3 +54,223 @@ class TestRenderer(TestCase):
         self.assertIsInstance(result, JSONError)
         self.assertEqual(result.status_int, 418)
         self.assertEqual(result.json_body, {"status": "error", "errors": ["error_1", "error_2"]})
+
+    def test_renderer_caches_content_negotiation(self):
+        from pyramid import testing
+        from pyramid.request import Request
+
+        from cornice.util import ACCEPT_CACHE
+
+        renderer = CorniceRenderer()
+        self.assertIs(renderer.accept_cache, ACCEPT_CACHE)
+        ACCEPT_CACHE.clear()
+        registry = testing.setUp().registry
+        self.addCleanup(testing.tearDown)
+        for _ in range(3):
+            request = Request.blank("/", headers={"Accept": "text/plain"})
+            request.registry = registry
+            self.assertEqual(renderer.render({"a": 1}, {"request": request}), '{"a": 1}')
+            self.assertEqual(request.response.content_type, "text/plain")
+        self.assertEqual((ACCEPT_CACHE.hits, ACCEPT_CACHE.misses), (2, 1))
+
+        request = Request.blank("/", headers={"Accept": "text/html"})
+        request.registry = registry
+        renderer.render({"a": 1}, {"request": request})
+        self.assertEqual(request.response.content_type, "application/json")
+
+
+class TestStreamingRenderer(TestCase):
+    def setUp(self):
+        from pyramid import testing
+
+        self.registry = testing.setUp().registry
+        self.addCleanup(testing.tearDown)
+
+    def _render(self, value, renderer=None):
+        from pyramid.request import Request
+
+        renderer = renderer or CorniceRenderer()
+        renderer.stream_batch_size = 3
+        request = Request.blank("/")
+        request.registry = self.registry
+        return renderer.render(value, {"request": request})
+
+    def test_iterators_are_streamed_lazily(self):
+        consumed = []
+
+        def items():
+            for i in range(7):
+                consumed.append(i)
+                yield {"id": i}
+
+        chunks = self._render(items())
+        # only the first batch is serialized before the response is sent
+        self.assertEqual(consumed, [0, 1, 2])
+        chunks = list(chunks)
+        self.assertEqual(len(chunks), 5)
+        self.assertEqual(b"".join(chunks), json.dumps([{"id": i} for i in range(7)]).encode())
+
+    def test_streamed_arrays_are_valid_json(self):
+        self.assertEqual(b"".join(self._render(iter([]))), b"[]")
+        self.assertEqual(b"".join(self._render(iter(range(3)))), b"[0, 1, 2]")
+        renderer = CorniceRenderer(indent=2, ensure_ascii=False)
+        body = b"".join(self._render(iter(["é", b"x", {"a": [1]}, 4]), renderer))
+        self.assertEqual(json.loads(body.decode("utf-8")), ["é", "x", {"a": [1]}, 4])
+
+    def test_errors_of_the_first_batch_are_raised(self):
+        def items():
+            yield 1
+            raise KeyError()
+
+        with self.assertRaises(KeyError):
+            self._render(items())
+
+    def test_streaming_view(self):
+        from pyramid import testing
+        from webtest import TestApp
+
+        from cornice import Service
+
+        service = Service(name="stream", path="/stream")
+
+        @service.get()
+        def get(request):
+            return ({"id": i} for i in range(1000))
+
+        with testing.testConfig() as config:
+            config.include("cornice")
+            config.add_cornice_service(service)
+            app = TestApp(config.make_wsgi_app())
+            response = app.get("/stream", headers={"Accept": "text/plain"})
+        self.assertEqual(response.content_type, "text/plain")
+        self.assertEqual(json.loads(response.body), [{"id": i} for i in range(1000)])
+
+
+class TestNDJSONRenderer(TestCase):
+    def setUp(self):
+        from pyramid import testing
+
+        self.registry = testing.setUp().registry
+        self.addCleanup(testing.tearDown)
+
+    def _render(self, value, status=200):
+        from pyramid.request import Request
+
+        renderer = CorniceNDJSONRenderer()
+        renderer.stream_batch_size = 2
+        request = Request.blank("/")
+        request.registry = self.registry
+        request.response.status_code = status
+        result = renderer.render(value, {"request": request})
+        return request.response, b"".join(result)
+
+    def test_iterables_are_rendered_one_item_per_line(self):
+        response, body = self._render(({"id": i} for i in range(3)))
+        self.assertEqual(response.content_type, "application/x-ndjson")
+        self.assertEqual(body, b'{"id": 0}\n{"id": 1}\n{"id": 2}\n')
+        self.assertEqual(self._render([b"a", 1])[1], b'"a"\n1\n')
+        self.assertEqual(self._render(iter([]))[1], b"")
+
+    def test_other_values_are_rendered_on_one_line(self):
+        self.assertEqual(self._render({"a": [1, 2]})[1], b'{"a": [1, 2]}\n')
+        self.assertEqual(self._render("a")[1], b'"a"\n')
+        self.assertEqual(self._render(None)[1], b"null\n")
+
+    def test_no_content(self):
+        response, body = self._render([1], status=204)
+        self.assertIsNone(response.content_type)
+        self.assertEqual(body, b"")
+
+    def test_ndjson_view(self):
+        from pyramid import testing
+        from webtest import TestApp
+
+        from cornice import Service
+
+        service = Service(name="export", path="/export", renderer="cornicendjson")
+
+        @service.get()
+        def get(request):
+            return ({"id": i} for i in range(5))
+
+        with testing.testConfig() as config:
+            config.include("cornice")
+            config.add_cornice_service(service)
+            app = TestApp(config.make_wsgi_app())
+            response = app.get("/export")
+        self.assertEqual(response.content_type, "application/x-ndjson")
+        lines = response.body.decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [{"id": i} for i in range(5)])
+
+
+class TestRawJSON(TestCase):
+    def setUp(self):
+        from pyramid import testing
+
+        self.registry = testing.setUp().registry
+        self.addCleanup(testing.tearDown)
+
+    def _render(self, value, renderer=None):
+        from pyramid.request import Request
+
+        renderer = renderer or CorniceRenderer()
+        request = Request.blank("/")
+        request.registry = self.registry
+        return renderer.render(value, {"request": request})
+
+    def test_fragments_are_spliced_verbatim(self):
+        fragment = RawJSON('{"b":[1,2],  "c":"é"}')
+        self.assertEqual(self._render(fragment), '{"b":[1,2],  "c":"é"}')
+        self.assertEqual(
+            self._render({"a": fragment, "d": [RawJSON(b"[]"), RawJSON(bytearray(b"3"))]}),
+            '{"a": {"b":[1,2],  "c":"é"}, "d": [[], 3]}',
+        )
+
+    def test_fragments_are_neither_decoded_nor_encoded(self):
+        renderer = CorniceRenderer()
+        with mock.patch("cornice.renderer.json.loads") as loads:
+            self.assertEqual(self._render([RawJSON("1.50")], renderer), "[1.50]")
+        loads.assert_not_called()
+
+    def test_other_objects_are_still_adapted(self):
+        renderer = CorniceRenderer(indent=2)
+        renderer.add_adapter(set, lambda obj, request: sorted(obj))
+        body = self._render({"a": {2, 1}, "b": RawJSON('{"c": 1}')}, renderer)
+        self.assertEqual(json.loads(body), {"a": [1, 2], "b": {"c": 1}})
+        # strings looking like the placeholders are left as they are
+        self.assertEqual(self._render(["cornice-raw-0-0"]), '["cornice-raw-0-0"]')
+
+    def test_fragments_are_streamed(self):
+        items = iter([RawJSON('{"id": 0}'), {"id": RawJSON("1")}])
+        body = b"".join(self._render(items))
+        self.assertEqual(body, b'[{"id": 0}, {"id": 1}]')
+        items = iter([RawJSON('{"id": 0}'), {"id": RawJSON("1")}])
+        body = b"".join(self._render(items, CorniceNDJSONRenderer()))
+        self.assertEqual(body, b'{"id": 0}\n{"id": 1}\n')
+
+    def test_newlines_are_removed_from_ndjson_fragments(self):
+        renderer = CorniceNDJSONRenderer()
+        pretty = RawJSON(b'{\r\n  "a": 1,\n  "b": "c\\nd"\n}')
+        body = b"".join(self._render([pretty, {"nested": pretty}], renderer))
+        self.assertEqual(
+            body, b'{  "a": 1,  "b": "c\\nd"}\n{"nested": {  "a": 1,  "b": "c\\nd"}}\n'
+        )
+        self.assertEqual(
+            [json.loads(line) for line in body.splitlines()],
+            [{"a": 1, "b": "c\nd"}, {"nested": {"a": 1, "b": "c\nd"}}],
+        )
+        # other renderers keep them verbatim
+        self.assertEqual(self._render(pretty), '{\r\n  "a": 1,\n  "b": "c\\nd"\n}')
+
+    def test_fragments_must_be_utf8(self):
+        with self.assertRaises(UnicodeDecodeError):
+            RawJSON(b"\xff")
+
+    def test_fragments_are_decoded_by_other_renderers(self):
+        from pyramid.request import Request
+
+        request = Request.blank("/")
+        request.registry = self.registry
+        render = JSON()(None)
+        body = render({"a": RawJSON('{"b": 1}')}, {"request": request})
+        self.assertEqual(json.loads(body), {"a": {"b": 1}})
@@ -606,3 +606,329 @@ class TestService(TestCase):
         meth = "POST"
         decorated = decorate_view(_UnboundView(MyResource, "myview"), {}, meth)
         self.assertEqual(decorated.__name__, "{0}__{1}".format(func_name(MyResource.myview), meth))
+
+    def test_decorate_view_sets_current_request(self):
+        from cornice.validators import current_request
+
+        seen = []
+
+        def validator(request, **kwargs):
+            seen.append(current_request())
+
+        def view(request):
+            seen.append(current_request())
+            return "ok"
+
+        decorated = decorate_view(view, {"validators": (validator,)}, "GET")
+        dummy_request = DummyRequest()
+        self.assertEqual(decorated(dummy_request), "ok")
+        self.assertEqual(seen, [dummy_request, dummy_request])
+        self.assertIsNone(current_request())
+
+    def test_decorate_view_awaits_async_validators_concurrently(self):
+        import asyncio
+
+        from cornice.validators import current_request
+
+        calls = []
+
+        def sync_validator(request, **kwargs):
+            calls.append("sync")
+
+        async def async_validator(request, **kwargs):
+            calls.append(("start", current_request()))
+            await asyncio.sleep(0)
+            calls.append("end")
+            request.validated["async"] = True
+
+        class Resource(object):
+            def __init__(self, request):
+                self.request = request
+
+            async def validate(self, request, **kwargs):
+                calls.append("method")
+
+            def get(self):
+                return self.request.validated
+
+        args = {"validators": (async_validator, sync_validator, async_validator)}
+        decorated = decorate_view(view=lambda request: request.validated, args=args, method="GET")
+        dummy_request = DummyRequest()
+        dummy_request.validated = {}
+        self.assertEqual(decorated(dummy_request), {"async": True})
+        self.assertEqual(
+            calls,
+            [
+                "sync",
+                ("start", dummy_request),
+                ("start", dummy_request),
+                "end",
+                "end",
+            ],
+        )
+
+        calls[:] = []
+        args = dict(args, klass=Resource, validators=args["validators"] + ("validate",))
+        decorated = decorate_view(view="get", args=args, method="GET")
+        self.assertEqual(decorated(dummy_request), {"async": True})
+        self.assertEqual(calls[0], "sync")
+        self.assertIn("method", calls)
+
+    def test_decorate_view_async_validators_errors(self):
+        from cornice.errors import Errors
+
+        async def add_error(request, **kwargs):
+            request.errors.add("body", "field", "Invalid")
+
+        class Awaitable(object):
+            def __await__(self):
+                yield from ()
+
+        def pending(request, **kwargs):
+            return Awaitable()
+
+        def full(request, **kwargs):
+            request.errors.add("body", "other", "Invalid")
+
+        args = {
+            "validators": (add_error, pending, full, add_error),
+            "max_errors": 1,
+            "error_handler": lambda request: request.errors,
+        }
+        decorated = decorate_view(view=lambda request: "ok", args=args, method="GET")
+        dummy_request = DummyRequest()
+        dummy_request.errors = Errors()
+        dummy_request.info = {}
+        errors = decorated(dummy_request)
+        # the budget was spent by the sync validator: the async ones are dropped
+        self.assertEqual([error["name"] for error in errors], ["other"])
+        self.assertTrue(errors.truncated)
+
+        args = dict(args, validators=(pending, add_error, add_error), max_errors=None)
+        dummy_request.errors = Errors()
+        errors = decorate_view(view=lambda request: "ok", args=args, method="GET")(dummy_request)
+        self.assertEqual(len(errors), 2)
+
+    def test_schedule_validators(self):
+        from cornice.service import _schedule_validators
+        from cornice.validators import dependencies
+
+        def make(name, **kwargs):
+            def validator(request, **kw):
+                pass
+
+            validator.__name__ = name
+            return dependencies(**kwargs)(validator) if kwargs else validator
+
+        body = make("body", requires=("body",), provides=("body",))
+        user = make("user", requires=("body",), provides=("user",))
+        token = make("token", requires=("header",), provides=("token",))
+        perms = make("perms", requires=("user", "token"))
+        plain = make("plain")
+        reads_user = make("reads_user", requires=("user",))
+        overwrites_user = make("overwrites_user", provides=("user",))
+
+        def names(batches):
+            return [[validator.__name__ for validator in batch] for batch in batches]
+
+        self.assertEqual(
+            names(_schedule_validators([body, token, user, perms, plain, token])),
+            [["body", "token"], ["user"], ["perms"], ["plain"], ["token"]],
+        )
+        self.assertEqual(
+            names(_schedule_validators([user, reads_user, overwrites_user, reads_user])),
+            [["user"], ["reads_user"], ["overwrites_user"], ["reads_user"]],
+        )
+
+        class Resource(object):
+            @dependencies(provides=("a",))
+            def check_a(self, request, **kwargs):
+                pass
+
+            @dependencies(provides=("b",))
+            def check_b(self, request, **kwargs):
+                pass
+
+        self.assertEqual(
+            _schedule_validators(["check_a", "check_b"], Resource), [["check_a", "check_b"]]
+        )
+        self.assertEqual(_schedule_validators(["check_a", "check_b"]), [["check_a"], ["check_b"]])
+
+    def test_decorate_view_runs_independent_validators_in_parallel(self):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+
+        from cornice.validators import current_request, dependencies
+
+        # each validator waits for the other one: they have to run at once
+        barrier = threading.Barrier(2, timeout=5)
+        seen = []
+
+        @dependencies(provides=("user",))
+        def user(request, **kwargs):
+            barrier.wait()
+            seen.append(current_request())
+            request.validated["user"] = "bob"
+
+        @dependencies(provides=("token",))
+        def token(request, **kwargs):
+            barrier.wait()
+            request.validated["token"] = "t"
+
+        @dependencies(requires=("user", "token"))
+        def perms(request, **kwargs):
+            request.validated["perms"] = (request.validated["user"], request.validated["token"])
+
+        dummy_request = DummyRequest()
+        dummy_request.validated = {}
+        args = {"validators": (user, token, perms)}
+        decorated = decorate_view(view=lambda request: request.validated, args=args, method="GET")
+        self.assertEqual(decorated(dummy_request)["perms"], ("bob", "t"))
+        self.assertEqual(seen, [dummy_request])
+
+        with ThreadPoolExecutor(2) as executor:
+            args = {"validators": (user, token), "validators_executor": executor}
+            decorated = decorate_view(view=lambda request: "ok", args=args, method="GET")
+            with mock.patch("cornice.service.get_thread_pool") as get_thread_pool:
+                self.assertEqual(decorated(dummy_request), "ok")
+            get_thread_pool.assert_not_called()
+
+    def test_parallel_validators_read_the_body_at_once(self):
+        import io
+        import json
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+
+        from pyramid.request import Request
+
+        from cornice.errors import Errors
+        from cornice.validators import dependencies
+
+        data = {"items": ["x" * 100] * 1000}
+        barrier = threading.Barrier(8, timeout=5)
+
+        def make_request():
+            body = json.dumps(data).encode()
+            request = Request.blank("/", method="POST", content_type="application/json")
+            # a WSGI input which is not seekable, as a server's
+            request.environ.pop("webob.is_body_seekable", None)
+            request.environ["wsgi.input"] = io.BufferedReader(io.BytesIO(body))
+            request.environ["CONTENT_LENGTH"] = str(len(body))
+            request.validated = {}
+            request.errors = Errors()
+            request.info = {}
+            return request
+
+        def make(name):
+            @dependencies(requires=("body",), provides=(name,))
+            def validator(request, **kwargs):
+                barrier.wait()
+                request.validated[name] = request.json_body == data
+
+            return validator
+
+        @dependencies(provides=("replaced",))
+        def replace_body(request, **kwargs):
+            request.body = b"{}"
+
+        @dependencies(provides=("other",))
+        def other(request, **kwargs):
+            pass
+
+        with ThreadPoolExecutor(8) as executor:
+            args = {
+                "validators": [make("v%d" % i) for i in range(8)],
+                "validators_executor": executor,
+            }
+            request = make_request()
+            decorated = decorate_view(lambda request: request.validated, args, "POST")
+            self.assertEqual(decorated(request), {"v%d" % i: True for i in range(8)})
+            self.assertEqual(request.json_body, data)
+
+            args = dict(args, validators=[replace_body, other])
+            request = make_request()
+            decorate_view(lambda request: None, args, "POST")(request)
+            self.assertEqual(request.json_body, {})
+
+    def test_parallel_validators_share_the_decoded_body(self):
+        import json
+
+        from pyramid.request import Request
+
+        from cornice.errors import Errors
+        from cornice.validators import _get_cstruct, dependencies
+
+        decoded = []
+
+        def deserializer(request):
+            decoded.append(True)
+            return {"body": request.json_body}
+
+        def make(name, **kwargs):
+            @dependencies(**kwargs)
+            def validator(request, **kw):
+                request.validated[name] = _get_cstruct(request, deserializer)["body"]
+
+            return validator
+
+        validators = [
+            make("first", provides=("first",)),
+            make("a", requires=("first",), provides=("a",)),
+            make("b", requires=("first",), provides=("b",)),
+            make("last", requires=("a", "b")),
+        ]
+        request = Request.blank("/", method="POST", body=json.dumps({"id": 1}).encode())
+        request.validated = {}
+        request.errors = Errors()
+        request.info = {}
+        view = decorate_view(lambda request: request.validated, {"validators": validators}, "POST")
+        self.assertEqual(view(request), dict.fromkeys(("first", "a", "b", "last"), {"id": 1}))
+        self.assertEqual(len(decoded), 1)
+
+    def test_decorate_view_parallel_validators_errors(self):
+        import asyncio
+
+        from cornice.errors import Errors
+        from cornice.validators import dependencies
+
+        done = []
+
+        @dependencies(provides=("a",))
+        def fails(request, **kwargs):
+            raise KeyError("a")
+
+        @dependencies(provides=("b",))
+        def succeeds(request, **kwargs):
+            done.append(True)
+
+        args = {"validators": (fails, succeeds)}
+        decorated = decorate_view(view=lambda request: "ok", args=args, method="GET")
+        with self.assertRaises(KeyError):
+            decorated(DummyRequest())
+        self.assertEqual(done, [True])
+
+        @dependencies(provides=("c",))
+        def adds_errors(request, **kwargs):
+            for name in "abc":
+                request.errors.add("body", name, "Invalid")
+
+        @dependencies(provides=("d",))
+        async def async_adds_error(request, **kwargs):
+            await asyncio.sleep(0)
+            request.errors.add("body", "d", "Invalid")
+
+        args = {
+            "validators": (async_adds_error, adds_errors),
+            "error_handler": lambda request: request.errors,
+        }
+        dummy_request = DummyRequest()
+        dummy_request.errors = Errors()
+        dummy_request.info = {}
+        errors = decorate_view(view=lambda request: "ok", args=args, method="GET")(dummy_request)
+        self.assertEqual(sorted(error["name"] for error in errors), ["a", "b", "c", "d"])
+
+        dummy_request.errors = Errors()
+        errors = decorate_view(
+            view=lambda request: "ok", args=dict(args, max_errors=2), method="GET"
+        )(dummy_request)
+        self.assertEqual(len(errors), 2)
@@ -31,3 +31,190 @@ class CurrentServiceTest(unittest.TestCase):
         request.registry.cornice_services = {}
 
         self.assertEqual(util.current_service(request), None)
+
+
+class CurrentRequestTest(unittest.TestCase):
+    def test_current_request_is_none_outside_of_a_scope(self):
+        self.assertIsNone(util.current_request())
+
+    def test_request_scope_sets_the_current_request(self):
+        with util.request_scope(mock.sentinel.request):
+            self.assertEqual(util.current_request(), mock.sentinel.request)
+            with util.request_scope(mock.sentinel.other):
+                self.assertEqual(util.current_request(), mock.sentinel.other)
+            self.assertEqual(util.current_request(), mock.sentinel.request)
+        self.assertIsNone(util.current_request())
+
+    def test_current_request_is_scoped_to_threads(self):
+        import threading
+
+        seen = []
+        with util.request_scope(mock.sentinel.request):
+            thread = threading.Thread(target=lambda: seen.append(util.current_request()))
+            thread.start()
+            thread.join()
+        self.assertEqual(seen, [None])
+
+
+class LRUCacheTest(unittest.TestCase):
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = util.LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertEqual(len(cache), 2)
+
+    def test_hits_and_misses_are_counted(self):
+        cache = util.LRUCache()
+        cache.set("a", 1)
+        cache.get("a")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        cache.clear()
+        self.assertEqual((len(cache), cache.hits, cache.misses), (0, 0, 0))
+
+
+class SchemaCacheTest(unittest.TestCase):
+    class Schema(object):
+        pass
+
+    def test_values_are_kept_with_the_schemas(self):
+        import gc
+        import weakref
+
+        cache = util.SchemaCache("test")
+        schema = self.Schema()
+        cache.set(schema, [schema], "a")
+        self.assertEqual(cache.get(schema, "a"), [schema])
+        self.assertIsNone(cache.get(schema, "b"))
+        self.assertEqual((len(cache), cache.hits, cache.misses), (1, 1, 1))
+
+        ref = weakref.ref(schema)
+        del schema
+        gc.collect()
+        self.assertIsNone(ref())
+        self.assertEqual(len(cache), 0)
+
+    def test_copies_of_the_schemas_do_not_share_the_values(self):
+        import copy
+        import pickle
+
+        cache = util.SchemaCache("test")
+        schema = self.Schema()
+        cache.set(schema, 1)
+        clone = self.Schema()
+        clone.__dict__.update(schema.__dict__)
+        for other in (
+            clone,
+            copy.copy(schema),
+            copy.deepcopy(schema),
+            pickle.loads(pickle.dumps(schema)),
+        ):
+            self.assertIsNone(cache.get(other))
+        cache.set(clone, 2)
+        self.assertEqual((cache.get(schema), cache.get(clone)), (1, 2))
+
+        cache.clear()
+        self.assertIsNone(cache.get(schema))
+        self.assertEqual((len(cache), cache.hits), (0, 0))
+
+    def test_other_schemas_are_kept_in_a_lru_cache(self):
+        cache = util.SchemaCache("test", maxsize=2)
+        schemas = [{"a": int}, {"b": int}, {"c": int}]
+        for value, schema in enumerate(schemas):
+            cache.set(schema, value)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get(schemas[0]))
+        self.assertEqual(cache.get(schemas[2]), 2)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+
+class RunConcurrentlyTest(unittest.TestCase):
+    def test_awaitables_run_concurrently(self):
+        import asyncio
+
+        started = []
+
+        async def wait(value):
+            started.append(value)
+            await asyncio.sleep(0)
+            # every awaitable started before any of them finished
+            self.assertEqual(started, [1, 2])
+            return value
+
+        self.assertEqual(util.run_concurrently([wait(1), wait(2)]), [1, 2])
+
+    def test_first_exception_is_raised_once_all_are_done(self):
+        done = []
+
+        async def fail(exception):
+            raise exception
+
+        async def succeed():
+            done.append(True)
+
+        with self.assertRaises(KeyError):
+            util.run_concurrently([succeed(), fail(KeyError()), fail(ValueError())])
+        self.assertEqual(done, [True])
+
+    def test_event_loop_is_kept_per_thread(self):
+        import threading
+
+        loop = util.get_event_loop()
+        self.assertIs(util.get_event_loop(), loop)
+        loops = []
+        thread = threading.Thread(target=lambda: loops.append(util.get_event_loop()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(loops[0], loop)
+        loops[0].close()
+
+        loop.close()
+        self.assertIsNot(util.get_event_loop(), loop)
+
+
+class ThreadPoolTest(unittest.TestCase):
+    def test_thread_pool_is_shared(self):
+        pool = util.get_thread_pool()
+        self.assertIs(util.get_thread_pool(), pool)
+        self.assertEqual(pool._max_workers, util.VALIDATORS_THREADS)
+
+
+class AcceptableOffersTest(unittest.TestCase):
+    def setUp(self):
+        util.ACCEPT_CACHE.clear()
+
+    def _request(self, accept=None):
+        from pyramid.request import Request
+
+        headers = {} if accept is None else {"Accept": accept}
+        return Request.blank("/", headers=headers)
+
+    def test_results_are_cached_per_header_and_offers(self):
+        offers = ["application/json", "text/plain"]
+        request = self._request("text/plain;q=0.5, application/json")
+        expected = (("application/json", 1.0), ("text/plain", 0.5))
+        self.assertEqual(util.acceptable_offers(request, offers), expected)
+        self.assertEqual(
+            util.acceptable_offers(self._request(request.accept.header_value), offers), expected
+        )
+        self.assertEqual((util.ACCEPT_CACHE.hits, util.ACCEPT_CACHE.misses), (1, 1))
+
+        self.assertEqual(util.acceptable_offers(request, ["text/html"]), ())
+        self.assertEqual(
+            util.acceptable_offers(self._request(), offers),
+            (("application/json", 1.0), ("text/plain", 1.0)),
+        )
+        self.assertEqual(len(util.ACCEPT_CACHE), 3)
+
+    def test_match_accept_header_uses_the_cache(self):
+        request = self._request("text/html")
+        request.info = {}
+        self.assertTrue(util.match_accept_header(lambda r: "text/html", None, request))
+        self.assertFalse(util.match_accept_header(lambda r: ["text/xml"], None, request))
+        self.assertTrue(util.match_accept_header(lambda r: "text/html", None, request))
+        self.assertEqual((util.ACCEPT_CACHE.hits, util.ACCEPT_CACHE.misses), (1, 2))
@@ -8,6 +8,7 @@ import warnings
 from unittest import mock
 
 from pyramid.request import Request
+from pyramid.threadlocal import get_current_registry
 from webtest import TestApp
 
 
@@ -585,6 +586,224 @@ class TestValidatorEdgeCases(TestCase):
         self.assertEqual(len(request.errors), 0)
 
 
+@skip_if_no_colander
+class TestColanderRequestSchemaCache(TestCase):
+    def setUp(self):
+        from cornice.validators import _colander
+
+        self.cache = _colander._REQUEST_SCHEMAS
+        self.cache.clear()
+
+    def test_request_schema_is_reused_across_requests(self):
+        from cornice.validators._colander import _get_request_schema
+
+        class BodySchema(colander.MappingSchema):
+            foo = colander.SchemaNode(colander.String())
+
+        schema = BodySchema()
+        first = _get_request_schema(schema, "body")
+        second = _get_request_schema(schema, "body")
+        self.assertIs(first, second)
+        self.assertIs(first["body"], schema)
+        self.assertIsNot(_get_request_schema(schema, "querystring"), first)
+
+    def test_request_schema_cache_is_used_by_location_validators(self):
+        class BodySchema(colander.MappingSchema):
+            foo = colander.SchemaNode(colander.String())
+
+        schema = BodySchema()
+        for _ in range(3):
+            request = Request.blank("/", method="POST", body=b'{"foo": "bar"}')
+            request.validated = {}
+            request.errors = Errors()
+            colander_body_validator(request, schema=schema)
+            self.assertEqual(request.validated, {"foo": "bar"})
+        self.assertEqual(len(self.cache), 1)
+        self.assertEqual(self.cache.hits, 2)
+
+    def test_dynamic_schemas_are_freed_with_their_request(self):
+        import gc
+        import weakref
+
+        class BodySchema(colander.MappingSchema):
+            foo = colander.SchemaNode(colander.String())
+
+        static = BodySchema()
+        requests = []
+        for _ in range(self.cache.maxsize + 10):
+            request = Request.blank("/", method="POST", body=b'{"foo": "bar"}')
+            request.validated = {}
+            request.errors = Errors()
+            colander_body_validator(request, schema=static)
+            colander_body_validator(request, schema=BodySchema().bind(request=request))
+            requests.append(weakref.ref(request))
+        del request
+        gc.collect()
+        self.assertEqual([ref for ref in requests if ref() is not None], [])
+        # the schema of the service is still cached
+        self.assertEqual(len(self.cache), 1)
+        self.assertEqual(self.cache.hits, self.cache.maxsize + 9)
+
+
+@skip_if_no_colander
+class TestCstructMemoization(TestCase):
+    def make_request(self, body=b'{"foo": "bar"}'):
+        request = Request.blank("/?yeah=1", method="POST", body=body)
+        request.registry = get_current_registry()
+        request.validated = {}
+        request.errors = Errors()
+        return request
+
+    def test_deserializer_is_called_once_per_request(self):
+        from cornice.validators import colander_querystring_validator
+
+        class Body(colander.MappingSchema):
+            foo = colander.SchemaNode(colander.String())
+
+        class Querystring(colander.MappingSchema):
+            yeah = colander.SchemaNode(colander.Integer())
+
+        class Full(colander.MappingSchema):
+            body = Body()
+
+        request = self.make_request()
+        deserializer = mock.Mock(side_effect=extract_cstruct)
+        colander_body_validator(request, schema=Body(), deserializer=deserializer)
+        colander_querystring_validator(request, schema=Querystring(), deserializer=deserializer)
+        colander_validator(request, schema=Full(), deserializer=deserializer)
+        self.assertEqual(deserializer.call_count, 1)
+        self.assertEqual(request.validated["foo"], "bar")
+        self.assertEqual(request.validated["yeah"], 1)
+        self.assertEqual(request.validated["body"], {"foo": "bar"})
+
+    def test_cstruct_is_computed_again_if_body_is_replaced(self):
+        from cornice.validators import _get_cstruct
+
+        request = self.make_request()
+        self.assertEqual(_get_cstruct(request)["body"], {"foo": "bar"})
+        request.body = b'{"foo": "baz"}'
+        self.assertEqual(_get_cstruct(request)["body"], {"foo": "baz"})
+
+    def test_validators_get_a_copy_of_the_cstruct(self):
+        from cornice.validators import _get_cstruct
+
+        request = self.make_request()
+        _get_cstruct(request)["body"] = "changed"
+        self.assertEqual(_get_cstruct(request)["body"], {"foo": "bar"})
+
+    def test_invalid_body_is_reported_once(self):
+        class Body(colander.MappingSchema):
+            foo = colander.SchemaNode(colander.String())
+
+        request = self.make_request(body=b'{"foo": ')
+        colander_body_validator(request, schema=Body())
+        colander_body_validator(request, schema=Body())
+        descriptions = [e["description"] for e in request.errors]
+        self.assertEqual(len([d for d in descriptions if "Invalid JSON" in d]), 1)
+
+
+class TestLazyCstruct(unittest.TestCase):
+    def make_request(self, body=b'{"foo": "bar"}'):
+        request = Request.blank("/?yeah=1", method="POST", body=body, headers={"X-Foo": "1"})
+        request.matchdict = {}
+        request.errors = Errors()
+        return request
+
+    def test_locations_are_extracted_when_accessed(self):
+        cstruct = extract_cstruct(self.make_request())
+        self.assertEqual(cstruct["body"], {"foo": "bar"})
+        self.assertEqual(list(cstruct._extracted), ["body"])
+        self.assertEqual(cstruct["querystring"], {"yeah": "1"})
+        self.assertEqual(list(cstruct._extracted), ["body", "querystring"])
+
+    def test_behaves_like_a_dict(self):
+        request = self.make_request()
+        cstruct = extract_cstruct(request)
+        self.assertEqual(
+            list(cstruct),
+            ["method", "url", "path", "body", "querystring", "header", "cookies"],
+        )
+        self.assertEqual(len(cstruct), 7)
+        self.assertEqual(cstruct["method"], "POST")
+        self.assertEqual(cstruct["header"]["X-Foo"], "1")
+        self.assertEqual(dict(cstruct)["url"], request.url)
+        self.assertNotIn("unknown", cstruct)
+        with self.assertRaises(KeyError):
+            cstruct["unknown"]
+        self.assertIn("'method': 'POST'", repr(cstruct))
+
+    def test_values_can_be_set_and_deleted(self):
+        cstruct = extract_cstruct(self.make_request())
+        cstruct["extra"] = 42
+        cstruct["body"] = "changed"
+        del cstruct["cookies"]
+        self.assertEqual(cstruct["extra"], 42)
+        self.assertEqual(cstruct["body"], "changed")
+        self.assertNotIn("cookies", cstruct)
+        self.assertEqual(list(cstruct)[-1], "extra")
+        with self.assertRaises(KeyError):
+            cstruct["cookies"]
+        with self.assertRaises(KeyError):
+            del cstruct["cookies"]
+
+    def test_copies_share_extracted_locations_only(self):
+        cstruct = extract_cstruct(self.make_request())
+        cstruct["extra"] = 42
+        other = cstruct.copy()
+        self.assertIs(other["body"], cstruct["body"])
+        other["body"] = "changed"
+        del other["extra"]
+        self.assertEqual(cstruct["body"], {"foo": "bar"})
+        self.assertEqual(cstruct["extra"], 42)
+
+    def test_invalid_body_is_missing(self):
+        request = self.make_request(body=b'{"foo": ')
+        cstruct = extract_cstruct(request)
+        self.assertNotIn("body", cstruct)
+        self.assertEqual(cstruct["querystring"], {"yeah": "1"})
+        with self.assertRaises(KeyError):
+            cstruct["body"]
+        self.assertEqual(len(request.errors), 1)
+
+    def test_ndjson_body_is_decoded_lazily(self):
+        from cornice.validators import NDJSONBody
+
+        request = Request.blank(
+            "/",
+            method="POST",
+            body=b'{"a": 1}\n\n[2]\n{"a": \n"x"\n',
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+        request.errors = Errors()
+        body = extract_cstruct(request)["body"]
+        self.assertIsInstance(body, NDJSONBody)
+        self.assertEqual(len(request.errors), 0)
+        self.assertEqual(list(body.numbered()), [(1, {"a": 1}), (3, [2]), (5, "x")])
+        # every iteration reads the body again, but errors are reported once
+        self.assertEqual(list(body), [{"a": 1}, [2], "x"])
+        self.assertEqual(
+            [(error["location"], error["name"]) for error in request.errors], [("body", "4")]
+        )
+        self.assertIn("Invalid JSON: Expecting value", request.errors[0]["description"])
+
+        request.registry = mock.Mock(cornice_json_backend=mock.Mock(loads=json.loads))
+        self.assertEqual(list(extract_cstruct(request)["body"]), [{"a": 1}, [2], "x"])
+        request.registry.cornice_json_backend = mock.Mock(loads=lambda line: "decoded")
+        self.assertEqual(list(extract_cstruct(request)["body"])[0], "decoded")
+
+    @skip_if_no_colander
+    def test_colander_body_validator_only_extracts_the_body(self):
+        class Body(colander.MappingSchema):
+            foo = colander.SchemaNode(colander.String())
+
+        request = self.make_request()
+        request.validated = {}
+        colander_body_validator(request, schema=Body())
+        self.assertEqual(request.validated, {"foo": "bar"})
+        (cstruct,) = [c for _, c in request._cornice_cstructs.values()]
+        self.assertEqual(list(cstruct._extracted), ["body"])
+
+
 class TestExtractedJSONValueTypes(unittest.TestCase):
     """Make sure that all JSON string values extracted from the request
     are unicode when running using PY2.
@@ -805,6 +1024,166 @@ class TestValidatorEdgeCasesMarshmallow(TestCase):
             app.post("/m_item/42", status=200)
 
 
+@skip_if_no_marshmallow
+class TestMarshmallowSchemaCache(TestCase):
+    def setUp(self):
+        from cornice.validators import _marshmallow
+
+        self.cache = _marshmallow._SCHEMAS
+        self.cache.clear()
+
+        class RequestAwareSchema(marshmallow.Schema):
+            field = marshmallow.fields.String()
+
+            @marshmallow.validates_schema
+            def validate_request(self, data, **kwargs):
+                request = self.context["request"]
+                if data.get("field") != request.headers.get("X-Field"):
+                    raise marshmallow.ValidationError("Mismatch")
+
+        self.schema = RequestAwareSchema
+
+    def make_request(self, value):
+        request = Request.blank("/", method="POST", body=json.dumps({"field": value}).encode())
+        request.headers["X-Field"] = value
+        request.validated = {}
+        request.errors = Errors()
+        return request
+
+    def test_schema_instances_are_reused_across_requests(self):
+        from cornice.validators._marshmallow import _get_schema
+
+        first = _get_schema(self.schema, {"many": False}, "body")
+        self.assertIs(_get_schema(self.schema, {"many": False}, "body"), first)
+        self.assertIsNot(_get_schema(self.schema, {"many": True}, "body"), first)
+        self.assertIsNot(_get_schema(self.schema, {"many": False}, "querystring"), first)
+        self.assertIsNot(_get_schema(self.schema), first)
+
+    def test_schema_kwargs_are_frozen_into_the_cache_key(self):
+        from cornice.validators._marshmallow import _freeze
+
+        self.assertEqual(
+            _freeze({"only": ["a", "b"], "exclude": {"c"}}),
+            (dict, (("exclude", frozenset({"c"})), ("only", (list, ("a", "b"))))),
+        )
+        with self.assertRaises(TypeError):
+            _freeze({"only": bytearray()})
+
+    def test_unhashable_schema_kwargs_are_not_cached(self):
+        from cornice.validators._marshmallow import _get_schema
+
+        kwargs = {"context": {"unhashable": bytearray()}}
+        first = _get_schema(self.schema, kwargs, "body")
+        self.assertIsNot(_get_schema(self.schema, kwargs, "body"), first)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_request_does_not_leak_between_requests(self):
+        for value in ("a", "b", "c"):
+            request = self.make_request(value)
+            marshmallow_body_validator(request, schema=self.schema)
+            self.assertEqual(len(request.errors), 0)
+            self.assertEqual(request.validated, {"field": value})
+        self.assertEqual(len(self.cache), 1)
+
+    def test_request_does_not_leak_between_threads(self):
+        import threading
+
+        barrier = threading.Barrier(8)
+        failures = []
+
+        def validate(value):
+            request = self.make_request(value)
+            barrier.wait()
+            for _ in range(20):
+                request.validated = {}
+                marshmallow_body_validator(request, schema=self.schema)
+                if len(request.errors) or request.validated != {"field": value}:
+                    failures.append(value)
+
+        threads = [threading.Thread(target=validate, args=(str(i),)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(failures, [])
+
+    def test_request_does_not_leak_into_nested_schemas(self):
+        seen = []
+
+        class Inner(marshmallow.Schema):
+            field = marshmallow.fields.String()
+
+            @marshmallow.validates_schema
+            def validate_request(self, data, **kwargs):
+                seen.append(self.context["request"].headers["X-Field"])
+
+        class Outer(marshmallow.Schema):
+            inner = marshmallow.fields.Nested(Inner())
+            inners = marshmallow.fields.List(marshmallow.fields.Nested(Inner))
+            mapping = marshmallow.fields.Dict(values=marshmallow.fields.Nested(Inner()))
+            pair = marshmallow.fields.Tuple((marshmallow.fields.Nested(Inner),))
+            outer = marshmallow.fields.Nested("self")
+
+        data = {
+            "inner": {"field": "x"},
+            "inners": [{"field": "x"}],
+            "mapping": {"key": {"field": "x"}},
+            "pair": [{"field": "x"}],
+            "outer": {"inner": {"field": "x"}, "outer": {"inner": {"field": "x"}}},
+        }
+        for value in ("0", "1", "2"):
+            request = Request.blank("/", method="POST", body=json.dumps(data).encode())
+            request.headers["X-Field"] = value
+            request.validated = {}
+            request.errors = Errors()
+            marshmallow_body_validator(request, schema=Outer)
+            self.assertEqual(len(request.errors), 0)
+        self.assertEqual(seen, [value for value in "012" for _ in range(6)])
+
+    def test_request_is_not_kept_in_context_after_validation(self):
+        from cornice.validators._marshmallow import _get_schema
+
+        request = self.make_request("a")
+        marshmallow_validator(request, schema=self.schema)
+        self.assertNotIn("request", _get_schema(self.schema).context)
+
+    def test_current_request_is_available_to_fields(self):
+        from cornice.validators import current_request
+
+        class RequestField(marshmallow.fields.String):
+            def _deserialize(self, value, attr, data, **kwargs):
+                return current_request().headers["X-Field"]
+
+        class FieldSchema(marshmallow.Schema):
+            field = RequestField()
+
+        request = self.make_request("a")
+        request.headers["X-Field"] = "from request"
+        marshmallow_body_validator(request, schema=FieldSchema)
+        self.assertEqual(request.validated, {"field": "from request"})
+        self.assertIsNone(current_request())
+
+    def test_context_given_at_instantiation_is_shared(self):
+        from cornice.util import request_scope
+        from cornice.validators._marshmallow import _request_context, _RequestContext
+
+        context = _RequestContext({"foo": "bar"})
+        token = _request_context.set({})
+        try:
+            with request_scope("req"):
+                self.assertEqual(context["request"], "req")
+                self.assertEqual(dict(context), {"foo": "bar", "request": "req"})
+            context["request"] = "req"
+            context["baz"] = 42
+            self.assertEqual(dict(context), {"foo": "bar", "request": "req", "baz": 42})
+            del context["baz"]
+            self.assertEqual(len(context), 2)
+            self.assertEqual(repr(context), repr({"foo": "bar", "request": "req"}))
+        finally:
+            _request_context.reset(token)
+        self.assertEqual(dict(context), {"foo": "bar"})
+
+
 @skip_if_no_marshmallow
 class TestContextSchemas(LoggingCatcher, TestCase):
     def make_ordinary_app(self):
@@ -0,0 +1,497 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+import dataclasses
+import json
+import typing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from unittest import mock
+
+from pyramid import testing
+from pyramid.request import Request
+from webtest import TestApp
+
+from cornice import Service
+from cornice.errors import Errors
+from cornice.validators import (
+    FastField,
+    fast_body_validator,
+    fast_bulk_body_validator,
+    fast_headers_validator,
+    fast_path_validator,
+    fast_querystring_validator,
+    fast_validator,
+)
+
+from .support import TestCase
+
+
+ITEM = {
+    "name": FastField(str, min_length=1, max_length=10),
+    "count": FastField(int, min=0, max=100),
+    "ratio": FastField(float, default=0.5),
+    "active": FastField(bool, required=False),
+    "kind": FastField(choices=["a", "b"], nullable=True, default=None),
+    "tags": FastField(list, items=FastField(str, min_length=2), default_factory=list),
+    "point": {"x": float, "y": FastField(float, default=0.0)},
+    "extra": dict,
+    "anything": FastField(list, required=False),
+}
+
+
+@dataclasses.dataclass
+class Point:
+    x: float
+    y: float = 0.0
+
+
+@dataclasses.dataclass
+class Shape:
+    name: str
+    points: typing.List[Point]
+    tags: typing.List[str] = dataclasses.field(default_factory=list)
+    color: typing.Optional[str] = None
+    meta: typing.Dict[str, str] = dataclasses.field(default_factory=dict)
+    closed: bool = False
+    anything: list = dataclasses.field(default_factory=list)
+
+
+def _validate(validator, schema, body=b"", path="/", **kwargs):
+    request = Request.blank(path, method="POST", body=body, **kwargs)
+    request.validated = {}
+    request.errors = Errors()
+    request.matchdict = {"id": "12"}
+    validator(request, schema=schema)
+    return request
+
+
+class TestFastValidators(TestCase):
+    def test_valid_body(self):
+        body = (
+            b'{"name": "foo", "count": "12", "active": "yes", "tags": ["ab"],'
+            b' "point": {"x": 1}, "extra": {"a": 1}, "anything": [1, "a"], "unknown": 1}'
+        )
+        request = _validate(fast_body_validator, ITEM, body)
+        self.assertEqual(len(request.errors), 0)
+        self.assertEqual(
+            request.validated,
+            {
+                "name": "foo",
+                "count": 12,
+                "ratio": 0.5,
+                "active": True,
+                "kind": None,
+                "tags": ["ab"],
+                "point": {"x": 1.0, "y": 0.0},
+                "extra": {"a": 1},
+                "anything": [1, "a"],
+            },
+        )
+
+    def test_defaults_are_not_shared(self):
+        body = b'{"name": "foo", "count": 1, "point": {"x": 1}, "extra": {}}'
+        first = _validate(fast_body_validator, ITEM, body).validated
+        first["tags"].append("ab")
+        second = _validate(fast_body_validator, ITEM, body).validated
+        self.assertEqual(second["tags"], [])
+
+    def test_invalid_body(self):
+        body = (
+            b'{"name": "", "count": 101, "ratio": "x", "active": "maybe", "kind": "c",'
+            b' "tags": ["ab", "c", 3], "point": {"y": true}, "extra": [], "anything": 1}'
+        )
+        request = _validate(fast_body_validator, ITEM, body)
+        self.assertEqual(request.validated, {})
+        errors = {error["name"]: error["description"] for error in request.errors}
+        self.assertEqual(
+            errors,
+            {
+                "name": "Length must be at least 1",
+                "count": "Must be at most 100",
+                "ratio": "Must be a number",
+                "active": "Must be a boolean",
+                "kind": "Must be one of: a, b",
+                "tags.1": "Length must be at least 2",
+                "tags.2": "Must be a string",
+                "point.x": "Required",
+                "point.y": "Must be a number",
+                "extra": "Must be an object",
+                "anything": "Must be a list",
+            },
+        )
+        self.assertEqual({error["location"] for error in request.errors}, {"body"})
+
+    def test_more_invalid_values(self):
+        body = b'{"name": 1, "count": true, "ratio": false, "point": [], "tags": {}}'
+        request = _validate(fast_body_validator, ITEM, body)
+        errors = {error["name"]: error["description"] for error in request.errors}
+        self.assertEqual(errors["name"], "Must be a string")
+        self.assertEqual(errors["count"], "Must be an integer")
+        self.assertEqual(errors["ratio"], "Must be a number")
+        self.assertEqual(errors["point"], "Must be an object")
+        self.assertEqual(errors["tags"], "Must be a list")
+        self.assertEqual(errors["extra"], "Required")
+        self.assertEqual(errors["count"], "Must be an integer")
+
+        request = _validate(fast_body_validator, ITEM, b'{"count": "twelve", "active": 0}')
+        errors = {error["name"]: error["description"] for error in request.errors}
+        self.assertEqual(errors["count"], "Must be an integer")
+        self.assertEqual(errors["active"], "Must be a boolean")
+
+    def test_body_must_be_an_object(self):
+        request = _validate(fast_body_validator, ITEM, b"[1, 2]")
+        self.assertEqual(
+            list(request.errors),
+            [{"location": "body", "name": "", "description": "Must be an object"}],
+        )
+
+    def test_custom_validator(self):
+        def even(value):
+            if value % 2:
+                raise ValueError("Must be even")
+
+        schema = {"count": FastField(int, min=0, validator=even)}
+        request = _validate(fast_body_validator, schema, b'{"count": 3}')
+        self.assertEqual(request.errors[0]["description"], "Must be even")
+        request = _validate(fast_body_validator, schema, b'{"count": 4}')
+        self.assertEqual(request.validated, {"count": 4})
+
+    def test_dataclass_spec(self):
+        body = b'{"name": "s", "points": [{"x": 1, "y": "2"}], "color": null, "closed": "true"}'
+        request = _validate(fast_body_validator, Shape, body)
+        self.assertEqual(len(request.errors), 0)
+        self.assertEqual(
+            request.validated,
+            {
+                "name": "s",
+                "points": [{"x": 1.0, "y": 2.0}],
+                "tags": [],
+                "color": None,
+                "meta": {},
+                "closed": True,
+                "anything": [],
+            },
+        )
+
+        request = _validate(fast_body_validator, Shape, b'{"points": [{"y": 1}, 2]}')
+        errors = {error["name"]: error["description"] for error in request.errors}
+        self.assertEqual(
+            errors,
+            {"name": "Required", "points.0.x": "Required", "points.1": "Must be an object"},
+        )
+
+    def test_other_locations(self):
+        schema = {"id": int, "page": FastField(int, default=1)}
+        request = _validate(fast_querystring_validator, schema, path="/?id=3&page=2")
+        self.assertEqual(request.validated, {"id": 3, "page": 2})
+        request = _validate(fast_path_validator, {"id": int})
+        self.assertEqual(request.validated, {"id": 12})
+        request = _validate(fast_headers_validator, {"X-Flag": bool}, headers={"X-Flag": "on"})
+        self.assertEqual(request.validated, {"X-Flag": True})
+        request = _validate(fast_querystring_validator, {"a": bool}, path="/?a=Off")
+        self.assertEqual(request.validated, {"a": False})
+        request = _validate(fast_body_validator, {"a": bool}, b'{"a": false}')
+        self.assertEqual(request.validated, {"a": False})
+        request = _validate(fast_headers_validator, {"X-Flag": bool})
+        self.assertEqual(request.errors[0]["location"], "header")
+        self.assertEqual(request.errors[0]["name"], "X-Flag")
+
+    def test_full_request(self):
+        schema = {"body": {"name": str}, "querystring": {"page": FastField(int, default=1)}}
+        request = _validate(fast_validator, schema, b'{"name": "foo"}')
+        self.assertEqual(request.validated, {"body": {"name": "foo"}, "querystring": {"page": 1}})
+
+        request = _validate(fast_validator, schema, b'{"name": 1}', path="/?page=x")
+        errors = {(error["location"], error["name"]) for error in request.errors}
+        self.assertEqual(errors, {("body", "name"), ("querystring", "page")})
+
+    def test_error_budget(self):
+        from cornice.errors import TooManyErrors
+
+        calls = []
+
+        def invalid(value):
+            calls.append(value)
+            raise ValueError("Invalid")
+
+        schema = {"items": FastField(list, items=FastField(int, validator=invalid))}
+        request = Request.blank(
+            "/", method="POST", body=b'{"items": %s}' % str(list(range(1000))).encode()
+        )
+        request.validated = {}
+        request.errors = Errors(max_errors=5)
+        with self.assertRaises(TooManyErrors):
+            fast_body_validator(request, schema=schema)
+        self.assertEqual(
+            [error["name"] for error in request.errors], ["items.%s" % i for i in range(5)]
+        )
+        self.assertTrue(request.errors.truncated)
+        # One list comprehension stopping at the first error, then six items.
+        self.assertEqual(len(calls), 7)
+
+    def test_no_schema(self):
+        for validator in (fast_body_validator, fast_validator):
+            request = _validate(validator, None, b'{"name": "foo"}')
+            self.assertEqual(request.validated, {})
+            self.assertEqual(len(request.errors), 0)
+
+    def test_specs_are_compiled_once(self):
+        from cornice.validators import _fast
+
+        _fast._CHECKERS.clear()
+        for _ in range(3):
+            _validate(fast_body_validator, ITEM, b"{}")
+        self.assertEqual(len(_fast._CHECKERS), 1)
+        self.assertEqual(_fast._CHECKERS.hits, 2)
+
+    def test_unsupported_spec(self):
+        with self.assertRaises(TypeError):
+            _validate(fast_body_validator, {"tags": set})
+        self.assertEqual(repr(FastField(int)), "<Field <class 'int'>>")
+
+    def test_service(self):
+        service = Service(name="fast", path="/fast")
+
+        @service.post(schema=ITEM, validators=(fast_body_validator,))
+        def post(request):
+            return request.validated
+
+        with testing.testConfig() as config:
+            config.include("cornice")
+            config.add_cornice_service(service)
+            app = TestApp(config.make_wsgi_app())
+            body = {"name": "foo", "count": 3, "point": {"x": 1}, "extra": {}}
+            self.assertEqual(app.post_json("/fast", body).json["count"], 3)
+            response = app.post_json("/fast", {}, status=400)
+            self.assertEqual(response.json["status"], "error")
+
+
+RECORD = {
+    "name": FastField(str, min_length=1, max_length=10),
+    "count": FastField(int, min=0, max=100),
+    "ratio": FastField(float, min=0, max=1, default=0.5),
+    "kind": FastField(choices=["a", "b"], required=False),
+    "point": FastField({"x": float}, required=False),
+    "tags": FastField(list, items=str, default_factory=list),
+}
+
+
+def _bulk(records, schema=RECORD, **kwargs):
+    body = json.dumps(records).encode()
+    return _validate(fast_bulk_body_validator, schema, body, **kwargs)
+
+
+class TestFastBulkValidator(TestCase):
+    def test_valid_records(self):
+        records = [{"name": "a", "count": 1, "ratio": 1, "kind": "a"}] * 3
+        request = _bulk(records)
+        self.assertEqual(len(request.errors), 0)
+        self.assertEqual(
+            request.validated,
+            {"body": [{"name": "a", "count": 1, "ratio": 1.0, "kind": "a", "tags": []}] * 3},
+        )
+        request = _bulk([{"name": "a", "count": 1, "kind": "c"}] * 2)
+        self.assertEqual([error["name"] for error in request.errors], ["0.kind", "1.kind"])
+
+    def test_missing_values_and_conversions(self):
+        records = [
+            {"name": "a", "count": "1", "point": {"x": 1}},
+            {"name": "b", "count": 2, "ratio": "0.2", "kind": "b"},
+        ]
+        request = _bulk(records)
+        self.assertEqual(
+            request.validated["body"],
+            [
+                {"name": "a", "count": 1, "ratio": 0.5, "point": {"x": 1.0}, "tags": []},
+                {"name": "b", "count": 2, "ratio": 0.2, "kind": "b", "tags": []},
+            ],
+        )
+
+    def test_invalid_records(self):
+        records = [
+            {"name": "a", "count": 101, "kind": "c"},
+            {"name": "", "count": 1, "ratio": 2},
+            {"count": 1, "point": {}},
+            {"name": "a", "count": "x"},
+        ]
+        request = _bulk(records)
+        self.assertEqual(request.validated, {})
+        self.assertEqual({error["location"] for error in request.errors}, {"body"})
+        self.assertEqual(
+            [(error["name"], error["description"]) for error in request.errors],
+            [
+                ("0.count", "Must be at most 100"),
+                ("0.kind", "Must be one of: a, b"),
+                ("1.name", "Length must be at least 1"),
+                ("1.ratio", "Must be at most 1"),
+                ("2.name", "Required"),
+                ("2.point.x", "Required"),
+                ("3.count", "Must be an integer"),
+            ],
+        )
+
+    def test_custom_validator(self):
+        def even(value):
+            if value % 2:
+                raise ValueError("Must be even")
+
+        schema = {"count": FastField(int, validator=even)}
+        request = _bulk([{"count": 2}, {"count": 4}], schema)
+        self.assertEqual(request.validated, {"body": [{"count": 2}, {"count": 4}]})
+        request = _bulk([{"count": 2}, {"count": 3}], schema)
+        self.assertEqual(list(request.errors)[0]["name"], "1.count")
+
+    def test_body_must_be_a_list_of_objects(self):
+        request = _bulk({"name": "a"})
+        self.assertEqual(request.errors[0]["description"], "Must be a list")
+        request = _bulk([{"name": "a", "count": 1}, 1, []])
+        self.assertEqual(
+            [(error["name"], error["description"]) for error in request.errors],
+            [("1", "Must be an object"), ("2", "Must be an object")],
+        )
+
+    def test_empty_spec_and_body(self):
+        request = _bulk([{"a": 1}, {}], {})
+        self.assertEqual(request.validated, {"body": [{}, {}]})
+        request = _bulk([])
+        self.assertEqual(request.validated, {"body": []})
+        request = _validate(fast_bulk_body_validator, None, b"[1]")
+        self.assertEqual(request.validated, {})
+
+    def test_long_columns(self):
+        from cornice.validators import _fast
+
+        size = _fast._NUMPY_MIN_ROWS
+        records = [{"name": "a", "count": i % 100, "ratio": 0.5} for i in range(size)]
+        records[-1] = {"name": "a", "count": 2**70, "ratio": 1.5}
+        for numpy in (_fast.numpy, None):
+            with mock.patch.object(_fast, "numpy", numpy):
+                request = _bulk(records[:-1])
+                self.assertEqual(len(request.validated["body"]), size - 1)
+                request = _bulk(records)
+                self.assertEqual(
+                    [error["name"] for error in request.errors],
+                    ["%s.count" % (size - 1), "%s.ratio" % (size - 1)],
+                )
+
+    def test_error_budget(self):
+        from cornice.errors import TooManyErrors
+
+        body = json.dumps([{"name": "", "count": 1}] * 100).encode()
+        request = Request.blank("/", method="POST", body=body)
+        request.validated = {}
+        request.errors = Errors(max_errors=3)
+        with self.assertRaises(TooManyErrors):
+            fast_bulk_body_validator(request, schema=RECORD)
+        self.assertEqual(
+            [error["name"] for error in request.errors], ["0.name", "1.name", "2.name"]
+        )
+
+    def test_specs_are_compiled_once(self):
+        from cornice.validators import _fast
+
+        _fast._BULK_CHECKERS.clear()
+        for _ in range(3):
+            _bulk([], RECORD)
+        self.assertEqual(len(_fast._BULK_CHECKERS), 1)
+        self.assertEqual(_fast._BULK_CHECKERS.hits, 2)
+
+
+class TestFastBulkValidatorExecutor(TestCase):
+    def _bulk(self, records, executor, **kwargs):
+        body = json.dumps(records).encode()
+        request = Request.blank("/", method="POST", body=body)
+        request.validated = {}
+        request.errors = Errors(**kwargs)
+        fast_bulk_body_validator(request, schema=RECORD, bulk_executor=executor, bulk_chunk_size=2)
+        return request
+
+    def test_chunks_are_merged_in_order(self):
+        records = [{"name": "n%s" % i, "count": i} for i in range(5)]
+        with ThreadPoolExecutor(2) as executor:
+            request = self._bulk(records, executor)
+        self.assertEqual(
+            [record["name"] for record in request.validated["body"]],
+            ["n0", "n1", "n2", "n3", "n4"],
+        )
+
+    def test_errors_are_numbered_in_the_whole_body(self):
+        records = [{"name": "a", "count": 1}] * 5
+        records[1] = {"name": "a", "count": -1}
+        records[4] = {"count": 1, "point": {}}
+        with ThreadPoolExecutor(2) as executor:
+            request = self._bulk(records, executor)
+            self.assertEqual(request.validated, {})
+            self.assertEqual(
+                [error["name"] for error in request.errors], ["1.count", "4.name", "4.point.x"]
+            )
+            # Small bodies are validated in the request thread.
+            request = self._bulk([{"name": "a"}, 1], executor)
+            self.assertEqual([error["name"] for error in request.errors], ["1"])
+
+    def test_error_budget(self):
+        from cornice.errors import TooManyErrors
+
+        with ThreadPoolExecutor(2) as executor:
+            with self.assertRaises(TooManyErrors):
+                self._bulk([{"name": ""}] * 10, executor, max_errors=3)
+
+    def test_process_pool(self):
+        records = [{"name": "n%s" % i, "count": i} for i in range(5)]
+        records[3] = {"name": "a", "count": -1}
+        with ProcessPoolExecutor(2) as executor:
+            request = self._bulk(records[:3], executor)
+            self.assertEqual(len(request.validated["body"]), 3)
+            self.assertEqual(request.validated["body"][2]["tags"], [])
+            request = self._bulk(records, executor)
+            self.assertEqual([error["name"] for error in request.errors], ["3.count"])
+
+
+class TestFastBulkValidatorNDJSON(TestCase):
+    def _ndjson(self, lines, **kwargs):
+        body = "\n".join(lines).encode()
+        request = Request.blank(
+            "/", method="POST", body=body, headers={"Content-Type": "application/x-ndjson"}
+        )
+        request.validated = {}
+        request.errors = Errors(**kwargs)
+        fast_bulk_body_validator(request, schema=RECORD, bulk_chunk_size=2)
+        return request
+
+    def test_lines_are_validated(self):
+        lines = [json.dumps({"name": "n%s" % i, "count": i}) for i in range(5)]
+        request = self._ndjson(lines + [""])
+        self.assertEqual(len(request.errors), 0)
+        self.assertEqual(
+            [record["name"] for record in request.validated["body"]],
+            ["n0", "n1", "n2", "n3", "n4"],
+        )
+
+    def test_errors_are_named_after_line_numbers(self):
+        lines = [
+            '{"name": "a", "count": 1}',
+            "",
+            '{"name": "a", "count": -1}',
+            '{"name": "a", "count"',
+            '{"count": 1, "point": {}}',
+        ]
+        request = self._ndjson(lines)
+        self.assertEqual(request.validated, {})
+        self.assertEqual(
+            sorted(
+                (error["name"], error["description"].split(":")[0]) for error in request.errors
+            ),
+            [
+                ("3.count", "Must be at least 0"),
+                ("4", "Invalid JSON"),
+                ("5.name", "Required"),
+                ("5.point.x", "Required"),
+            ],
+        )
+
+    def test_error_budget(self):
+        from cornice.errors import TooManyErrors
+
+        lines = ['{"name": ""}'] * 100
+        with self.assertRaises(TooManyErrors):
+            self._ndjson(lines, max_errors=3)
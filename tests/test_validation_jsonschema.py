@@ -0,0 +1,316 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+from pyramid import testing
+from pyramid.request import Request
+from webtest import TestApp
+
+from cornice import Service
+from cornice.errors import Errors
+from cornice.validators import (
+    jsonschema_body_validator,
+    jsonschema_headers_validator,
+    jsonschema_path_validator,
+    jsonschema_querystring_validator,
+    jsonschema_validator,
+)
+from cornice.validators._jsonschema import compile_json_schema
+
+from .support import TestCase
+
+
+ITEM = {
+    "$schema": "https://json-schema.org/draft/2020-12/schema",
+    "title": "An item",
+    "type": "object",
+    "required": ["name", "count"],
+    "properties": {
+        "name": {"type": "string", "minLength": 1, "maxLength": 10, "pattern": "^[a-z]+$"},
+        "count": {"type": "integer", "minimum": 0, "maximum": 100, "multipleOf": 2},
+        "ratio": {"type": "number", "exclusiveMinimum": 0, "exclusiveMaximum": 1},
+        "kind": {"enum": ["a", "b", None]},
+        "version": {"const": 1},
+        "tags": {
+            "type": "array",
+            "items": {"type": "string"},
+            "minItems": 1,
+            "maxItems": 3,
+            "uniqueItems": True,
+        },
+        "address": {"$ref": "#/$defs/address"},
+        "extra": {
+            "type": "object",
+            "additionalProperties": {"type": "integer"},
+            "minProperties": 1,
+            "maxProperties": 2,
+        },
+        "id": {"anyOf": [{"type": "integer"}, {"type": "string", "format": "uuid"}]},
+        "choice": {"oneOf": [{"type": "integer"}, {"type": "number", "minimum": 2}]},
+        "other": {"not": {"type": "null"}, "allOf": [{"minLength": 2}, {"maxLength": 3}]},
+        "nothing": False,
+        "anything": True,
+        "empty": {"type": "array", "items": False},
+    },
+    "additionalProperties": False,
+    "$defs": {
+        "address": {
+            "type": "object",
+            "required": ["city"],
+            "properties": {"city": {"type": "string"}, "next": {"$ref": "#/$defs/address"}},
+        }
+    },
+}
+
+
+def _validate(validator, schema, body=b"", path="/", **kwargs):
+    request = Request.blank(path, method="POST", body=body, **kwargs)
+    request.validated = {}
+    request.errors = Errors()
+    request.matchdict = {"id": "12"}
+    validator(request, schema=schema)
+    return request
+
+
+def _errors(request):
+    return {error["name"]: error["description"] for error in request.errors}
+
+
+class TestJSONSchemaValidators(TestCase):
+    def test_valid_body(self):
+        body = (
+            b'{"name": "foo", "count": 12.0, "ratio": 0.5, "kind": null, "version": 1.0,'
+            b' "tags": ["a", "b"], "address": {"city": "x", "next": {"city": "y"}},'
+            b' "extra": {"a": 1}, "id": "abc", "choice": 2.5, "other": "ab",'
+            b' "anything": [1], "empty": []}'
+        )
+        request = _validate(jsonschema_body_validator, ITEM, body)
+        self.assertEqual(len(request.errors), 0)
+        self.assertEqual(request.validated["address"], {"city": "x", "next": {"city": "y"}})
+        self.assertEqual(request.validated["count"], 12.0)
+
+    def test_invalid_body(self):
+        body = (
+            b'{"name": "Foo!", "count": 101, "ratio": 1, "kind": "c", "version": true,'
+            b' "tags": ["a", "a", 1, "b"], "address": {"next": {"city": 1}},'
+            b' "extra": {"a": "1", "b": 2, "c": 3}, "id": 1.5, "choice": 3, "other": null,'
+            b' "nothing": 1, "empty": [1], "unknown": 1}'
+        )
+        request = _validate(jsonschema_body_validator, ITEM, body)
+        self.assertEqual(request.validated, {})
+        self.assertEqual({error["location"] for error in request.errors}, {"body"})
+        self.assertEqual(
+            sorted((error["name"], error["description"]) for error in request.errors),
+            [
+                ("address.city", "Required"),
+                ("address.next.city", "Must be of type string"),
+                ("choice", "Must be valid against exactly one schema"),
+                ("count", "Must be a multiple of 2"),
+                ("count", "Must be at most 100"),
+                ("empty.0", "Not allowed"),
+                ("extra", "Must have at most 2 properties"),
+                ("extra.a", "Must be of type integer"),
+                ("id", "Must be valid against at least one schema"),
+                ("kind", 'Must be one of: "a", "b", null'),
+                ("name", "Must match pattern ^[a-z]+$"),
+                ("nothing", "Not allowed"),
+                ("other", "Must not be valid against the schema"),
+                ("ratio", "Must be less than 1"),
+                ("tags", "Items must be unique"),
+                ("tags", "Must have at most 3 items"),
+                ("tags.2", "Must be of type string"),
+                ("unknown", "Unknown property"),
+                ("version", "Must be equal to 1"),
+            ],
+        )
+
+    def test_more_invalid_values(self):
+        body = (
+            b'{"name": "", "count": -2, "ratio": 0, "tags": [], "extra": {},'
+            b' "other": "abcd", "address": []}'
+        )
+        request = _validate(jsonschema_body_validator, ITEM, body)
+        self.assertIn(
+            {"location": "body", "name": "name", "description": "Length must be at least 1"},
+            request.errors,
+        )
+        errors = _errors(request)
+        self.assertEqual(errors["count"], "Must be at least 0")
+        self.assertEqual(errors["ratio"], "Must be greater than 0")
+        self.assertEqual(errors["tags"], "Must have at least 1 items")
+        self.assertEqual(errors["extra"], "Must have at least 1 properties")
+        self.assertEqual(errors["other"], "Length must be at most 3")
+        self.assertEqual(errors["address"], "Must be of type object")
+
+        errors = _errors(_validate(jsonschema_body_validator, ITEM, b'{"name": "abcdefghijk"}'))
+        self.assertEqual(errors, {"name": "Length must be at most 10", "count": "Required"})
+        errors = _errors(_validate(jsonschema_body_validator, ITEM, b'{"name": 1, "count": 1.5}'))
+        self.assertEqual(
+            errors, {"name": "Must be of type string", "count": "Must be of type integer"}
+        )
+
+    def test_body_can_be_an_array(self):
+        schema = {"type": "array", "items": {"type": "integer"}}
+        request = _validate(jsonschema_body_validator, schema, b"[1, 2]")
+        self.assertEqual(request.validated, {"body": [1, 2]})
+        request = _validate(jsonschema_body_validator, schema, b'[1, "2"]')
+        self.assertEqual(_errors(request), {"1": "Must be of type integer"})
+        request = _validate(jsonschema_body_validator, schema, b'{"a": 1}')
+        self.assertEqual(_errors(request), {"": "Must be of type array"})
+
+    def test_other_locations(self):
+        schema = {"properties": {"page": {"type": "string", "pattern": "^[0-9]+$"}}}
+        request = _validate(jsonschema_querystring_validator, schema, path="/?page=2")
+        self.assertEqual(request.validated, {"page": "2"})
+        request = _validate(jsonschema_querystring_validator, schema, path="/?page=a")
+        self.assertEqual(request.errors[0]["location"], "querystring")
+        request = _validate(jsonschema_path_validator, {"required": ["id"]})
+        self.assertEqual(request.validated, {"id": "12"})
+        schema = {"required": ["X-Flag"], "properties": {"X-Flag": {"enum": ["on", "off"]}}}
+        request = _validate(jsonschema_headers_validator, schema, headers={"X-Flag": "on"})
+        self.assertEqual(request.validated["X-Flag"], "on")
+        request = _validate(jsonschema_headers_validator, schema)
+        self.assertEqual(
+            list(request.errors),
+            [{"location": "header", "name": "X-Flag", "description": "Required"}],
+        )
+
+    def test_full_request(self):
+        schema = {
+            "type": "object",
+            "properties": {
+                "body": {"type": "object", "required": ["name"]},
+                "querystring": {"properties": {"page": {"type": "string"}}},
+            },
+        }
+        request = _validate(jsonschema_validator, schema, b'{"name": "foo"}', path="/?page=1")
+        self.assertEqual(
+            request.validated, {"body": {"name": "foo"}, "querystring": {"page": "1"}}
+        )
+
+        request = _validate(jsonschema_validator, schema, b"{}")
+        self.assertEqual(
+            list(request.errors), [{"location": "body", "name": "name", "description": "Required"}]
+        )
+
+        request = _validate(jsonschema_validator, {"required": ["path"]})
+        self.assertEqual(request.validated["path"], {"id": "12"})
+        request = _validate(jsonschema_validator, {"type": "array"})
+        self.assertEqual(
+            list(request.errors),
+            [{"location": "", "name": "", "description": "Must be of type array"}],
+        )
+
+    def test_error_budget(self):
+        from cornice.errors import TooManyErrors
+
+        schema = {"type": "array", "items": {"type": "string"}}
+        for validator, schema in (
+            (jsonschema_body_validator, schema),
+            (jsonschema_validator, {"properties": {"body": schema}}),
+        ):
+            request = Request.blank("/", method="POST", body=str(list(range(1000))).encode())
+            request.validated = {}
+            request.errors = Errors(max_errors=5)
+            with self.assertRaises(TooManyErrors):
+                validator(request, schema=schema)
+            self.assertEqual(
+                [error["name"] for error in request.errors], ["0", "1", "2", "3", "4"]
+            )
+            self.assertTrue(request.errors.truncated)
+
+    def test_no_schema(self):
+        for validator in (jsonschema_body_validator, jsonschema_validator):
+            request = _validate(validator, None, b'{"name": "foo"}')
+            self.assertEqual(request.validated, {})
+            self.assertEqual(len(request.errors), 0)
+
+    def test_schemas_are_compiled_once(self):
+        from cornice.validators import _jsonschema
+
+        _jsonschema._VALIDATORS.clear()
+        for _ in range(3):
+            _validate(jsonschema_body_validator, ITEM, b"{}")
+        self.assertEqual(len(_jsonschema._VALIDATORS), 1)
+        self.assertEqual(_jsonschema._VALIDATORS.hits, 2)
+
+    def test_json_equality(self):
+        validate = compile_json_schema({"enum": [1, [1, {"a": True}], "1"]})
+        for value, valid in (
+            (1, True),
+            (1.0, True),
+            (True, False),
+            ([1, {"a": True}], True),
+            ([1, {"a": 1}], False),
+            ([1, {"b": True}], False),
+            ([1], False),
+            ("1", True),
+            (None, False),
+        ):
+            errors = []
+            validate(value, (), errors)
+            self.assertEqual(not errors, valid, value)
+
+    def test_multiple_of(self):
+        validate = compile_json_schema({"multipleOf": 0.5})
+        for value, valid in ((1.5, True), (1.2, False), (10**400, False), (4, True)):
+            errors = []
+            validate(value, (), errors)
+            self.assertEqual(not errors, valid, value)
+
+    def test_invalid_schemas(self):
+        for schema in (
+            {"type": "thing"},
+            {"properties": {"a": 1}},
+            {"if": {"type": "string"}},
+            {"$ref": "http://example.com/schema"},
+            {"$ref": "#/$defs/missing"},
+        ):
+            with self.assertRaises(ValueError):
+                compile_json_schema(schema)
+        self.assertEqual(
+            compile_json_schema({"$ref": "#/allOf/0", "allOf": [{}]})(1, (), []), None
+        )
+
+    def test_service(self):
+        service = Service(name="jsonschema", path="/jsonschema")
+
+        @service.post(schema=ITEM, validators=(jsonschema_body_validator,))
+        def post(request):
+            return request.validated
+
+        with testing.testConfig() as config:
+            config.include("cornice")
+            config.add_cornice_service(service)
+            app = TestApp(config.make_wsgi_app())
+            self.assertEqual(
+                app.post_json("/jsonschema", {"name": "a", "count": 2}).json["count"], 2
+            )
+            response = app.post_json("/jsonschema", {"name": "a"}, status=400)
+            self.assertEqual(response.json["errors"][0]["name"], "count")
+
+    def test_schemas_are_compiled_when_registered(self):
+        from cornice.validators import _jsonschema
+
+        _jsonschema._VALIDATORS.clear()
+        service = Service(name="jsonschema", path="/jsonschema")
+        service.add_view(
+            "POST", lambda request: None, schema=ITEM, validators=(jsonschema_validator,)
+        )
+        with testing.testConfig() as config:
+            config.include("cornice")
+            config.add_cornice_service(service)
+            self.assertEqual(len(_jsonschema._VALIDATORS), 1)
+
+    def test_invalid_schemas_fail_when_registered(self):
+        from pyramid.exceptions import ConfigurationError
+
+        for validator in (jsonschema_body_validator, jsonschema_validator):
+            service = Service(name="jsonschema", path="/jsonschema")
+            service.add_view(
+                "POST", lambda request: None, schema={"if": {}}, validators=(validator,)
+            )
+            with testing.testConfig() as config:
+                config.include("cornice")
+                with self.assertRaises(ConfigurationError) as cm:
+                    config.add_cornice_service(service)
+                self.assertIn("'jsonschema'", str(cm.exception))